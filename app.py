@@ -2,16 +2,43 @@ import streamlit as st
 import os
 import json
 import datetime
-from src.retriever import retrieve_context
-from src.answer_generator import generate_answer_stream, rewrite_query
-from src.config import DB_PATH
+import threading
+import time
+from src.retriever import Retriever, get_cache_stats, get_retriever
+from src.answer_generator import generate_answer_stream, get_llm, get_rewrite_stats, rewrite_and_retrieve
+from src.answer_index import find_canonical_answer, get_fast_path_stats
+from src.config import DB_PATH, WARM_UP_ON_START
+from src.language import detect_language
+from src.llm import LanguageModel
+from src.pipeline import start_warm_up
+
+# --- Shared Resources ---
+# Streamlit reruns this script on every interaction, in every session. Resources are
+# created once per server process and shared by all sessions; they are read-only or
+# thread-safe, so concurrent users never wait on each other's model loads.
+
+@st.cache_resource(show_spinner="Loading the knowledge base...")
+def load_retriever() -> Retriever:
+    """Returns the shared retriever with its embedding model loaded."""
+    retriever = get_retriever()
+    retriever.model # Loads the embedding model now rather than in the first query.
+    return retriever
+
+@st.cache_resource(show_spinner="Connecting to the language model...")
+def load_language_model() -> LanguageModel:
+    return get_llm()
+
+@st.cache_resource
+def feedback_lock() -> threading.Lock:
+    """Serializes feedback writes from concurrent sessions."""
+    return threading.Lock()
 
 # --- Feedback Logging ---
 FEEDBACK_LOG_FILE = "feedback.log"
 
 def log_feedback(question, answer, feedback):
     """Logs user feedback to a file."""
-    with open(FEEDBACK_LOG_FILE, "a") as f:
+    with feedback_lock(), open(FEEDBACK_LOG_FILE, "a") as f:
         log_entry = {
             "timestamp": datetime.datetime.now().isoformat(),
             "question": question,
@@ -29,9 +56,22 @@ if not os.path.exists(DB_PATH):
     st.error(f"Vector store not found. Please run `build_vector_store.py`.")
     st.stop()
 
+if WARM_UP_ON_START:
+    # Runs once per server process; later reruns find the thread already started.
+    start_warm_up()
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "timings" not in st.session_state:
+    st.session_state.timings = []
+
+def timed_stream(stream, timing):
+    """Passes a stream through, recording the time to its first chunk and to its end."""
+    start = time.perf_counter()
+    for chunk in stream:
+        timing.setdefault("first_token_ms", 1000.0 * (time.perf_counter() - start))
+        yield chunk
+    timing["generation_ms"] = 1000.0 * (time.perf_counter() - start)
 
 # Display chat messages
 for i, message in enumerate(st.session_state.messages):
@@ -54,21 +94,61 @@ if prompt := st.chat_input("What is your medical question?"):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
+        turn_start = time.perf_counter()
+        retriever = load_retriever()
+        load_language_model()
+        timing = {"question": prompt, "load_ms": 1000.0 * (time.perf_counter() - turn_start)}
+
         with st.spinner("Rewriting query and searching..."):
             history = st.session_state.messages[:-1][-10:]
             
-            # 1. Rewrite the query
-            rewritten = rewrite_query(prompt, history)
-            st.info(f"Searching for: _{rewritten}_") # Show the user the rewritten query
-            
-            # 2. Retrieve context with the rewritten query
-            retrieved_docs = retrieve_context(rewritten, threshold=0.0)
-            
-            if not retrieved_docs:
-                response = "I could not find any relevant information to answer your question."
+            # A standalone question matching a curated FAQ is answered directly.
+            start = time.perf_counter()
+            match = find_canonical_answer(prompt, history, language=detect_language(prompt))
+            timing["fast_path_ms"] = 1000.0 * (time.perf_counter() - start)
+
+            if match is not None:
+                response = match["answer"]
                 st.markdown(response)
             else:
-                # 3. Generate the answer with the original query and the retrieved context
-                response = st.write_stream(generate_answer_stream(prompt, retrieved_docs))
+                # 1. Rewrite the query (if needed) and 2. retrieve context with it
+                start = time.perf_counter()
+                rewritten, retrieved_docs = rewrite_and_retrieve(
+                    prompt,
+                    history,
+                    lambda text: retriever.retrieve(text, threshold=0.0),
+                    probe=lambda text: retriever.search_sources(text, threshold=0.0)
+                )
+                timing["rewrite_and_retrieve_ms"] = 1000.0 * (time.perf_counter() - start)
+                st.info(f"Searching for: _{rewritten}_") # Show the user the rewritten query
+
+                if not retrieved_docs:
+                    response = "I could not find any relevant information to answer your question."
+                    st.markdown(response)
+                else:
+                    # 3. Generate the answer with the original query and the retrieved context
+                    stream = generate_answer_stream(prompt, retrieved_docs, history=history, cache_query=rewritten)
+                    response = st.write_stream(timed_stream(stream, timing))
+
+        timing["total_ms"] = 1000.0 * (time.perf_counter() - turn_start)
+        st.session_state.timings = (st.session_state.timings + [timing])[-20:]
     
     st.session_state.messages.append({"role": "assistant", "content": response})
+
+# --- Debug Sidebar ---
+# Rendered last, so it already includes the turn that was just answered.
+with st.sidebar:
+    if st.toggle("Show timings", key="show_timings"):
+        if st.session_state.timings:
+            st.caption("Per-turn timings (ms), latest first")
+            st.dataframe(list(reversed(st.session_state.timings)), hide_index=True)
+        else:
+            st.caption("Ask a question to see its timings.")
+        caches = get_cache_stats()
+        rewrites = get_rewrite_stats()
+        fast_path = get_fast_path_stats()
+        st.caption(
+            f"Retrieval cache: {caches['retrieval_results']['hits']} hits, {caches['retrieval_results']['misses']} misses. "
+            f"Rewrites skipped: {rewrites['skip_rate']:.0%}. "
+            f"Curated answers: {fast_path['hits']} of {fast_path['lookups']} lookups ({fast_path['hit_rate']:.0%})."
+        )
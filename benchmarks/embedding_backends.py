@@ -0,0 +1,105 @@
+# benchmarks/embedding_backends.py
+"""
+Parity check and encode throughput of the embedding backends.
+
+Every backend encodes the same FAQ documents and questions. Parity compares each
+candidate's nearest neighbours (question -> documents, top k) with those of the
+full-precision 'torch' reference. Throughput is measured for batched document encoding
+and for single queries. The run fails if a backend's recall@k is below --min-recall.
+
+Usage:
+    python benchmarks/embedding_backends.py --backends torch,int8,onnx --limit 1000
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from benchmarks.harness import measure, write_report
+from src.config import DATA_PATH, EMBEDDING_MODEL_NAME
+from src.data_loader import iter_documents
+from src.embedding_backends import load_embedding_model, recall_at_k
+
+def load_faq(path: str, limit: int) -> Tuple[List[str], List[str]]:
+    """Returns the first `limit` FAQ questions and their full documents."""
+    docs = list(itertools.islice(iter_documents(path), limit))
+    return [doc["Question"] for doc in docs], [doc["text"] for doc in docs]
+
+def bench_backend(model_name: str, backend: str, questions: List[str], documents: List[str], batch_size: int, repeat: int) -> Tuple[Dict[str, object], np.ndarray, np.ndarray]:
+    """Loads the model with `backend`, encodes the FAQ set and returns the timings and embeddings."""
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+
+    model.encode(documents[:batch_size], batch_size=batch_size) # Warm-up
+    start = time.perf_counter()
+    doc_embeddings = model.encode(documents, batch_size=batch_size, convert_to_numpy=True)
+    encode_seconds = time.perf_counter() - start
+    query_embeddings = model.encode(questions, batch_size=batch_size, convert_to_numpy=True)
+
+    queries = itertools.cycle(questions)
+    result = {
+        "load_seconds": load_seconds,
+        "documents_per_sec": len(documents) / encode_seconds,
+        "single_query": measure(lambda: model.encode(next(queries)), repeat),
+    }
+    return result, np.asarray(query_embeddings, dtype=np.float32), np.asarray(doc_embeddings, dtype=np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the embedding backends with the full-precision model.")
+    parser.add_argument("--backends", default="torch,int8,onnx", help="Comma-separated backends; 'torch' is always run as the reference.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME, help="The Sentence Transformers model.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="The FAQ file (.csv, .jsonl or .parquet).")
+    parser.add_argument("--limit", type=int, default=1000, help="Maximum number of FAQs to encode.")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours compared per question.")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Fail if a backend's recall@k is below this.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Encoder batch size.")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed single-query encodes per backend.")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report (default: benchmarks/results/embedding-<timestamp>.json).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    questions, documents = load_faq(args.data_path, args.limit)
+    backends = ["torch"] + [backend for backend in args.backends.split(",") if backend != "torch"]
+    results: Dict[str, Dict[str, object]] = {}
+    reference = None
+    failures = []
+    for backend in backends:
+        print(f"Encoding {len(documents)} FAQs with the '{backend}' backend...", flush=True)
+        try:
+            result, query_embeddings, doc_embeddings = bench_backend(args.model, backend, questions, documents, args.batch_size, args.repeat)
+        except ImportError as e:
+            print(f"Skipping '{backend}': {e}")
+            continue
+        if reference is None:
+            reference = (query_embeddings, doc_embeddings)
+        result["parity"] = recall_at_k(reference[0], reference[1], query_embeddings, doc_embeddings, args.k)
+        result["speedup"] = result["documents_per_sec"] / results["torch"]["documents_per_sec"] if backend != "torch" else 1.0
+        recall = next(value for key, value in result["parity"].items() if key.startswith("recall_at_"))
+        if recall < args.min_recall:
+            failures.append(f"{backend}: recall@{args.k} {recall:.3f} < {args.min_recall}")
+        results[backend] = result
+
+    output = args.output or os.path.join(
+        project_root, "benchmarks", "results", "embedding-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    report = write_report(results, {key: value for key, value in vars(args).items() if key != "output"}, output)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {output}")
+    if failures:
+        print("\n".join(["Parity check failed:"] + failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
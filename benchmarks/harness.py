@@ -0,0 +1,116 @@
+# benchmarks/harness.py
+
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+def percentile(sorted_samples: List[float], quantile: float) -> float:
+    """Returns the nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, int(quantile * len(sorted_samples)))]
+
+def summarize(samples: List[float], operations: Optional[int] = None, wall_seconds: Optional[float] = None) -> Dict[str, float]:
+    """
+    Summarizes latency samples (in seconds) as milliseconds.
+
+    Args:
+        samples: One latency per operation.
+        operations: The number of operations completed in `wall_seconds`, if throughput applies.
+        wall_seconds: The wall-clock time of the whole run. Defaults to the sum of the samples.
+    """
+    ordered = sorted(samples)
+    wall_seconds = wall_seconds if wall_seconds is not None else sum(samples)
+    operations = operations if operations is not None else len(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": 1000.0 * sum(samples) / len(samples) if samples else 0.0,
+        "p50_ms": 1000.0 * percentile(ordered, 0.50),
+        "p95_ms": 1000.0 * percentile(ordered, 0.95),
+        "p99_ms": 1000.0 * percentile(ordered, 0.99),
+        "max_ms": 1000.0 * ordered[-1] if ordered else 0.0,
+        "throughput_per_sec": operations / wall_seconds if wall_seconds > 0 else 0.0,
+    }
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Calls `fn` `warmup` times untimed, then `repeat` times timed, and summarizes the latencies."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def measure_concurrent(operation: Callable[[int], Awaitable[object]], concurrency: int, total: int) -> Dict[str, float]:
+    """
+    Runs `total` async operations with at most `concurrency` in flight.
+
+    Returns the per-operation latency summary and the overall throughput.
+    """
+    async def run() -> List[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+        async def timed(i: int) -> float:
+            async with semaphore:
+                start = time.perf_counter()
+                await operation(i)
+                return time.perf_counter() - start
+        return await asyncio.gather(*(timed(i) for i in range(total)))
+
+    start = time.perf_counter()
+    samples = asyncio.run(run())
+    return summarize(list(samples), operations=total, wall_seconds=time.perf_counter() - start)
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_report(results: Dict[str, object], config: Dict[str, object], path: str) -> Dict[str, object]:
+    """Writes the results as JSON, tagged with the commit and environment they were measured on."""
+    report = {
+        "metadata": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": config,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def _flatten(results: Dict[str, object], prefix: str = "") -> Dict[str, Dict[str, float]]:
+    """Maps 'stage/size/...' paths to their latency summaries."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict) and "p50_ms" in value:
+            flat[path] = value
+        elif isinstance(value, dict):
+            flat.update(_flatten(value, path))
+    return flat
+
+def compare_reports(baseline: Dict[str, object], current: Dict[str, object], tolerance: float = 0.10) -> List[str]:
+    """Returns a line for every measurement whose p95 latency grew by more than `tolerance` over the baseline."""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    regressions = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path]["p95_ms"], new[path]["p95_ms"]
+        if before > 0 and after > before * (1.0 + tolerance):
+            regressions.append(f"{path}: p95 {before:.2f} ms -> {after:.2f} ms (+{100.0 * (after / before - 1.0):.0f}%)")
+    return regressions
@@ -0,0 +1,244 @@
+# benchmarks/run_benchmarks.py
+"""
+End-to-end latency benchmarks for the RAG pipeline.
+
+Each stage is measured separately (cold start, model load, query encoding, vector search
+per backend and corpus size, BM25 search, prompt building, rewrite and generation) and
+the whole turn is then run at increasing concurrency. Generation always uses the local
+SimulatedModel, so no Gemini quota is spent. Vector search runs against synthetic
+corpora of random unit vectors, which is enough to measure search cost.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 100,1000,10000 --concurrency 1,4,16
+    python benchmarks/run_benchmarks.py --skip-model --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from benchmarks.harness import compare_reports, measure, measure_concurrent, summarize, write_report
+from src import answer_generator
+from src import retriever as retriever_module
+from src.bm25 import BM25Index
+from src.config import CONTEXT_RETRIEVAL_N_RESULTS, EMBEDDING_MODEL_NAME
+from src.embedding_backends import embedding_model_key
+from src.llm import SimulatedModel
+from src.retriever import Retriever, get_embedding_model
+from src.vector_store import VectorStore, open_vector_store
+
+SAMPLE_QUERIES = [
+    "What are the symptoms of the flu?",
+    "How is high blood pressure treated?",
+    "What causes migraines?",
+    "Is diabetes hereditary?",
+    "How can I lower my cholesterol?",
+    "What is aphasia?",
+    "¿Cuáles son los síntomas de la gripe?",
+    "¿Qué causa la fiebre?",
+]
+HISTORY = [
+    {"role": "user", "content": "Tell me about diabetes."},
+    {"role": "assistant", "content": "Diabetes is a chronic disease that affects how the body turns food into energy. [FAQ-12]"},
+] * 5
+VOCABULARY = (
+    "fever cough pain headache blood pressure heart diabetes insulin sugar infection virus bacteria "
+    "treatment symptom diagnosis doctor medicine dose allergy asthma lung kidney liver skin rash "
+    "vaccine flu cold sleep diet exercise weight cholesterol stroke cancer therapy surgery child adult"
+).split()
+
+BENCHMARK_ENCODER_NAME = "benchmark-hashing-encoder"
+
+class HashingEncoder:
+    """
+    Stands in for the embedding model with --skip-model: maps each text to a deterministic
+    pseudo-random unit vector. Encoding cost is negligible, so retrieval timings show the
+    search and pipeline overhead only.
+    """
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if texts else np.empty((0, self.dim), dtype=np.float32)
+
+def synthetic_batches(size: int, dim: int, batch_size: int = 5000, seed: int = 0) -> Iterator[Tuple[list, list, list, list]]:
+    """Yields (ids, embeddings, documents, metadatas) batches of a random corpus."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        embeddings = rng.standard_normal((count, dim)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        words = rng.integers(0, len(VOCABULARY), size=(count, 40))
+        ids = [f"doc_{start + i}" for i in range(count)]
+        documents = [" ".join(VOCABULARY[w] for w in row) for row in words]
+        metadatas = [{"source_id": f"FAQ-{start + i + 1}"} for i in range(count)]
+        yield ids, embeddings.tolist(), documents, metadatas
+
+def build_store(backend: str, size: int, dim: int, db_path: str) -> VectorStore:
+    store = open_vector_store(f"bench_{size}", db_path=db_path, backend=backend)
+    store.reset()
+    for ids, embeddings, documents, metadatas in synthetic_batches(size, dim):
+        store.add(ids, embeddings, documents, metadatas)
+    store.flush()
+    return store
+
+# --- Stages ---
+
+def bench_cold_start(repeat: int) -> Dict[str, float]:
+    """Times importing the full pipeline in a fresh interpreter."""
+    code = "import time; start = time.perf_counter(); import src.pipeline; print(time.perf_counter() - start)"
+    env = dict(os.environ, LLM_PROVIDER="simulated")
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=project_root, env=env, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return summarize(samples)
+
+def bench_model_load(skip_model: bool, dim: int) -> Tuple[Dict[str, float], str]:
+    """Loads the embedding model into the shared registry and returns its timing and the model name to use."""
+    if skip_model:
+        # Register the stand-in under its own name so the real model is never loaded.
+        retriever_module._embedding_models[embedding_model_key(BENCHMARK_ENCODER_NAME)] = HashingEncoder(dim)
+        return {}, BENCHMARK_ENCODER_NAME
+    start = time.perf_counter()
+    get_embedding_model(EMBEDDING_MODEL_NAME)
+    return summarize([time.perf_counter() - start]), EMBEDDING_MODEL_NAME
+
+def bench_query_encode(model_name: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    model = get_embedding_model(model_name)
+    queries = iter(SAMPLE_QUERIES * (repeat + 1))
+    batch = SAMPLE_QUERIES * 4
+    return {
+        "single": measure(lambda: model.encode(next(queries)), repeat),
+        f"batch_{len(batch)}": measure(lambda: model.encode(batch), max(1, repeat // 10)),
+    }
+
+def bench_vector_query(store: VectorStore, dim: int, repeat: int) -> Dict[str, float]:
+    queries = iter(HashingEncoder(dim).encode([f"query {i}" for i in range(repeat + 1)]).tolist())
+    return measure(lambda: store.query([next(queries)], CONTEXT_RETRIEVAL_N_RESULTS), repeat)
+
+def bench_bm25(size: int, repeat: int) -> Dict[str, object]:
+    documents = [(doc_id, text) for ids, _, texts, _ in synthetic_batches(size, 1) for doc_id, text in zip(ids, texts)]
+    start = time.perf_counter()
+    index = BM25Index.build(documents)
+    build_seconds = time.perf_counter() - start
+    queries = iter(SAMPLE_QUERIES * (repeat + 1))
+    return {"build_seconds": build_seconds, "search": measure(lambda: index.search(next(queries), 20), repeat)}
+
+def _context(size: int = CONTEXT_RETRIEVAL_N_RESULTS) -> List[Dict[str, object]]:
+    return [
+        {"text": " ".join(VOCABULARY[(i * 7 + j) % len(VOCABULARY)] for j in range(120)), "metadata": {"source_id": f"FAQ-{i + 1}"}}
+        for i in range(size)
+    ]
+
+def bench_prompt_build(repeat: int) -> Dict[str, float]:
+    context = _context()
+    return measure(lambda: answer_generator._construct_prompt(SAMPLE_QUERIES[0], context, HISTORY, "English"), repeat)
+
+def bench_generation(repeat: int) -> Dict[str, Dict[str, float]]:
+    """Times the rewrite and answer calls against the simulated model (answer cache bypassed)."""
+    context = _context()
+
+    def first_chunk():
+        next(iter(answer_generator.generate_answer_stream(SAMPLE_QUERIES[0], context)))
+
+    return {
+        "rewrite": measure(lambda: answer_generator.rewrite_query("Is it hereditary?", HISTORY), repeat),
+        "generation": measure(lambda: answer_generator.generate_answer(SAMPLE_QUERIES[0], context), repeat),
+        "generation_ttft": measure(first_chunk, repeat),
+    }
+
+def bench_end_to_end(retriever: Retriever, levels: List[int], turns_per_level: int) -> Dict[str, Dict[str, float]]:
+    """Runs whole chat turns (rewrite, retrieve, generate) through the async pipeline at each concurrency level."""
+    async def turn(i: int):
+        query = f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} ({i})"
+        history = HISTORY if i % 2 else []
+        rewritten, context = await answer_generator.arewrite_and_retrieve(
+            query, history, lambda text: retriever.aretrieve(text, threshold=0.0)
+        )
+        await answer_generator.agenerate_answer(query, context, history)
+
+    return {str(level): measure_concurrent(turn, level, max(turns_per_level, level * 4)) for level in levels}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline stage by stage.")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated synthetic corpus sizes (up to 1000000).")
+    parser.add_argument("--backends", default="numpy,chroma", help="Comma-separated vector backends to benchmark.")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated end-to-end concurrency levels.")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed repetitions per measurement.")
+    parser.add_argument("--turns", type=int, default=32, help="Minimum chat turns per concurrency level.")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Simulated LLM time to first token, in seconds.")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Simulated LLM generation speed.")
+    parser.add_argument("--skip-model", action="store_true", help="Use a hashing stand-in instead of loading the embedding model.")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument("--compare", default=None, help="A previous report; p95 regressions above 10%% are listed.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = args.backends.split(",")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    answer_generator.llm = SimulatedModel(ttft=args.ttft, tokens_per_second=args.tokens_per_second, error_rate=0.0)
+
+    results: Dict[str, object] = {"cold_start": bench_cold_start(repeat=3)}
+    # The MiniLM model produces 384-dimensional embeddings; the stand-in matches it.
+    results["model_load"], model_name = bench_model_load(args.skip_model, dim=384)
+    dim = len(get_embedding_model(model_name).encode("dimension probe"))
+    results["query_encode"] = bench_query_encode(model_name, args.repeat)
+
+    db_path = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        results["vector_query"] = {}
+        stores = {}
+        for backend in backends:
+            results["vector_query"][backend] = {}
+            for size in sizes:
+                print(f"Building {backend} store with {size} documents...", flush=True)
+                store = build_store(backend, size, dim, os.path.join(db_path, backend))
+                results["vector_query"][backend][str(size)] = bench_vector_query(store, dim, args.repeat)
+                stores[(backend, size)] = store
+        results["bm25"] = {str(size): bench_bm25(size, args.repeat) for size in sizes}
+        results["prompt_build"] = bench_prompt_build(args.repeat)
+        results.update(bench_generation(max(1, args.repeat // 10)))
+
+        e2e_store = stores[(backends[0], sizes[0])]
+        retriever = Retriever(f"bench_{sizes[0]}", store=e2e_store, model_name=model_name, hybrid=False)
+        results["end_to_end"] = bench_end_to_end(retriever, levels, args.turns)
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        project_root, "benchmarks", "results", datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = write_report(results, config, output)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_reports(json.load(f), report)
+        print("\n".join(["p95 regressions:"] + regressions) if regressions else "No p95 regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/vector_storage.py
+"""
+Memory and recall of the NumPy backend's vector storage modes.
+
+Every storage mode indexes the same vectors, and its top-k results are compared with an
+exact float32 scan. Recall is reported with and without re-ranking against the float32
+rows. Memory is reported per million vectors: what each query scans (and so must stay in
+RAM for fast search) and what is kept on disk. Vectors are either real embeddings from
+the embedding cache (`--embeddings <model>.f32 --dim 384`) or synthetic clustered ones.
+
+Usage:
+    python benchmarks/vector_storage.py --size 100000 --modes float32,float16,int8,pq
+    python benchmarks/vector_storage.py --embeddings cache/embeddings/<model>.f32 --dim 384
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from benchmarks.harness import measure, write_report
+from src.config import VECTOR_RERANK_FACTOR
+from src.vector_store import NumpyVectorStore
+
+MILLION = 1_000_000
+
+def clustered_vectors(size: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Returns unit vectors drawn around random centers; embeddings of related texts cluster similarly."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, size=size)] + 0.5 * rng.normal(size=(size, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def build(directory: str, storage: str, vectors: np.ndarray, rerank_factor: int) -> NumpyVectorStore:
+    store = NumpyVectorStore(directory, storage=storage, rerank_factor=rerank_factor)
+    ids = [str(i) for i in range(len(vectors))]
+    store.add(ids=ids, embeddings=vectors, documents=[""] * len(ids), metadatas=[{}] * len(ids))
+    store.flush()
+    return store
+
+def recall(expected: List[List[str]], found: List[List[str]]) -> float:
+    return float(np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory and recall of the vector storage modes.")
+    parser.add_argument("--modes", default="float32,float16,int8,pq", help="Comma-separated storage modes.")
+    parser.add_argument("--size", type=int, default=100000, help="Number of synthetic vectors.")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension.")
+    parser.add_argument("--embeddings", default=None, help="A float32 matrix file (e.g. from the embedding cache) to use instead of synthetic vectors.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries, taken from the vectors with added noise.")
+    parser.add_argument("--k", type=int, default=5, help="Results per query.")
+    parser.add_argument("--rerank-factor", type=int, default=VECTOR_RERANK_FACTOR, help="Candidates re-ranked per result.")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed single queries per mode.")
+    parser.add_argument("--output", default=None, help="Where to write the JSON report (default: benchmarks/results/storage-<timestamp>.json).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.embeddings:
+        vectors = np.fromfile(args.embeddings, dtype=np.float32).reshape(-1, args.dim)
+    else:
+        vectors = clustered_vectors(args.size, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+    directory = tempfile.mkdtemp(prefix="rag-storage-")
+    results: Dict[str, Dict[str, object]] = {}
+    try:
+        exact = build(os.path.join(directory, "exact"), "float32", vectors, 0).query(queries, args.k)["ids"]
+        for mode in args.modes.split(","):
+            print(f"Building {mode} store with {len(vectors)} vectors...", flush=True)
+            store = build(os.path.join(directory, mode), mode, vectors, args.rerank_factor)
+            stats = store.storage_stats()
+            reranked = store.query(queries, args.k)["ids"]
+            store.rerank_factor = 0
+            scanned_only = store.query(queries, args.k)["ids"]
+            store.rerank_factor = args.rerank_factor
+            single = iter(queries.tolist() * (args.repeat + 1))
+            results[mode] = {
+                "memory_mb_per_million": stats["scanned_bytes_per_vector"] * MILLION / 2**20 + stats["fixed_bytes"] / 2**20,
+                "disk_mb_per_million": stats["disk_bytes_per_vector"] * MILLION / 2**20 + stats["fixed_bytes"] / 2**20,
+                f"recall_at_{args.k}": recall(exact, reranked),
+                f"recall_at_{args.k}_without_rerank": recall(exact, scanned_only),
+                "query": measure(lambda: store.query([next(single)], args.k), args.repeat),
+            }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        project_root, "benchmarks", "results", "storage-" + datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    report = write_report(results, {key: value for key, value in vars(args).items() if key != "output"}, output)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {output}")
+
+if __name__ == "__main__":
+    main()
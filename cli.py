@@ -1,29 +1,18 @@
 import argparse
 import os
 from src.retriever import retrieve_context
-from src.answer_generator import generate_answer, rewrite_query
-from src.config import DB_PATH
+from src.answer_generator import generate_answer, rewrite_and_retrieve
+from src.answer_index import find_canonical_answer
+from src.config import DB_PATH, WARM_UP_ON_START
+from src.language import detect_language
+from src.pipeline import start_warm_up
 import logging
-from langdetect import detect, DetectorFactory
-from langdetect.lang_detect_exception import LangDetectException
 
-# Ensure consistent detection results
-DetectorFactory.seed = 0
-
-# The answer_generator module now handles loading the .env file.
+# The answer_generator module loads the .env file when the model is first created.
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def get_language_name(lang_code):
-    """Converts a language code (e.g., 'en') to its full name (e.g., 'English')."""
-    lang_map = {
-        "en": "English", "es": "Spanish", "fr": "French", "de": "German",
-        "it": "Italian", "pt": "Portuguese", "nl": "Dutch", "ru": "Russian",
-        "zh-cn": "Chinese", "ja": "Japanese", "ko": "Korean", "ar": "Arabic"
-    }
-    return lang_map.get(lang_code, "English")
-
 def main():
     """
     Main function for the command-line interface of the Medical FAQ Chatbot.
@@ -32,6 +21,9 @@ def main():
         logging.error(f"Vector store not found. Please run `build_vector_store.py`.")
         return
 
+    if WARM_UP_ON_START:
+        start_warm_up()
+
     print("--- Medical FAQ Chatbot CLI ---")
     print("Ask a question, or type 'exit' to quit.")
     
@@ -41,20 +33,23 @@ def main():
         if query.lower() == 'exit':
             break
 
-        try:
-            lang_code = detect(query)
-            language = get_language_name(lang_code)
-        except LangDetectException:
-            language = "English"
+        language = detect_language(query)
 
         logging.info(f"Received query: '{query}' (Language: {language})")
 
-        # 1. Rewrite the query
-        rewritten = rewrite_query(query, history[-10:])
-        logging.info(f"Rewritten query: '{rewritten}'")
+        # A standalone question matching a curated FAQ is answered directly.
+        match = find_canonical_answer(query, history[-10:], language=language)
+        if match is not None:
+            print(f"\nBot: {match['answer']}")
+            history.append({"role": "user", "content": query})
+            history.append({"role": "assistant", "content": match["answer"]})
+            continue
 
-        # 2. Retrieve context with the rewritten query
-        retrieved_docs = retrieve_context(rewritten, threshold=0.0)
+        # 1. Rewrite the query (if needed) and 2. retrieve context with it
+        rewritten, retrieved_docs = rewrite_and_retrieve(
+            query, history[-10:], lambda text: retrieve_context(text, threshold=0.0)
+        )
+        logging.info(f"Rewritten query: '{rewritten}'")
 
         if not retrieved_docs:
             print("\nBot: I could not find any relevant information to answer your question.")
@@ -63,7 +58,7 @@ def main():
             continue
 
         # 3. Generate the answer with the original query
-        answer = generate_answer(query, retrieved_docs, language=language)
+        answer = generate_answer(query, retrieved_docs, history=history[-10:], language=language, cache_query=rewritten)
 
         print(f"\nBot: {answer}")
         
@@ -34,7 +34,7 @@ def test_retrieval():
             print(f"\nResult {i+1}:")
             print(f"  Text: {doc['text'][:250]}...")
             print(f"  Metadata: {doc['metadata']}")
-            # The distance is not returned by the current retrieve_context, but this is fine for now.
+            print(f"  Distance: {doc['distance']:.4f}")
 
 if __name__ == "__main__":
     test_retrieval()
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+
+from src import telemetry
+from src.config import (
+    CONTEXT_RETRIEVAL_N_RESULTS,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_WORKERS,
+    SERVER_MAX_IN_FLIGHT,
+    SERVER_MAX_QUEUED,
+    SERVER_QUEUE_TIMEOUT_SECONDS,
+    SERVER_MAX_QUERY_CHARS,
+    WARM_UP_ON_START
+)
+from src.pipeline import answer_question, open_answer_stream, start_warm_up
+from src.retriever import aretrieve_context
+
+# --- Logging ---
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# The same window of conversation the CLI and the web app use.
+HISTORY_MESSAGES = 10
+
+# --- Backpressure ---
+
+class _Ticket:
+    """A slot held by one request. Releasing it more than once is harmless."""
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+class AdmissionController:
+    """
+    Bounds the work a server worker takes on.
+
+    At most `max_in_flight` requests are processed at once; up to `max_queued` more wait
+    for a slot, for at most `queue_timeout` seconds. Anything beyond that is rejected with
+    503 and a Retry-After header, so overload sheds requests to other workers instead of
+    piling up latency. All state lives on the worker's event loop, so no locks are needed.
+    """
+    def __init__(self, max_in_flight: int = SERVER_MAX_IN_FLIGHT, max_queued: int = SERVER_MAX_QUEUED, queue_timeout: float = SERVER_QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        telemetry.increment("server_rejections", reason=reason)
+        return HTTPException(status_code=503, detail=f"Server overloaded ({reason}), retry later.", headers={"Retry-After": "1"})
+
+    async def acquire(self) -> _Ticket:
+        """Waits for a processing slot, or raises a 503 HTTPException if the worker is overloaded."""
+        if self._semaphore.locked() and self.queued >= self.max_queued:
+            raise self._reject("queue full")
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue timeout")
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        return _Ticket(self)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        ticket = await self.acquire()
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self.in_flight, "queued": self.queued, "rejected": self.rejected}
+
+# --- Request Models ---
+
+class Message(BaseModel):
+    role: str
+    content: str
+
+class AskRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=SERVER_MAX_QUERY_CHARS)
+    history: List[Message] = []
+    language: str = "English"
+
+class RetrieveRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=SERVER_MAX_QUERY_CHARS)
+    n_results: int = Field(CONTEXT_RETRIEVAL_N_RESULTS, ge=1, le=50)
+    threshold: float = Field(0.0, ge=0.0)
+
+def _history(request: AskRequest) -> List[Dict[str, str]]:
+    return [message.model_dump() for message in request.history[-HISTORY_MESSAGES:]]
+
+def _sources(context: List[Dict[str, any]]) -> List[str]:
+    return [item.get("metadata", {}).get("source_id", "") for item in context]
+
+def _sse(event: str, data: Dict[str, any]) -> str:
+    """Formats one Server-Sent Event. Data is JSON, so newlines in the answer are safe."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# --- Application ---
+
+def create_app(warm_up: bool = WARM_UP_ON_START, admission: AdmissionController = None) -> FastAPI:
+    """
+    Creates the HTTP API.
+
+    Each worker process shares one warm retriever and language model across all of its
+    requests (through the process-wide registries), and bounds its load with an
+    AdmissionController.
+
+    Args:
+        warm_up: If True, load the models in the background when the worker starts.
+        admission: The admission controller. Defaults to one built from the SERVER_* settings.
+    """
+    state = {"warm_up": None}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if warm_up:
+            state["warm_up"] = start_warm_up()
+        yield
+
+    app = FastAPI(title="Medical FAQ Chatbot API", lifespan=lifespan)
+    app.state.admission = admission or AdmissionController()
+
+    @app.get("/health")
+    async def health():
+        thread = state["warm_up"]
+        ready = thread is None or not thread.is_alive()
+        return {"status": "ok" if ready else "warming_up", **app.state.admission.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return telemetry.prometheus_text()
+
+    @app.post("/retrieve")
+    async def retrieve(request: RetrieveRequest):
+        async with app.state.admission.admit():
+            results = await aretrieve_context(request.query, n_results=request.n_results, threshold=request.threshold)
+        return {"results": results}
+
+    @app.post("/ask")
+    async def ask(request: AskRequest):
+        async with app.state.admission.admit():
+            result = await answer_question(request.query, _history(request), language=request.language)
+        return {"answer": result["answer"], "rewritten": result["rewritten"], "sources": _sources(result["context"])}
+
+    @app.post("/ask/stream")
+    async def ask_stream(request: AskRequest):
+        ticket = await app.state.admission.acquire()
+        try:
+            turn = await open_answer_stream(request.query, _history(request), language=request.language)
+        except BaseException:
+            ticket.release()
+            raise
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                yield _sse("meta", {"rewritten": turn["rewritten"], "sources": _sources(turn["context"])})
+                async for chunk in turn["stream"]:
+                    yield _sse("token", {"text": chunk})
+                yield _sse("done", {})
+            finally:
+                ticket.release()
+
+        # The background task also releases the slot if the stream never started.
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(ticket.release)
+        )
+
+    return app
+
+app = create_app()
+
+def main():
+    """Runs the API with uvicorn. Each worker is a separate process with its own warm models."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the Medical FAQ Chatbot over HTTP.")
+    parser.add_argument("--host", default=SERVER_HOST, help="Interface to bind.")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Number of worker processes.")
+    args = parser.parse_args()
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+from src.config import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_TTL_SECONDS
+)
+
+class SemanticAnswerCache:
+    """
+    A persistent cache of generated answers, looked up by query similarity.
+
+    Answers are bucketed by language and the exact set of retrieved source ids, so a
+    cached answer is only reused when it was grounded in the same context. Within a
+    bucket, the stored query embedding most similar to the new one (cosine similarity)
+    is returned if it reaches `threshold`. Entries are stored in SQLite; the least
+    recently used ones are evicted beyond `max_entries`, and entries older than
+    `ttl` seconds are ignored.
+    """
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: Optional[float] = ANSWER_CACHE_TTL_SECONDS
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bucket TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_bucket ON answers (bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers (last_used_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def _bucket(source_ids: Iterable[str], language: str) -> str:
+        return language.casefold() + "|" + ",".join(sorted(set(source_ids)))
+
+    def lookup(self, embedding: List[float], source_ids: Iterable[str], language: str) -> Optional[str]:
+        """Returns the cached answer most similar to `embedding` in the same bucket, or None."""
+        bucket = self._bucket(source_ids, language)
+        min_created_at = time.time() - self.ttl if self.ttl is not None else 0.0
+        query = array('f', embedding)
+        query_norm = math.sqrt(sum(x * x for x in query)) or 1.0
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding, answer FROM answers WHERE bucket = ? AND created_at >= ?",
+                (bucket, min_created_at)
+            ).fetchall()
+
+            best_id, best_answer, best_score = None, None, -1.0
+            for row_id, blob, answer in rows:
+                stored = array('f')
+                stored.frombytes(blob)
+                if len(stored) != len(query):
+                    continue
+                dot = sum(a * b for a, b in zip(query, stored))
+                stored_norm = math.sqrt(sum(x * x for x in stored)) or 1.0
+                score = dot / (query_norm * stored_norm)
+                if score > best_score:
+                    best_id, best_answer, best_score = row_id, answer, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE answers SET last_used_at = ? WHERE id = ?", (time.time(), best_id))
+            self._conn.commit()
+            self.hits += 1
+        logging.info(f"Answer cache hit (similarity {best_score:.3f}).")
+        return best_answer
+
+    def store(self, embedding: List[float], source_ids: Iterable[str], language: str, answer: str):
+        """Stores a generated answer and evicts the least recently used entries beyond `max_entries`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (bucket, embedding, answer, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (self._bucket(source_ids, language), array('f', embedding).tobytes(), answer, now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM answers WHERE id IN (
+                    SELECT id FROM answers ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Removes all cached answers."""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Returns the cache size and hit/miss counters."""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+def replay_stream(answer: str) -> Iterator[str]:
+    """Replays a cached answer through the streaming interface, a few words per chunk."""
+    words = re.findall(r'\S+\s*', answer)
+    leading = answer[:len(answer) - len(answer.lstrip())]
+    if leading:
+        yield leading
+    for i in range(0, len(words), 8):
+        yield "".join(words[i:i + 8])
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Returns the process-wide answer cache, or None if it is disabled in the configuration."""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -1,27 +1,54 @@
+import asyncio
 import os
-from typing import List, Dict, Iterator
+import re
+import threading
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Iterator, Optional, Tuple
 import logging
+import numpy as np
 from dotenv import load_dotenv
-from src.llm import get_language_model
+from src.llm import LanguageModel, get_language_model, ERROR_MESSAGES
+from src import telemetry
+from src.answer_cache import get_answer_cache, replay_stream
+from src.prompt_builder import dedupe_context, estimate_tokens, fit_context, format_history
+from src.retriever import embed_query, get_retrieval_executor, normalize_query
+from src.config import (
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_HISTORY_TOKEN_BUDGET,
+    REWRITE_MODE,
+    REWRITE_SHORT_QUERY_WORDS,
+    SPECULATION_SIMILARITY_THRESHOLD
+)
 
-# --- Load Environment Variables ---
+# --- Environment Variables ---
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 dotenv_path = os.path.join(project_root, '.env')
-load_dotenv(dotenv_path=dotenv_path)
 
-# --- Initialize Language Model ---
-llm = get_language_model()
+# --- Language Model ---
+# Created on first use rather than at import, so importing this module stays cheap.
+# Tests and benchmarks may replace `llm` directly.
+llm: Optional[LanguageModel] = None
+_llm_lock = threading.Lock()
 
-def rewrite_query(query: str, history: List[Dict[str, str]]) -> str:
+def get_llm() -> LanguageModel:
+    """Returns the shared language model, loading the .env file and creating the model on first use."""
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                load_dotenv(dotenv_path=dotenv_path)
+                llm = get_language_model()
+    return llm
+
+def _rewrite_prompt(query: str, history: List[Dict[str, str]]) -> str:
     """
-    Rewrites a follow-up query into a standalone question using the conversation history.
+    Helper function to construct the prompt that turns a follow-up into a standalone question.
+
+    The history is formatted like the answer prompt's, so long conversations stay within
+    PROMPT_HISTORY_TOKEN_BUDGET and older messages reuse their memoized compacted form.
     """
-    if not history:
-        return query
+    history_str = format_history(history)
 
-    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
-    
-    prompt = f"""Based on the conversation history below, rewrite the user's final question to be a standalone question. If the final question is already standalone, just return it as is.
+    return f"""Based on the conversation history below, rewrite the user's final question to be a standalone question. If the final question is already standalone, just return it as is.
 
 Conversation History:
 ---
@@ -31,25 +58,157 @@ Conversation History:
 User's Final Question: {query}
 
 Rewritten Question:"""
-    
-    rewritten_query = llm.generate(prompt)
+
+# --- Rewrite Avoidance ---
+# Words and openings that refer back to the conversation ("is it contagious?", "what
+# about children?"). A follow-up without them is usually already standalone.
+_FOLLOW_UP_WORDS = frozenset({
+    "it", "its", "they", "them", "their", "this", "that", "these", "those", "he", "she", "him", "her", "there",
+    "eso", "esto", "ello", "él", "ella", "ellos", "ellas", "esa", "ese", "esos", "esas",
+    "cela", "ça", "il", "elle", "ils", "elles", "ceci",
+    "dies", "diese", "dieser", "dieses", "er", "ihn", "ihm", "ihr",
+})
+_FOLLOW_UP_PREFIXES = ("and ", "what about", "how about", "what else", "y ", "et ", "und ", "e ")
+
+_rewrite_stats_lock = threading.Lock()
+_rewrite_stats = {"follow_ups": 0, "skipped": 0, "rewritten": 0, "speculative_hits": 0, "re_retrieved": 0}
+
+def _count(name: str):
+    with _rewrite_stats_lock:
+        _rewrite_stats[name] += 1
+    telemetry.increment("rewrite_decisions", outcome=name)
+
+def get_rewrite_stats() -> Dict[str, float]:
+    """Returns how many follow-ups were rewritten or skipped, and how often speculative retrieval was reused."""
+    with _rewrite_stats_lock:
+        stats = dict(_rewrite_stats)
+    stats["skip_rate"] = stats["skipped"] / stats["follow_ups"] if stats["follow_ups"] else 0.0
+    return stats
+
+def needs_rewrite(query: str, history: List[Dict[str, str]]) -> bool:
+    """
+    Cheaply decides whether a query depends on the conversation history.
+
+    Very short queries, queries with pronouns and queries opening with follow-up phrasing
+    ("what about ...") are rewritten; anything else is treated as standalone. With
+    REWRITE_MODE 'always', every query with history is rewritten.
+    """
+    if not history:
+        return False
+    if REWRITE_MODE == "always":
+        return True
+    text = query.casefold().lstrip("¿¡ ")
+    words = re.findall(r"\w+", text)
+    if len(words) <= REWRITE_SHORT_QUERY_WORDS:
+        return True
+    if any(word in _FOLLOW_UP_WORDS for word in words):
+        return True
+    return text.startswith(_FOLLOW_UP_PREFIXES)
+
+def _should_rewrite(query: str, history: List[Dict[str, str]]) -> bool:
+    """Records a follow-up turn and whether its rewrite was skipped."""
+    if not history:
+        return False
+    _count("follow_ups")
+    if needs_rewrite(query, history):
+        _count("rewritten")
+        return True
+    _count("skipped")
+    return False
+
+def rewrite_query(query: str, history: List[Dict[str, str]]) -> str:
+    """
+    Rewrites a follow-up query into a standalone question using the conversation history.
+
+    Queries that `needs_rewrite` considers standalone are returned unchanged without
+    calling the model, as is the original query if the rewrite fails.
+    """
+    if not _should_rewrite(query, history):
+        return query
+
+    with telemetry.span("rewrite"):
+        rewritten_query = get_llm().generate(_rewrite_prompt(query, history))
+    if _is_error(rewritten_query):
+        return query
     # The logging of the rewritten query is useful for transparency, so we'll keep it.
     # A more advanced system might make this configurable.
     # logging.info(f"Rewritten query: '{rewritten_query}'")
     return rewritten_query
 
-def _construct_prompt(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]], language: str) -> str:
-    """Helper function to construct the final prompt for the answer generation."""
-    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
-    
-    context_parts = []
-    for i, item in enumerate(context):
-        text = item.get("text", "")
-        source = item.get("metadata", {}).get("source_id", f"Source {i+1}")
-        context_parts.append(f"Source: [{source}]\nContent: {text}")
-    context_str = "\n\n".join(context_parts)
-    
-    if not context:
+def _same_meaning(
+    query: str,
+    rewritten: str,
+    context: List[Dict[str, any]],
+    probe: Optional[Callable[[str], List[str]]]
+) -> bool:
+    """Compares the cached query embeddings, then the sources a vector-only search finds for the rewrite."""
+    if normalize_query(rewritten) == normalize_query(query):
+        return True
+    try:
+        a = np.asarray(embed_query(query), dtype=np.float32)
+        b = np.asarray(embed_query(rewritten), dtype=np.float32)
+        denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+        if denominator and float(a @ b) / denominator >= SPECULATION_SIMILARITY_THRESHOLD:
+            return True
+        if probe is None:
+            return False
+        source_ids = {item.get("metadata", {}).get("source_id") for item in context}
+        return set(probe(rewritten)) == source_ids
+    except Exception as e:
+        logging.warning(f"Could not compare the rewritten query with the raw one: {e}")
+        return False
+
+def _resolve_speculation(
+    query: str,
+    rewritten: str,
+    context: List[Dict[str, any]],
+    probe: Optional[Callable[[str], List[str]]] = None
+) -> bool:
+    """Returns whether `context`, retrieved for the raw query, can stand in for the rewritten one."""
+    if _same_meaning(query, rewritten, context, probe):
+        _count("speculative_hits")
+        return True
+    _count("re_retrieved")
+    return False
+
+def rewrite_and_retrieve(
+    query: str,
+    history: List[Dict[str, str]],
+    retrieve: Callable[[str], List[Dict[str, any]]],
+    probe: Optional[Callable[[str], List[str]]] = None
+) -> Tuple[str, List[Dict[str, any]]]:
+    """
+    Rewrites a follow-up query and retrieves context for it, avoiding LLM latency where possible.
+
+    Standalone queries skip the rewrite. In 'speculative' mode, retrieval with the raw
+    query runs in parallel with the rewrite, and its results are used as-is unless the
+    rewrite changed the query's meaning: its embedding is less than
+    SPECULATION_SIMILARITY_THRESHOLD cosine-similar to the raw query's, and `probe`
+    (if given) finds different sources for it.
+
+    Args:
+        query: The user's query.
+        history: The previous messages of the conversation.
+        retrieve: Called with a query; returns the retrieved documents.
+        probe: Called with a query; returns the source ids of a cheap vector-only search.
+
+    Returns:
+        The query used for retrieval (the rewritten one, if any) and the retrieved documents.
+    """
+    if REWRITE_MODE != "speculative" or not needs_rewrite(query, history):
+        rewritten = rewrite_query(query, history)
+        return rewritten, retrieve(rewritten)
+
+    speculative = get_retrieval_executor().submit(retrieve, query)
+    rewritten = rewrite_query(query, history)
+    context = speculative.result()
+    if _resolve_speculation(query, rewritten, context, probe):
+        return rewritten, context
+    return rewritten, retrieve(rewritten)
+
+def _render_prompt(query: str, context_str: str, history_str: str, language: str, has_context: bool) -> str:
+    """Fills in the answer prompt template."""
+    if not has_context:
         return f"""You are a helpful medical assistant. The user has asked: '{query}'. No relevant context was found. Inform the user you cannot answer. Consider the conversation history for context.
 
 Conversation History:
@@ -75,12 +234,173 @@ Context:
 Question: {query}
 """
 
-def generate_answer(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English") -> str:
-    """Constructs a prompt and generates a complete answer."""
-    prompt = _construct_prompt(query, context, history, language)
-    return llm.generate(prompt)
+def _format_context_item(i: int, item: Dict[str, any]) -> str:
+    source = item.get("metadata", {}).get("source_id", f"Source {i+1}")
+    return f"Source: [{source}]\nContent: {item.get('text', '')}"
+
+# The "Source: [...]\nContent: " header of a typical item plus the blank line between items.
+_CONTEXT_ITEM_OVERHEAD_TOKENS = estimate_tokens(_format_context_item(0, {"metadata": {"source_id": "x" * 12}})) + 1
+
+def _construct_prompt(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]], language: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """
+    Helper function to construct the final prompt for the answer generation.
+
+    The prompt is kept within `token_budget` (estimated) tokens: the template and question
+    always fit, the history gets up to PROMPT_HISTORY_TOKEN_BUDGET with older turns
+    compacted, and deduplicated context fills what is left, best-ranked first.
+    """
+    remaining = token_budget - estimate_tokens(_render_prompt(query, "", "", language, bool(context)))
+    history_str = format_history(history, max(0, min(PROMPT_HISTORY_TOKEN_BUDGET, remaining)))
+    remaining -= estimate_tokens(history_str)
+
+    selected = fit_context(dedupe_context(context), max(0, remaining), _CONTEXT_ITEM_OVERHEAD_TOKENS)
+    context_str = "\n\n".join(_format_context_item(i, item) for i, item in enumerate(selected))
+    return _render_prompt(query, context_str, history_str, language, bool(context))
+
+def _build_prompt(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]], language: str) -> str:
+    """Constructs the answer prompt, reporting its build time and estimated token count."""
+    with telemetry.span("prompt_build", context_items=len(context), history_messages=len(history)) as span:
+        prompt = _construct_prompt(query, context, history, language)
+        prompt_tokens = estimate_tokens(prompt)
+        span.set("prompt_tokens", prompt_tokens)
+    telemetry.observe("prompt_tokens", prompt_tokens)
+    logging.debug(f"Answer prompt: ~{prompt_tokens} tokens ({len(context)} context items, {len(history)} history messages).")
+    return prompt
+
+def _answer_cache_key(cache_query: Optional[str], context: List[Dict[str, any]], language: str) -> Optional[Tuple[List[float], List[str], str]]:
+    """Returns the (embedding, source ids, language) answer cache key, or None if caching does not apply."""
+    if not cache_query or not context or get_answer_cache() is None:
+        return None
+    source_ids = [item.get("metadata", {}).get("source_id", "") for item in context]
+    return embed_query(cache_query), source_ids, language
+
+def _lookup_answer(cache_key: Optional[Tuple[List[float], List[str], str]]) -> Optional[str]:
+    """Returns the cached answer for `cache_key`, counting hits and misses."""
+    if not cache_key:
+        return None
+    cached = get_answer_cache().lookup(*cache_key)
+    telemetry.increment("cache_requests", cache="answer", result="miss" if cached is None else "hit")
+    return cached
+
+def _is_error(answer: str) -> bool:
+    return any(answer.endswith(message) for message in ERROR_MESSAGES)
+
+def generate_answer(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English", cache_query: Optional[str] = None) -> str:
+    """
+    Constructs a prompt and generates a complete answer.
+
+    If `cache_query` (normally the rewritten, standalone query) is given, the semantic
+    answer cache is consulted first and the generated answer is stored in it.
+    """
+    cache_key = _answer_cache_key(cache_query, context, language)
+    cached = _lookup_answer(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = _build_prompt(query, context, history, language)
+    answer = get_llm().generate(prompt)
+
+    if cache_key and not _is_error(answer):
+        get_answer_cache().store(*cache_key, answer)
+    return answer
+
+def generate_answer_stream(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English", cache_query: Optional[str] = None) -> Iterator[str]:
+    """
+    Constructs a prompt and generates a streamed answer.
+
+    With `cache_query`, a cached answer is replayed through the stream instead of calling
+    the model, and a freshly streamed answer is stored once it has been fully consumed.
+    """
+    cache_key = _answer_cache_key(cache_query, context, language)
+    cached = _lookup_answer(cache_key)
+    if cached is not None:
+        return replay_stream(cached)
+
+    prompt = _build_prompt(query, context, history, language)
+    stream = get_llm().generate_stream(prompt)
+    if not cache_key:
+        return stream
+    return _stream_and_store(stream, cache_key)
+
+def _stream_and_store(stream: Iterator[str], cache_key: Tuple[List[float], List[str], str]) -> Iterator[str]:
+    """Passes the stream through and caches the full answer once the stream completes."""
+    chunks = []
+    for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    answer = "".join(chunks)
+    if answer and not _is_error(answer):
+        get_answer_cache().store(*cache_key, answer)
+
+# --- Async API ---
+# The async variants share the prompts and answer cache with the functions above. Model
+# calls go through `agenerate`/`agenerate_stream`, which limit concurrent LLM requests;
+# answer cache lookups (which embed the query) run in a worker thread.
+
+async def arewrite_query(query: str, history: List[Dict[str, str]]) -> str:
+    """Async variant of `rewrite_query`."""
+    if not _should_rewrite(query, history):
+        return query
+    with telemetry.span("rewrite"):
+        rewritten_query = await get_llm().agenerate(_rewrite_prompt(query, history))
+    return query if _is_error(rewritten_query) else rewritten_query
+
+async def arewrite_and_retrieve(
+    query: str,
+    history: List[Dict[str, str]],
+    aretrieve: Callable[[str], Awaitable[List[Dict[str, any]]]],
+    probe: Optional[Callable[[str], List[str]]] = None
+) -> Tuple[str, List[Dict[str, any]]]:
+    """
+    Async variant of `rewrite_and_retrieve`; `aretrieve` is awaited with a query, while
+    `probe` stays synchronous and runs in a worker thread.
+    """
+    if REWRITE_MODE != "speculative" or not needs_rewrite(query, history):
+        rewritten = await arewrite_query(query, history)
+        return rewritten, await aretrieve(rewritten)
+
+    speculative = asyncio.ensure_future(aretrieve(query))
+    try:
+        rewritten = await arewrite_query(query, history)
+    except BaseException:
+        speculative.cancel()
+        raise
+    context = await speculative
+    if await asyncio.to_thread(_resolve_speculation, query, rewritten, context, probe):
+        return rewritten, context
+    return rewritten, await aretrieve(rewritten)
+
+async def _alookup_cached_answer(cache_query: Optional[str], context: List[Dict[str, any]], language: str):
+    """Returns the answer cache key and the cached answer (or None) without blocking the event loop."""
+    def lookup():
+        cache_key = _answer_cache_key(cache_query, context, language)
+        return cache_key, _lookup_answer(cache_key)
+    return await asyncio.to_thread(lookup)
+
+async def agenerate_answer(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English", cache_query: Optional[str] = None) -> str:
+    """Async variant of `generate_answer`."""
+    cache_key, cached = await _alookup_cached_answer(cache_query, context, language)
+    if cached is not None:
+        return cached
+
+    answer = await get_llm().agenerate(_build_prompt(query, context, history, language))
+
+    if cache_key and not _is_error(answer):
+        await asyncio.to_thread(get_answer_cache().store, *cache_key, answer)
+    return answer
+
+async def agenerate_answer_stream(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English", cache_query: Optional[str] = None) -> AsyncIterator[str]:
+    """Async variant of `generate_answer_stream`."""
+    cache_key, cached = await _alookup_cached_answer(cache_query, context, language)
+    if cached is not None:
+        for chunk in replay_stream(cached):
+            yield chunk
+        return
 
-def generate_answer_stream(query: str, context: List[Dict[str, any]], history: List[Dict[str, str]] = [], language: str = "English") -> Iterator[str]:
-    """Constructs a prompt and generates a streamed answer."""
-    prompt = _construct_prompt(query, context, history, language)
-    return llm.generate_stream(prompt)
\ No newline at end of file
+    chunks = []
+    async for chunk in get_llm().agenerate_stream(_build_prompt(query, context, history, language)):
+        chunks.append(chunk)
+        yield chunk
+    answer = "".join(chunks)
+    if cache_key and answer and not _is_error(answer):
+        await asyncio.to_thread(get_answer_cache().store, *cache_key, answer)
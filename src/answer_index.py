@@ -0,0 +1,142 @@
+# src/answer_index.py
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src import telemetry
+from src.answer_generator import needs_rewrite
+from src.config import (
+    DB_PATH,
+    FAST_PATH_ENABLED,
+    FAST_PATH_COLLECTION_NAME,
+    FAST_PATH_SIMILARITY_THRESHOLD,
+    VECTOR_BACKEND
+)
+from src.retriever import get_retrieval_executor, get_retriever
+
+# --- Fast-Path Statistics ---
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "follow_ups": 0, "unavailable": 0, "below_threshold": 0, "language_mismatches": 0}
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats["lookups"] += 1
+        _stats[outcome] += 1
+    telemetry.increment("fast_path_lookups", outcome=outcome)
+
+def get_fast_path_stats() -> Dict[str, float]:
+    """Returns how many turns were looked up in the canonical answer index, why they missed, and the hit rate."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denominator if denominator else 0.0
+
+def find_canonical_answer(
+    query: str,
+    history: List[Dict[str, str]],
+    language: str = "English",
+    collection_name: str = FAST_PATH_COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = FAST_PATH_SIMILARITY_THRESHOLD,
+    backend: str = VECTOR_BACKEND
+) -> Optional[Dict[str, any]]:
+    """
+    Looks a query up in the index of curated FAQ questions.
+
+    Only standalone queries are looked up: a follow-up needs the conversation to be
+    understood, so it always goes through the rewrite. Any failure (no index built, no
+    model) is a miss, so the regular pipeline answers instead.
+
+    Args:
+        query: The user's question, as typed.
+        history: The previous messages of the conversation.
+        language: The language to answer in; must be the curated answer's language.
+        collection_name: The collection of canonical questions.
+        db_path: Path for the persistent database.
+        threshold: The minimum cosine similarity to the canonical question.
+        backend: The vector backend ('chroma' or 'numpy').
+
+    Returns:
+        None on a miss. On a hit, the cited curated 'answer', the matched canonical
+        'question', its 'source_id' and 'similarity', and the answer as a one-item 'context'.
+    """
+    if not FAST_PATH_ENABLED or not db_path or not os.path.exists(db_path):
+        return None
+    if needs_rewrite(query, history):
+        _count("follow_ups")
+        return None
+
+    with telemetry.span("fast_path", collection=collection_name) as span:
+        try:
+            retriever = get_retriever(collection_name, db_path=db_path, backend=backend)
+            if retriever.store.count() == 0:
+                _count("unavailable")
+                return None
+            embedding = retriever.embed_query(query)
+            results = retriever.store.query([embedding], 1)
+            if not results["ids"][0]:
+                _count("unavailable")
+                return None
+            doc_id, metadata = results["ids"][0][0], results["metadatas"][0][0]
+            similarity = _cosine(embedding, retriever.store.get([doc_id])["embeddings"][0])
+        except Exception as e:
+            logging.warning(f"Canonical answer lookup failed; answering through the pipeline: {e}")
+            _count("unavailable")
+            return None
+
+        span.set("similarity", similarity)
+        if similarity < threshold:
+            _count("below_threshold")
+            return None
+        if metadata.get("language", "English") != language:
+            _count("language_mismatches")
+            return None
+        _count("hits")
+
+    source_id = metadata["source_id"]
+    logging.info(f"Answered from canonical question {source_id} (similarity {similarity:.3f}).")
+    answer = f"{metadata['answer'].strip()} [{source_id}]"
+    return {
+        "answer": answer,
+        "question": results["documents"][0][0],
+        "source_id": source_id,
+        "similarity": similarity,
+        "context": [{"text": answer, "metadata": {"source_id": source_id}, "distance": results["distances"][0][0]}],
+    }
+
+async def afind_canonical_answer(
+    query: str,
+    history: List[Dict[str, str]],
+    language: str = "English",
+    collection_name: str = FAST_PATH_COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = FAST_PATH_SIMILARITY_THRESHOLD,
+    backend: str = VECTOR_BACKEND
+) -> Optional[Dict[str, any]]:
+    """Async variant of `find_canonical_answer`; the lookup runs on the retrieval thread pool."""
+    if not FAST_PATH_ENABLED or not db_path or not os.path.exists(db_path):
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_retrieval_executor(), functools.partial(
+        contextvars.copy_context().run,
+        find_canonical_answer,
+        query,
+        history,
+        language=language,
+        collection_name=collection_name,
+        db_path=db_path,
+        threshold=threshold,
+        backend=backend
+    ))
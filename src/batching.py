@@ -0,0 +1,109 @@
+# src/batching.py
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from src import telemetry
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesces concurrent single-item requests into batched calls.
+
+    Callers block in `run(item)` while a worker thread groups queued items and processes
+    them with one `process_batch(items)` call, which must return one result per item in
+    order. A request that arrives while the worker is idle is processed at once, so a lone
+    caller pays no extra latency; requests that pile up while a batch is being processed
+    form the next batch, which waits up to `max_wait` seconds (measured from its oldest
+    request) to fill up to `max_batch_size` items.
+    """
+    def __init__(self, process_batch: Callable[[List[T]], List[R]], max_batch_size: int = 32, max_wait: float = 0.005, name: str = "micro-batcher"):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be a positive integer.")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.Queue[Tuple[T, Future, float]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "items": 0, "max_batch_size": 0, "queue_delay_seconds": 0.0}
+
+    def submit(self, item: T) -> "Future[R]":
+        """Queues `item` and returns a future for its result."""
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run_worker, name=self.name, daemon=True)
+                    self._worker.start()
+        future: "Future[R]" = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item: T) -> R:
+        """Processes `item` as part of the next batch and returns its result."""
+        return self.submit(item).result()
+
+    def _collect(self) -> List[Tuple[T, Future, float]]:
+        """Blocks for the next request, then gathers the batch it starts."""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            # A single request means there is no concurrent load to wait for.
+            if len(batch) == 1 or remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_worker(self):
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+            delays = [started_at - enqueued_at for _, _, enqueued_at in batch]
+            self._record(len(batch), delays)
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: expected {len(batch)} results, got {len(results)}.")
+            except Exception as e:
+                logging.error(f"{self.name}: batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _record(self, size: int, delays: List[float]):
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += size
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], size)
+            self._stats["queue_delay_seconds"] += sum(delays)
+        telemetry.observe("batch_size", size, batcher=self.name)
+        for delay in delays:
+            telemetry.observe("batch_queue_delay_seconds", delay, batcher=self.name)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the number of batches and items, the mean and largest batch size and the mean queueing delay."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        items = stats.pop("queue_delay_seconds")
+        stats["mean_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_queue_delay_ms"] = 1000.0 * items / stats["items"] if stats["items"] else 0.0
+        return stats
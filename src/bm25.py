@@ -0,0 +1,209 @@
+# src/bm25.py
+
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import weakref
+
+from src.vector_store import VectorStore
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into case-folded word tokens. Works for any script with word characters."""
+    return _TOKEN_RE.findall(text.casefold())
+
+class BM25Index:
+    """
+    An Okapi BM25 inverted index over a fixed set of documents.
+
+    Postings are kept in two flat arrays (document numbers and term frequencies), sliced
+    per term through an offsets array, so the index stays compact in memory and can be
+    written to and read from disk without per-posting objects.
+    """
+    def __init__(
+        self,
+        ids: List[str],
+        terms: List[str],
+        offsets: array,
+        postings_docs: array,
+        postings_tfs: array,
+        doc_lengths: array,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        self._terms = terms
+        self._offsets = offsets
+        self._postings_docs = postings_docs
+        self._postings_tfs = postings_tfs
+        self._doc_lengths = doc_lengths
+        self._avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Builds an index from (id, text) pairs."""
+        ids: List[str] = []
+        doc_lengths = array('I')
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_number, (doc_id, text) in enumerate(documents):
+            ids.append(doc_id)
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            counts: Dict[str, int] = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, tf in counts.items():
+                postings[token].append((doc_number, tf))
+
+        terms = sorted(postings)
+        offsets = array('I', [0])
+        postings_docs = array('I')
+        postings_tfs = array('H')
+        for term in terms:
+            for doc_number, tf in postings[term]:
+                postings_docs.append(doc_number)
+                postings_tfs.append(min(tf, 65535))
+            offsets.append(len(postings_docs))
+        return cls(ids, terms, offsets, postings_docs, postings_tfs, doc_lengths, k1, b)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Returns up to `n_results` (id, score) pairs with a positive score, best first."""
+        n_docs = len(self.ids)
+        if not n_docs or n_results <= 0:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                continue
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            doc_freq = end - start
+            idf = math.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            for i in range(start, end):
+                doc_number = self._postings_docs[i]
+                tf = self._postings_tfs[i]
+                length_norm = 1.0 - self.b + self.b * self._doc_lengths[doc_number] / (self._avg_doc_length or 1.0)
+                scores[doc_number] += idf * tf * (self.k1 + 1.0) / (tf + self.k1 * length_norm)
+        best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+        return [(self.ids[doc_number], score) for doc_number, score in best]
+
+    def save(self, path: str):
+        """Writes the index to `path`: a JSON header line followed by the raw posting arrays."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "terms": self._terms,
+            "itemsize": {"offsets": self._offsets.itemsize, "docs": self._postings_docs.itemsize, "lengths": self._doc_lengths.itemsize},
+            "byteorder": "little",
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+            for values in (self._offsets, self._postings_docs, self._postings_tfs, self._doc_lengths):
+                f.write(_to_little_endian(values).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Reads an index written by `save`."""
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            data = f.read()
+
+        n_terms, n_docs = len(header["terms"]), len(header["ids"])
+        offsets = _array_from(data, 0, 'I', n_terms + 1)
+        position = offsets.itemsize * (n_terms + 1)
+        n_postings = offsets[-1]
+        postings_docs = _array_from(data, position, 'I', n_postings)
+        position += postings_docs.itemsize * n_postings
+        postings_tfs = _array_from(data, position, 'H', n_postings)
+        position += postings_tfs.itemsize * n_postings
+        doc_lengths = _array_from(data, position, 'I', n_docs)
+        return cls(header["ids"], header["terms"], offsets, postings_docs, postings_tfs, doc_lengths, header["k1"], header["b"])
+
+def _to_little_endian(values: array) -> array:
+    if sys.byteorder == "little":
+        return values
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped
+
+def _array_from(data: bytes, position: int, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.frombytes(data[position:position + values.itemsize * count])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses several rankings of ids with Reciprocal Rank Fusion: score = sum of 1 / (k + rank).
+
+    Returns:
+        (id, score) pairs, best first. Ties keep the order in which ids were first seen.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+# --- Index Registry ---
+# Indexes built for in-memory stores (no db_path) are kept here per store owner (e.g. the
+# ChromaDB client) and collection name, and dropped with the owner; persisted indexes are
+# loaded once and reloaded only when the file changes.
+_indexes_lock = threading.Lock()
+_memory_indexes: "weakref.WeakKeyDictionary[object, Dict[str, BM25Index]]" = weakref.WeakKeyDictionary()
+_loaded_indexes: Dict[str, Tuple[Tuple[int, int], BM25Index]] = {}
+
+def bm25_index_path(collection_name: str, db_path: Optional[str], backend: str) -> Optional[str]:
+    """Returns where the BM25 index of a collection is stored, or None for in-memory stores."""
+    if not db_path:
+        return None
+    return os.path.join(db_path, "bm25", backend, f"{collection_name}.bm25")
+
+def publish_bm25_index(index: BM25Index, collection_name: str, store: VectorStore, db_path: Optional[str] = None):
+    """Saves the index of `store`'s collection next to it (or in memory) for retrievers to pick up."""
+    path = bm25_index_path(collection_name, db_path, store.backend)
+    with _indexes_lock:
+        if path is None:
+            _memory_indexes.setdefault(store.owner, {})[collection_name] = index
+            return
+    index.save(path)
+    logging.info(f"Saved BM25 index with {len(index)} documents to {path}")
+
+def get_bm25_index(collection_name: str, store: VectorStore, db_path: Optional[str] = None) -> Optional[BM25Index]:
+    """Returns the BM25 index of `store`'s collection, loading it once per file version, or None if there is none."""
+    path = bm25_index_path(collection_name, db_path, store.backend)
+    with _indexes_lock:
+        if path is None:
+            return _memory_indexes.get(store.owner, {}).get(collection_name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached = _loaded_indexes.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        index = BM25Index.load(path)
+        _loaded_indexes[path] = (version, index)
+        logging.info(f"Loaded BM25 index with {len(index)} documents from {path}")
+        return index
@@ -1,7 +1,10 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Set, Tuple
+import hashlib
+import itertools
 import logging
+import queue
+import threading
+import time
 from tqdm import tqdm
 import os
 
@@ -14,81 +17,381 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
-from src.config import DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL_NAME, DATA_PATH
+from src.config import (
+    DB_PATH,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL_NAME,
+    DATA_PATH,
+    ENCODE_BATCH_SIZE,
+    WRITE_BATCH_SIZE,
+    ENCODE_PROCESSES,
+    CHUNKING_ENABLED,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    HYBRID_RETRIEVAL,
+    VECTOR_BACKEND,
+    FAST_PATH_ENABLED,
+    FAST_PATH_COLLECTION_NAME
+)
+from src import telemetry
+from src.lazy_import import lazy_import
+from src.bm25 import BM25Index, get_bm25_index, publish_bm25_index
+from src.data_loader import chunk_documents
+from src.retriever import get_embedding_model, invalidate_collection
+from src.vector_store import VectorStore, open_vector_store
+from src.embedding_backends import embedding_model_key
+from src.embedding_cache import encode_texts
+from src.language import detect_language
+
+chromadb = lazy_import("chromadb")
+
+def document_id(text: str) -> str:
+    """Returns a stable id derived from a document's content."""
+    return "doc_" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+_CHUNK_METADATA_KEYS = ("chunk_index", "chunk_start", "chunk_end")
+# Stored with the canonical questions of the answer index.
+_ANSWER_METADATA_KEYS = ("answer", "language")
+# How many collapsed duplicates are named in the build log.
+_LOGGED_DUPLICATES = 10
+
+def _document_metadata(doc: Dict[str, any]) -> Dict[str, any]:
+    """Returns the metadata stored with a document: its source_id plus chunk offsets or a curated answer, if any."""
+    metadata = {"source_id": doc['source_id']}
+    for key in _CHUNK_METADATA_KEYS + _ANSWER_METADATA_KEYS:
+        if key in doc:
+            metadata[key] = doc[key]
+    return metadata
+
+def _max_chunk_tokens(model) -> int:
+    """Returns the chunk size that fits the model's maximum sequence length, including special tokens."""
+    if CHUNK_MAX_TOKENS:
+        return CHUNK_MAX_TOKENS
+    special_tokens = model.tokenizer.num_special_tokens_to_add(pair=False)
+    return model.max_seq_length - special_tokens
+
+def _chunk_lazily(docs: Iterable[Dict[str, str]], model_name: str, overlap: int) -> Iterator[Dict[str, any]]:
+    """Chunks `docs` by the embedding tokenizer, loading the model only once a document has text."""
+    docs = iter(docs)
+    for doc in docs:
+        if doc and doc.get('text'):
+            model = get_embedding_model(model_name)
+            yield from chunk_documents(itertools.chain([doc], docs), model.tokenizer, _max_chunk_tokens(model), overlap=overlap)
+            return
+
+class _PipelinedWriter:
+    """
+    Embeds documents and adds them to a vector store, overlapping encoding with writes.
+
+    The calling thread encodes batches (optionally through a multi-process pool) and hands
+    complete write batches to a background writer thread through a bounded queue, so the
+    encoder keeps working while the store inserts the previous batch. The embedding model
+    is only loaded once there is something to encode.
+    """
+    def __init__(self, store: VectorStore, model_name: str, write_batch_size: int, encode_processes: int):
+        self.store = store
+        self.model_name = model_name
+        self.write_batch_size = write_batch_size
+        self.encode_processes = encode_processes
+        self.added = 0
+        self.encode_seconds = 0.0
+        self._model = None
+        self._pool = None
+        self._queue: "queue.Queue[Optional[Dict[str, list]]]" = queue.Queue(maxsize=2)
+        self._errors: List[Exception] = []
+        self._pending = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        self._writer = threading.Thread(target=self._write_batches, name="vector-store-writer", daemon=True)
+        self._writer.start()
+
+    def _write_batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self._errors:
+                continue # Keep draining so the encoder never blocks on a dead writer.
+            try:
+                with telemetry.span("index_write", documents=len(batch["ids"])):
+                    self.store.add(**batch)
+            except Exception as e:
+                self._errors.append(e)
+
+    def _raise_if_failed(self):
+        if self._errors:
+            raise self._errors[0]
+
+    def add(self, documents: List[Tuple[str, str, Dict[str, str]]]):
+        """Encodes (id, text, metadata) documents and queues them for insertion."""
+        self._raise_if_failed()
+        if self._model is None:
+            self._model = get_embedding_model(self.model_name)
+            if self.encode_processes > 1:
+                logging.info(f"Starting encode pool with {self.encode_processes} processes.")
+                self._pool = self._model.start_multi_process_pool(target_devices=["cpu"] * self.encode_processes)
+
+        texts_to_embed = [text for _, text, _ in documents]
+        start_time = time.perf_counter()
+        with telemetry.span("index_encode", documents=len(texts_to_embed)):
+            embeddings = encode_texts(self._model, texts_to_embed, embedding_model_key(self.model_name), pool=self._pool).tolist()
+        self.encode_seconds += time.perf_counter() - start_time
+
+        self._pending["ids"].extend(doc_id for doc_id, _, _ in documents)
+        self._pending["documents"].extend(texts_to_embed)
+        self._pending["metadatas"].extend(metadata for _, _, metadata in documents)
+        self._pending["embeddings"].extend(embeddings)
+        self.added += len(documents)
+
+        size = self.write_batch_size
+        while len(self._pending["ids"]) >= size:
+            self._queue.put({key: values[:size] for key, values in self._pending.items()})
+            self._pending = {key: values[size:] for key, values in self._pending.items()}
+
+    def close(self):
+        """Flushes pending documents, waits for the writer and releases the encode pool."""
+        try:
+            if self._pending["ids"] and not self._errors:
+                self._queue.put(self._pending)
+        finally:
+            self._queue.put(None)
+            self._writer.join()
+            if self._pool is not None:
+                self._model.stop_multi_process_pool(self._pool)
+                self._pool = None
+        self._raise_if_failed()
+
+def _batched(docs: Iterable[Dict[str, str]], batch_size: int) -> Iterator[List[Dict[str, str]]]:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def create_vector_store(
-    docs: List[Dict[str, str]], 
-    collection_name: str, 
+    docs: Iterable[Dict[str, str]],
+    collection_name: str,
     model_name: str = EMBEDDING_MODEL_NAME,
-    db_path: Optional[str] = None, 
-    client: Optional[chromadb.Client] = None
-):
+    db_path: Optional[str] = None,
+    client: Optional["chromadb.Client"] = None,
+    incremental: bool = False,
+    chunk: bool = CHUNKING_ENABLED,
+    chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+    batch_size: int = ENCODE_BATCH_SIZE,
+    write_batch_size: int = WRITE_BATCH_SIZE,
+    encode_processes: int = ENCODE_PROCESSES,
+    backend: str = VECTOR_BACKEND
+) -> Dict[str, float]:
     """
-    Creates or updates a ChromaDB vector store from a list of documents.
+    Creates or updates a vector store from a list of documents.
+
+    Each document is stored under an id derived from a hash of its text, so builds are
+    idempotent. Documents repeating the text of an earlier one are collapsed into it (only
+    the first source_id is kept) and counted as 'duplicates'. In incremental mode the existing collection is kept: only documents with
+    new content are embedded, documents no longer present are deleted, and documents whose
+    metadata changed (e.g. a new source_id) are updated without re-embedding. The embedding
+    model (and backend) is recorded in the collection metadata; if it differs from the one
+    the collection was built with, the collection is rebuilt in full. Whenever the
+    collection changes, the BM25 keyword index used for hybrid retrieval is rebuilt from it.
+
+    `docs` may be any iterable, such as the generator returned by `iter_documents`; it is
+    consumed one batch at a time, so only document ids are kept for the whole corpus.
+    With chunking enabled, documents longer than the embedding model's maximum sequence
+    length are split into overlapping token windows instead of being silently truncated.
 
     Args:
-        docs: A list of documents to add to the collection.
+        docs: An iterable of documents to add to the collection.
         collection_name: The name of the collection.
         db_path: Path for the persistent database. If None, an in-memory client must be provided.
         client: An optional chromadb.Client instance. If not provided, a persistent client
                 will be created using db_path.
         model_name: The Sentence Transformers model to use for embeddings.
+        incremental: If True, update the existing collection in place instead of rebuilding it.
+        chunk: If True, split long documents by the embedding tokenizer's token count.
+        chunk_overlap: The number of tokens shared by consecutive chunks.
+        batch_size: The number of documents encoded per batch.
+        write_batch_size: The number of documents inserted per write.
+        encode_processes: If greater than 1, encode with a pool of this many processes.
+        backend: The vector backend ('chroma' or 'numpy') used with `db_path`.
+
+    Returns:
+        A dictionary with the number of 'added', 'updated', 'removed', 'unchanged' and
+        collapsed 'duplicates' documents, plus the embedding throughput in 'docs_per_sec'.
     """
     if client is None:
         if db_path:
             os.makedirs(db_path, exist_ok=True)
-            logging.info(f"Initializing ChromaDB persistent client at path: {db_path}")
-            client = chromadb.PersistentClient(path=db_path)
         else:
             raise ValueError("Either a 'db_path' for a persistent client or a 'client' instance must be provided.")
     else:
         logging.info("Using provided ChromaDB client.")
+    store = open_vector_store(collection_name, db_path=db_path, client=client, backend=backend)
+    model_key = embedding_model_key(model_name)
 
+    if incremental and store.count():
+        built_with = store.get_collection_metadata().get("embedding_model_key")
+        if built_with != model_key:
+            # Ids depend only on the text, so the old vectors would otherwise be kept.
+            logging.warning(
+                f"Collection '{collection_name}' was embedded with {built_with or 'an unrecorded model'}, "
+                f"not {model_key}. Rebuilding it in full."
+            )
+            incremental = False
+
+    if incremental:
+        existing = store.get_metadata()
+        logging.info(f"Incremental update of collection '{collection_name}' ({len(existing)} existing documents).")
+    else:
+        store.reset()
+        existing = {}
+        # Shared retrievers still hold a handle to the deleted collection.
+        invalidate_collection(collection_name)
+    collection_metadata = store.get_collection_metadata()
+    if collection_metadata.get("embedding_model_key") != model_key:
+        store.set_collection_metadata({**collection_metadata, "embedding_model_key": model_key})
+
+    if chunk:
+        docs = _chunk_lazily(docs, model_name, chunk_overlap)
+
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "duplicates": 0, "docs_per_sec": 0.0}
+    seen: Set[str] = set()
+    duplicate_sources: List[str] = []
+    writer = _PipelinedWriter(store, model_name, write_batch_size, encode_processes)
+    start_time = time.perf_counter()
     try:
-        client.delete_collection(name=collection_name)
-        logging.info(f"Successfully deleted existing collection: '{collection_name}'")
-    except Exception:
-        logging.info(f"Collection '{collection_name}' did not exist, creating new one.")
-        pass # Collection doesn't exist, so we don't need to delete it
+        with tqdm(desc="Indexing documents", unit="docs") as progress:
+            for batch in _batched(docs, batch_size):
+                to_add = []
+                to_update = []
+                for doc in batch:
+                    if not doc or not doc.get('text'):
+                        continue
+                    doc_id = document_id(doc['text'])
+                    if doc_id in seen:
+                        # Only the first document with this text is stored, under its source_id.
+                        stats["duplicates"] += 1
+                        if len(duplicate_sources) < _LOGGED_DUPLICATES:
+                            duplicate_sources.append(str(doc.get('source_id')))
+                        continue
+                    seen.add(doc_id)
+                    metadata = _document_metadata(doc)
+                    if doc_id not in existing:
+                        to_add.append((doc_id, doc['text'], metadata))
+                    elif existing[doc_id] != metadata:
+                        to_update.append((doc_id, metadata))
+                    else:
+                        stats["unchanged"] += 1
+
+                if to_update:
+                    store.update_metadata([doc_id for doc_id, _ in to_update], [metadata for _, metadata in to_update])
+                    stats["updated"] += len(to_update)
+                if to_add:
+                    writer.add(to_add)
+                progress.update(len(batch))
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start_time
+    stats["added"] = writer.added
+    if stats["duplicates"]:
+        more = stats["duplicates"] - len(duplicate_sources)
+        logging.warning(
+            f"{stats['duplicates']} documents repeat the text of an earlier document and were collapsed into it: "
+            f"{', '.join(duplicate_sources)}" + (f" and {more} more." if more else ".")
+        )
+
+    to_remove = [doc_id for doc_id in existing if doc_id not in seen]
+    for i in range(0, len(to_remove), write_batch_size):
+        store.delete(to_remove[i:i+write_batch_size])
+    stats["removed"] = len(to_remove)
+    store.flush()
 
-    collection = client.create_collection(name=collection_name)
-    logging.info(f"Successfully created new empty collection: '{collection_name}'")
+    changed = not incremental or stats["added"] or stats["updated"] or stats["removed"]
+    # A provided client's collection is not under db_path, so its index stays in memory.
+    index_db_path = db_path if client is None else None
+    if HYBRID_RETRIEVAL and (changed or get_bm25_index(collection_name, store, index_db_path) is None):
+        # The keyword index covers the same (chunked) documents as the vector store.
+        with telemetry.span("bm25_build", collection=collection_name):
+            publish_bm25_index(BM25Index.build(store.iter_documents()), collection_name, store, index_db_path)
 
-    if not docs:
+    for outcome in ("added", "updated", "removed", "unchanged"):
+        telemetry.increment("indexed_documents", stats[outcome], collection=collection_name, outcome=outcome)
+
+    if not seen and not existing:
         logging.warning("Document list is empty. No new data will be added.")
-        return
+        return stats
 
-    logging.info(f"Loading sentence transformer model: {model_name}")
-    model = SentenceTransformer(model_name)
+    if changed:
+        invalidate_collection(collection_name)
 
-    batch_size = 100
-    logging.info(f"Processing {len(docs)} documents in batches of {batch_size}...")
+    if stats["added"]:
+        stats["docs_per_sec"] = stats["added"] / elapsed if elapsed > 0 else 0.0
+        logging.info(
+            f"Embedded and stored {stats['added']} documents in {elapsed:.2f}s "
+            f"({stats['docs_per_sec']:.1f} docs/sec, {writer.encode_seconds:.2f}s encoding)."
+        )
+    logging.info(
+        f"Vector store update complete: {stats['added']} added, {stats['updated']} updated, "
+        f"{stats['removed']} removed, {stats['unchanged']} unchanged. "
+        f"Collection '{collection_name}' now contains {store.count()} documents."
+    )
+    return stats
 
-    for i in tqdm(range(0, len(docs), batch_size), desc="Embedding documents"):
-        batch_docs = docs[i:i+batch_size]
-        texts_to_embed = [doc['text'] for doc in batch_docs if doc and doc.get('text')]
-        metadatas = [{"source_id": doc['source_id']} for doc in batch_docs if doc and doc.get('text')]
-        
-        if not texts_to_embed:
+def question_documents(docs: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+    """Turns FAQ records into answer index documents: the question as text, with its curated answer, the answer's language and source_id."""
+    for doc in docs:
+        question, answer = doc.get('Question'), doc.get('Answer')
+        if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
             continue
+        yield {"text": question, "source_id": doc['source_id'], "answer": answer, "language": detect_language(answer)}
+
+def build_answer_index(docs: Iterable[Dict[str, str]], collection_name: str = FAST_PATH_COLLECTION_NAME, **kwargs) -> Dict[str, float]:
+    """
+    Indexes the canonical FAQ questions for the answer fast path (see `src/answer_index.py`).
 
-        embeddings = model.encode(texts_to_embed, show_progress_bar=False).tolist()
-        ids = [f"doc_{collection.count() + j}" for j in range(len(texts_to_embed))]
-        
-        collection.add(embeddings=embeddings, documents=texts_to_embed, metadatas=metadatas, ids=ids)
+    Args:
+        docs: FAQ records with 'Question', 'Answer' and 'source_id' keys, as yielded by `iter_documents`.
+        collection_name: The collection of canonical questions.
+        **kwargs: Passed to `create_vector_store`. Questions are short, so they are never chunked.
 
-    logging.info(f"Vector store update complete. Collection '{collection_name}' now contains {collection.count()} documents.")
+    Returns:
+        The statistics returned by `create_vector_store`.
+    """
+    return create_vector_store(question_documents(docs), collection_name, chunk=False, **kwargs)
 
 if __name__ == '__main__':
-    from data_loader import load_data
-    
-    logging.info(f"Loading data from {DATA_PATH}...")
-    documents = load_data(DATA_PATH)
-    
+    import argparse
+    from src.data_loader import iter_documents
+
+    parser = argparse.ArgumentParser(description="Build or update the medical FAQ vector store.")
+    parser.add_argument("--data-path", default=DATA_PATH, help="The FAQ file to index (.csv, .jsonl or .parquet).")
+    parser.add_argument("--full", action="store_true", help="Delete and rebuild the collection instead of updating it incrementally.")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Documents encoded per batch.")
+    parser.add_argument("--write-batch-size", type=int, default=WRITE_BATCH_SIZE, help="Documents inserted per write.")
+    parser.add_argument("--encode-processes", type=int, default=ENCODE_PROCESSES, help="Encode with a pool of this many processes (0 or 1 encodes in-process).")
+    args = parser.parse_args()
+
+    logging.info(f"Streaming data from {args.data_path}...")
+    documents = iter_documents(args.data_path)
+
     # The main script will use the persistent client with config values
     create_vector_store(
-        docs=documents, 
-        collection_name=COLLECTION_NAME, 
+        docs=documents,
+        collection_name=COLLECTION_NAME,
         model_name=EMBEDDING_MODEL_NAME,
-        db_path=DB_PATH
-    )
\ No newline at end of file
+        db_path=DB_PATH,
+        incremental=not args.full,
+        batch_size=args.encode_batch_size,
+        write_batch_size=args.write_batch_size,
+        encode_processes=args.encode_processes
+    )
+    if FAST_PATH_ENABLED:
+        logging.info("Indexing the canonical questions for the answer fast path...")
+        build_answer_index(
+            iter_documents(args.data_path),
+            model_name=EMBEDDING_MODEL_NAME,
+            db_path=DB_PATH,
+            incremental=not args.full,
+            batch_size=args.encode_batch_size,
+            write_batch_size=args.write_batch_size
+        )
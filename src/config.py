@@ -13,15 +13,186 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DB_PATH = os.path.join(PROJECT_ROOT, 'chroma_db')
 DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'medical_faqs.csv')
 
-# --- ChromaDB Configuration ---
+# --- Vector Store Configuration ---
 COLLECTION_NAME = "medical_faqs"
+# 'chroma' stores the collection in ChromaDB; 'numpy' keeps it in memory-mapped NumPy
+# files under DB_PATH/numpy/ and searches it in-process.
+VECTOR_BACKEND = "chroma"
+# Vector storage of the 'numpy' backend: 'float32' (exact), 'float16' (2x smaller),
+# 'int8' (4x smaller) or 'pq' (product quantization, 32x smaller with 48 subvectors of
+# 384-d embeddings). Compact modes scan the small codes and keep the float32 vectors on
+# disk, memory-mapped; the best n_results * VECTOR_RERANK_FACTOR candidates are re-ranked
+# against them, so returned distances are exact. 0 disables the re-ranking.
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+VECTOR_RERANK_FACTOR = 10
+# Product quantization: each vector is split into PQ_SUBVECTORS parts (reduced to a divisor
+# of the dimension if needed), each encoded as one of 256 centroids learned with k-means
+# on up to PQ_TRAIN_SAMPLES vectors whenever the collection is flushed.
+PQ_SUBVECTORS = 48
+PQ_TRAIN_SAMPLES = 16384
+PQ_TRAIN_ITERATIONS = 15
 
 # --- Model Configuration ---
 EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+# How the embedding model runs: 'torch' (full precision, the reference), 'int8' (PyTorch
+# dynamic int8 quantization of the linear layers, CPU only, no extra dependencies) or
+# 'onnx' (ONNX Runtime; needs `optimum[onnxruntime]`). EMBEDDING_ONNX_FILE selects an
+# exported file inside the model repository, e.g. 'onnx/model_qint8_avx512_vnni.onnx'.
+# Check a backend with benchmarks/embedding_backends.py before switching, and rebuild the
+# index with the backend queries will use.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE") or None
 LLM_MODEL_NAME = 'gemini-2.0-flash'
 
+# --- LLM Provider Configuration ---
+# 'gemini' calls the Gemini API. 'simulated' uses a local, deterministic stand-in with
+# configurable latency and error rate, for load tests and offline development.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+SIMULATED_LLM_TTFT_SECONDS = float(os.getenv("SIMULATED_LLM_TTFT_SECONDS", "0.3"))
+SIMULATED_LLM_TOKENS_PER_SECOND = float(os.getenv("SIMULATED_LLM_TOKENS_PER_SECOND", "50"))
+SIMULATED_LLM_ERROR_RATE = float(os.getenv("SIMULATED_LLM_ERROR_RATE", "0.0"))
+SIMULATED_LLM_ANSWER_TOKENS = int(os.getenv("SIMULATED_LLM_ANSWER_TOKENS", "60"))
+SIMULATED_LLM_SEED = int(os.getenv("SIMULATED_LLM_SEED", "0"))
+
+# --- LLM Client Configuration ---
+# Each Gemini request attempt times out after LLM_TIMEOUT_SECONDS, and a call (including
+# retries) gives up after LLM_DEADLINE_SECONDS. Rate-limit (429) and server (5xx) errors
+# are retried up to LLM_MAX_RETRIES times with jittered exponential backoff. A stream that
+# has started fails if no further chunk arrives within LLM_TIMEOUT_SECONDS.
+LLM_TIMEOUT_SECONDS = 30
+LLM_DEADLINE_SECONDS = 60
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_BASE_SECONDS = 0.5
+LLM_BACKOFF_MAX_SECONDS = 8
+# After LLM_CIRCUIT_FAILURE_THRESHOLD consecutive failures, calls fail fast for
+# LLM_CIRCUIT_RESET_SECONDS before a single trial request is let through.
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5
+LLM_CIRCUIT_RESET_SECONDS = 30
+# Client-side request rate limit, to stay under the API quota. None disables it.
+LLM_RATE_LIMIT_PER_MINUTE = 60
+
+# --- Startup Configuration ---
+# Models are loaded on first use. With WARM_UP_ON_START, the CLI and the web app load them
+# in a background thread at startup instead, while the user types the first question.
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "1") == "1"
+
+# --- HTTP Server Configuration ---
+# Each server worker processes up to SERVER_MAX_IN_FLIGHT requests at once. Up to
+# SERVER_MAX_QUEUED more wait at most SERVER_QUEUE_TIMEOUT_SECONDS for a slot; anything
+# beyond that is rejected with 503 so the load balancer can retry on another worker.
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_MAX_IN_FLIGHT = 32
+SERVER_MAX_QUEUED = 64
+SERVER_QUEUE_TIMEOUT_SECONDS = 10.0
+SERVER_MAX_QUERY_CHARS = 2000
+
+# --- Concurrency Configuration ---
+# Maximum number of LLM requests in flight at once from the async pipeline, per event loop.
+LLM_MAX_CONCURRENCY = 8
+# Worker threads used by the async retriever to run query encoding and search.
+RETRIEVAL_THREADS = 4
+
 # --- Retriever Configuration ---
 CONTEXT_RETRIEVAL_N_RESULTS = 3
 # This threshold is based on the L2 (Euclidean) distance. A lower score is better.
 # After testing, a value around 1.5 seems to be a good balance for this model.
 CONTEXT_RETRIEVAL_THRESHOLD = 1.5
+# Number of queries encoded and searched per call in batched retrieval.
+RETRIEVAL_BATCH_SIZE = 256
+# Hybrid retrieval fuses the vector search with a BM25 keyword index over the same
+# documents using Reciprocal Rank Fusion. Each ranking contributes its top
+# HYBRID_CANDIDATES documents; RRF_K dampens the weight of top ranks.
+HYBRID_RETRIEVAL = True
+HYBRID_CANDIDATES = 20
+RRF_K = 60
+
+# --- Query Embedding Batching Configuration ---
+# Concurrent query encodes are coalesced into one model call. A query that arrives while
+# the encoder is idle is encoded at once; queries that arrive while it is busy form the
+# next batch, which waits at most EMBEDDING_BATCH_MAX_WAIT_MS for up to
+# EMBEDDING_BATCH_MAX_SIZE queries.
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "1") == "1"
+EMBEDDING_BATCH_MAX_SIZE = 32
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+# --- Query Rewrite Configuration ---
+# 'always' rewrites every follow-up with the LLM. 'heuristic' skips the rewrite when the
+# question looks standalone (no pronouns or follow-up phrasing, more than
+# REWRITE_SHORT_QUERY_WORDS words). 'speculative' also starts retrieval with the raw query
+# while the rewrite runs, and keeps its results if the rewrite kept the query's meaning:
+# the raw and rewritten query embeddings have a cosine similarity of at least
+# SPECULATION_SIMILARITY_THRESHOLD, or a vector-only search for the rewrite finds the
+# same sources. Otherwise it retrieves again with the rewrite.
+REWRITE_MODE = "speculative"
+REWRITE_SHORT_QUERY_WORDS = 3
+SPECULATION_SIMILARITY_THRESHOLD = 0.9
+
+# --- Prompt Configuration ---
+# Prompt sizes are estimated at PROMPT_CHARS_PER_TOKEN characters per token. History is
+# capped at PROMPT_HISTORY_TOKEN_BUDGET tokens: the last PROMPT_VERBATIM_MESSAGES messages
+# are kept as they are, older ones are compacted to about PROMPT_COMPACT_MESSAGE_TOKENS
+# tokens each. Retrieved context fills the rest of PROMPT_TOKEN_BUDGET.
+PROMPT_TOKEN_BUDGET = 3000
+PROMPT_HISTORY_TOKEN_BUDGET = 800
+PROMPT_VERBATIM_MESSAGES = 4
+PROMPT_COMPACT_MESSAGE_TOKENS = 48
+PROMPT_CHARS_PER_TOKEN = 4
+
+# --- Telemetry Configuration ---
+# Per-stage spans and counters are a no-op unless enabled. Metrics are aggregated in
+# memory and exported in the Prometheus text format; traces are appended as JSON Lines.
+TELEMETRY_METRICS_ENABLED = os.getenv("TELEMETRY_METRICS_ENABLED", "0") == "1"
+TELEMETRY_TRACE_PATH = os.getenv("TELEMETRY_TRACE_PATH") or None
+
+# --- Cache Configuration ---
+# Maximum number of entries and time-to-live (in seconds) of the in-process caches
+# for query embeddings and retrieval results.
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = 24 * 60 * 60
+RETRIEVAL_CACHE_SIZE = 1024
+RETRIEVAL_CACHE_TTL_SECONDS = 60 * 60
+
+# --- Answer Cache Configuration ---
+# Generated answers are cached on disk and reused for semantically similar
+# (cosine similarity >= threshold) rewritten queries with the same retrieved sources.
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = os.path.join(PROJECT_ROOT, 'cache', 'answers.sqlite3')
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+ANSWER_CACHE_MAX_ENTRIES = 10000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# --- Canonical Answer Configuration ---
+# The curated FAQ questions are indexed in their own collection at build time. A
+# standalone query whose nearest canonical question has a cosine similarity of at least
+# FAST_PATH_SIMILARITY_THRESHOLD, and whose answer language is that of the curated
+# answer, gets the curated answer directly, without a query rewrite or an LLM call.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+FAST_PATH_COLLECTION_NAME = COLLECTION_NAME + "_questions"
+FAST_PATH_SIMILARITY_THRESHOLD = 0.92
+
+# --- Embedding Cache Configuration ---
+# Document and batch-query embeddings are cached on disk per model, keyed by a hash
+# of the text, so repeated index builds only encode texts that were never seen before.
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = os.path.join(PROJECT_ROOT, 'cache', 'embeddings')
+
+# --- Index Build Configuration ---
+# Documents are encoded ENCODE_BATCH_SIZE at a time while a background thread writes
+# WRITE_BATCH_SIZE documents per insert. ENCODE_PROCESSES > 1 spreads encoding across
+# a pool of worker processes.
+ENCODE_BATCH_SIZE = 256
+WRITE_BATCH_SIZE = 1000
+ENCODE_PROCESSES = 0
+# Number of rows read at a time when streaming a data file.
+LOADER_CHUNK_SIZE = 5000
+
+# --- Chunking Configuration ---
+# Documents longer than the embedding model's maximum sequence length are split into
+# overlapping chunks of at most CHUNK_MAX_TOKENS tokens (None derives the limit from
+# the model). The retriever merges adjacent chunks of the same source back together.
+CHUNKING_ENABLED = True
+CHUNK_MAX_TOKENS = None
+CHUNK_OVERLAP_TOKENS = 16
+RETRIEVAL_MERGE_CHUNKS = True
@@ -1,6 +1,91 @@
 import pandas as pd
+import json
+import logging
 import os
-from typing import List, Dict
+from typing import List, Dict, Iterator, Iterable
+
+from src.config import LOADER_CHUNK_SIZE
+
+def _records_from_frame(df: pd.DataFrame, start_row: int) -> Iterator[Dict[str, str]]:
+    """Applies the FAQ preprocessing to one chunk of rows and yields its documents."""
+    # Source ids are based on the row number in the file, before any rows are dropped.
+    # JSONL rows may omit a key; if no row of a chunk has it, pandas has no such column.
+    missing = [column for column in ('Question', 'Answer') if column not in df.columns]
+    if missing:
+        if len(df):
+            logging.warning(f"Rows {start_row + 1}-{start_row + len(df)} have no {', '.join(missing)}; skipping them.")
+        return
+    df = df.assign(source_id=[f"FAQ-{start_row + i + 1}" for i in range(len(df))])
+    df = df.dropna(subset=['Question', 'Answer'])
+    df = df.assign(text=df['Question'] + " " + df['Answer'])
+    yield from df.to_dict('records')
+
+def _iter_csv(file_path: str, chunk_size: int) -> Iterator[Dict[str, str]]:
+    start_row = 0
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        yield from _records_from_frame(chunk, start_row)
+        start_row += len(chunk)
+
+def _iter_jsonl(file_path: str, chunk_size: int) -> Iterator[Dict[str, str]]:
+    start_row = 0
+    rows = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rows.append(json.loads(line))
+            if len(rows) >= chunk_size:
+                yield from _records_from_frame(pd.DataFrame(rows), start_row)
+                start_row += len(rows)
+                rows = []
+    if rows:
+        yield from _records_from_frame(pd.DataFrame(rows), start_row)
+
+def _iter_parquet(file_path: str, chunk_size: int) -> Iterator[Dict[str, str]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet files requires 'pyarrow'. Install it with `pip install pyarrow`.") from e
+
+    start_row = 0
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size):
+        chunk = batch.to_pandas()
+        yield from _records_from_frame(chunk, start_row)
+        start_row += len(chunk)
+
+_READERS = {
+    '.csv': _iter_csv,
+    '.jsonl': _iter_jsonl,
+    '.parquet': _iter_parquet,
+}
+
+def iter_documents(file_path: str, chunk_size: int = LOADER_CHUNK_SIZE) -> Iterator[Dict[str, str]]:
+    """
+    Lazily loads medical FAQs from a CSV, JSONL or Parquet file.
+
+    The file is read `chunk_size` rows at a time, so memory use does not grow with the
+    file size. Documents are preprocessed exactly like `load_data`: rows without a
+    question or answer are skipped, and `source_id` is based on the row number.
+
+    Args:
+        file_path: The path to a .csv, .jsonl or .parquet file.
+        chunk_size: The number of rows read at a time.
+
+    Yields:
+        One dictionary per FAQ with 'Question', 'Answer', 'source_id' and 'text' keys.
+
+    Raises:
+        FileNotFoundError: If the file is not found at the specified path.
+        ValueError: If the file format is not supported.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file was not found at: {file_path}")
+
+    extension = os.path.splitext(file_path)[1].lower()
+    reader = _READERS.get(extension)
+    if reader is None:
+        raise ValueError(f"Unsupported file format '{extension}'. Expected one of: {', '.join(_READERS)}")
+    return reader(file_path, chunk_size)
 
 def load_data(file_path: str) -> List[Dict[str, str]]:
     """
@@ -54,3 +139,68 @@ def chunk_text(text: str, chunk_size: int = 512, overlap: int = 50) -> List[str]
         chunks.append(text[start:end])
         start += chunk_size - overlap
     return chunks
+
+def _token_windows(offsets: List[tuple], max_tokens: int, overlap: int) -> Iterator[tuple]:
+    """Yields (char_start, char_end) spans of overlapping windows of at most `max_tokens` tokens."""
+    step = max(max_tokens - overlap, 1)
+    start = 0
+    while True:
+        end = min(start + max_tokens, len(offsets))
+        yield offsets[start][0], offsets[end - 1][1]
+        if end == len(offsets):
+            return
+        start += step
+
+def chunk_documents(
+    docs: Iterable[Dict[str, str]],
+    tokenizer,
+    max_tokens: int,
+    overlap: int = 16,
+    batch_size: int = 256
+) -> Iterator[Dict[str, any]]:
+    """
+    Splits documents into chunks of at most `max_tokens` tokens of the embedding tokenizer.
+
+    Documents are tokenized in batches, and each chunk is a single slice of the original
+    text taken from the tokenizer's character offsets, so no intermediate strings are built.
+    Every chunk carries the document's `source_id` plus `chunk_index`, `chunk_start` and
+    `chunk_end` (character offsets into the document text), which the retriever uses to
+    merge adjacent chunks back together.
+
+    Args:
+        docs: An iterable of documents with 'text' and 'source_id' keys.
+        tokenizer: A fast (offset-aware) Hugging Face tokenizer, e.g. `model.tokenizer`.
+        max_tokens: The maximum number of tokens per chunk, excluding special tokens.
+        overlap: The number of tokens shared by consecutive chunks.
+        batch_size: The number of documents tokenized per call.
+
+    Yields:
+        One document per chunk with 'text', 'source_id', 'chunk_index', 'chunk_start'
+        and 'chunk_end' keys.
+    """
+    batch = []
+    for doc in docs:
+        if doc and doc.get('text'):
+            batch.append(doc)
+        if len(batch) >= batch_size:
+            yield from _chunk_batch(batch, tokenizer, max_tokens, overlap)
+            batch = []
+    if batch:
+        yield from _chunk_batch(batch, tokenizer, max_tokens, overlap)
+
+def _chunk_batch(docs: List[Dict[str, str]], tokenizer, max_tokens: int, overlap: int) -> Iterator[Dict[str, any]]:
+    texts = [doc['text'] for doc in docs]
+    encoded = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    for doc, text, offsets in zip(docs, texts, encoded['offset_mapping']):
+        if len(offsets) <= max_tokens:
+            spans = [(0, len(text))]
+        else:
+            spans = _token_windows(offsets, max_tokens, overlap)
+        for chunk_index, (start, end) in enumerate(spans):
+            yield {
+                'text': text[start:end],
+                'source_id': doc['source_id'],
+                'chunk_index': chunk_index,
+                'chunk_start': start,
+                'chunk_end': end,
+            }
@@ -0,0 +1,80 @@
+# src/embedding_backends.py
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+from src.config import EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
+from src.lazy_import import lazy_import
+
+sentence_transformers = lazy_import("sentence_transformers")
+torch = lazy_import("torch")
+
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+
+def embedding_model_key(model_name: str, backend: str = EMBEDDING_BACKEND) -> str:
+    """
+    Returns the name that identifies `model_name` run with `backend` in registries and caches.
+
+    Quantized backends produce slightly different embeddings, so they never share cached
+    embeddings with the full-precision model. The reference backend keeps the plain model name.
+    """
+    return model_name if backend == "torch" else f"{model_name}#{backend}"
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND, onnx_file: Optional[str] = EMBEDDING_ONNX_FILE) -> "sentence_transformers.SentenceTransformer":
+    """
+    Loads a Sentence Transformers model with the given encoder backend.
+
+    Args:
+        model_name: The Sentence Transformers model.
+        backend: 'torch', 'int8' or 'onnx' (see EMBEDDING_BACKEND).
+        onnx_file: For 'onnx', the ONNX file in the model repository. Defaults to the
+            repository's 'onnx/model.onnx', which is exported on first load if missing.
+
+    Returns:
+        A model with the usual `encode` interface.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}.")
+    logging.info(f"Loading sentence transformer model: {model_name} (backend: {backend})")
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return sentence_transformers.SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+    if backend == "int8":
+        model = sentence_transformers.SentenceTransformer(model_name, device="cpu")
+        # Weights of the linear layers are stored as int8; activations are quantized on the fly.
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return sentence_transformers.SentenceTransformer(model_name)
+
+def recall_at_k(reference_queries: np.ndarray, reference_docs: np.ndarray, candidate_queries: np.ndarray, candidate_docs: np.ndarray, k: int) -> Dict[str, float]:
+    """
+    Compares the nearest neighbours found with candidate embeddings against the reference.
+
+    Args:
+        reference_queries, reference_docs: Embeddings from the reference backend.
+        candidate_queries, candidate_docs: Embeddings of the same texts from the candidate backend.
+        k: The number of neighbours compared per query.
+
+    Returns:
+        The mean fraction of each query's reference top-k that the candidate also ranks in
+        its top-k, the fraction of queries with the same top-1, and the mean cosine
+        similarity between reference and candidate embeddings of the same text.
+    """
+    def top_k(queries: np.ndarray, docs: np.ndarray) -> np.ndarray:
+        # Squared L2 distance, the metric the vector stores use.
+        distances = (queries ** 2).sum(axis=1)[:, None] - 2.0 * queries @ docs.T + (docs ** 2).sum(axis=1)[None, :]
+        return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+    def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    k = min(k, len(reference_docs))
+    expected = top_k(reference_queries, reference_docs)
+    found = top_k(candidate_queries, candidate_docs)
+    overlaps = [len(set(e) & set(f)) / k for e, f in zip(expected, found)]
+    return {
+        f"recall_at_{k}": float(np.mean(overlaps)),
+        "top1_agreement": float(np.mean(expected[:, 0] == found[:, 0])),
+        "mean_cosine": float(np.mean(np.concatenate([cosine(reference_queries, candidate_queries), cosine(reference_docs, candidate_docs)]))),
+    }
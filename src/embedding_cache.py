@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_ENABLED, EMBEDDING_MODEL_NAME
+
+def text_hash(text: str) -> str:
+    """Returns the hash used to key a text in the embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    A persistent, append-only cache of text embeddings for a single model.
+
+    Embeddings are stored as rows of a float32 matrix in `<model>.f32`, which is read
+    through a memory map, and `<model>.idx` lists the text hash of each row (after a
+    header line holding the embedding dimension). Rows are always written before their
+    index entry, and loading truncates any rows an interrupted write left unindexed, so
+    the index never points at missing or foreign data.
+    The cache is safe to share between threads of one process, and texts are encoded
+    without holding its lock; concurrent writers in different processes are not supported.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        slug = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        self.matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self.index_path = os.path.join(cache_dir, f"{slug}.idx")
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        hashes: List[str] = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = f.readline().strip()
+                if header.startswith("dim="):
+                    self.dim = int(header[len("dim="):])
+                    hashes = [line.strip() for line in f if line.strip()]
+                else:
+                    logging.warning(f"Ignoring embedding cache with invalid index: {self.index_path}")
+
+        # An interrupted append can leave rows without index entries (or, if the matrix
+        # was lost, entries without rows). Cut both files back to the rows they agree on,
+        # so the next append numbers its rows from where its data actually lands.
+        stored_rows = os.path.getsize(self.matrix_path) // (self.dim * 4) if self.dim and os.path.exists(self.matrix_path) else 0
+        rows = min(len(hashes), stored_rows)
+        if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) != rows * (self.dim or 0) * 4:
+            logging.warning(f"Truncating embedding cache matrix {self.matrix_path} to its {rows} indexed rows.")
+            os.truncate(self.matrix_path, rows * (self.dim or 0) * 4)
+        if self.dim is None:
+            return
+        if len(hashes) > rows:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.write(f"dim={self.dim}\n" + "".join(h + "\n" for h in hashes[:rows]))
+
+        self._rows = {h: i for i, h in enumerate(hashes[:rows])}
+        self._open_matrix()
+        logging.info(f"Loaded embedding cache for '{self.model_name}' with {len(self._rows)} vectors.")
+
+    def _open_matrix(self):
+        """(Re)opens the read-only memory map over all rows written so far."""
+        rows = len(self._rows)
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_or_encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Returns the embeddings of `texts` as a float32 matrix, encoding only unseen texts.
+
+        Args:
+            texts: The texts to embed.
+            encode_fn: Called with the list of texts missing from the cache; must return
+                their embeddings as a 2-D array, in order.
+        """
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            missing: Dict[str, str] = {}
+            for h, text in zip(hashes, texts):
+                if h not in self._rows and h not in missing:
+                    missing[h] = text
+        if missing:
+            # Encode outside the lock, so other threads can read cached rows meanwhile.
+            embeddings = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                # Another thread may have appended some of the same texts in the meantime.
+                new_rows = [i for i, h in enumerate(missing) if h not in self._rows]
+                if new_rows:
+                    missing_hashes = list(missing)
+                    self._append([missing_hashes[i] for i in new_rows], embeddings[new_rows])
+        if not hashes:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        with self._lock:
+            return np.asarray(self._matrix[[self._rows[h] for h in hashes]])
+
+    def _append(self, hashes: List[str], embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.write(f"dim={self.dim}\n")
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match cache dimension {self.dim}.")
+
+        # Data first, then the index entries that make it visible.
+        with open(self.matrix_path, "ab") as f:
+            f.write(embeddings.tobytes())
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write("".join(h + "\n" for h in hashes))
+
+        start = len(self._rows)
+        for offset, h in enumerate(hashes):
+            self._rows[h] = start + offset
+        self._open_matrix()
+
+_embedding_caches: Dict[str, EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str = EMBEDDING_MODEL_NAME) -> Optional[EmbeddingCache]:
+    """Returns the process-wide embedding cache for `model_name`, or None if it is disabled."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _embedding_caches_lock:
+        cache = _embedding_caches.get(model_name)
+        if cache is None:
+            cache = EmbeddingCache(model_name)
+            _embedding_caches[model_name] = cache
+        return cache
+
+def encode_texts(model, texts: Sequence[str], model_name: str = EMBEDDING_MODEL_NAME, batch_size: int = 32, pool: Optional[dict] = None) -> np.ndarray:
+    """
+    Encodes `texts` with `model`, reusing embeddings from the persistent cache when enabled.
+
+    Args:
+        model: The Sentence Transformers model.
+        texts: The texts to embed.
+        model_name: The model name, used to select the cache.
+        batch_size: The encoder batch size.
+        pool: An optional multi-process pool from `model.start_multi_process_pool()`.
+
+    Returns:
+        A float32 matrix with one row per text.
+    """
+    def encode(batch: List[str]) -> np.ndarray:
+        if pool is not None:
+            return model.encode_multi_process(batch, pool, batch_size=batch_size)
+        return model.encode(batch, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+    cache = get_embedding_cache(model_name)
+    if cache is None:
+        return np.asarray(encode(list(texts)), dtype=np.float32)
+    return cache.get_or_encode(texts, encode)
@@ -0,0 +1,23 @@
+# src/language.py
+
+def detect_language(text: str) -> str:
+    """Returns the full name of the language of `text`, defaulting to English."""
+    # Imported on first use: loading the language profiles slows down startup.
+    from langdetect import detect, DetectorFactory
+    from langdetect.lang_detect_exception import LangDetectException
+
+    # Ensure consistent detection results
+    DetectorFactory.seed = 0
+    try:
+        return get_language_name(detect(text))
+    except LangDetectException:
+        return "English"
+
+def get_language_name(lang_code: str) -> str:
+    """Converts a language code (e.g., 'en') to its full name (e.g., 'English')."""
+    lang_map = {
+        "en": "English", "es": "Spanish", "fr": "French", "de": "German",
+        "it": "Italian", "pt": "Portuguese", "nl": "Dutch", "ru": "Russian",
+        "zh-cn": "Chinese", "ja": "Japanese", "ko": "Korean", "ar": "Arabic"
+    }
+    return lang_map.get(lang_code, "English")
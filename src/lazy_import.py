@@ -0,0 +1,50 @@
+# src/lazy_import.py
+
+import importlib
+import threading
+from typing import Dict
+
+class LazyModule:
+    """
+    Stands in for a module until it is first used.
+
+    The real import happens on the first attribute access, so modules that only need a
+    heavy dependency on some code paths (ChromaDB, Sentence Transformers, the Gemini SDK)
+    do not pay for it at import time. Attributes set on the placeholder (e.g. by
+    `unittest.mock.patch`) shadow those of the real module.
+    """
+    def __init__(self, name: str):
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            # import_module holds the import lock for the module, so concurrent first
+            # accesses (e.g. from the warm-up thread) load it exactly once.
+            module = importlib.import_module(self.__dict__["_lazy_name"])
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+_lazy_modules_lock = threading.Lock()
+_lazy_modules: Dict[str, LazyModule] = {}
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Returns the shared placeholder for the module `name`, which is imported on first use.
+
+    Every caller gets the same placeholder, so patching an attribute through one importing
+    module is seen by all of them.
+    """
+    with _lazy_modules_lock:
+        module = _lazy_modules.get(name)
+        if module is None:
+            module = _lazy_modules[name] = LazyModule(name)
+        return module
@@ -1,11 +1,76 @@
 # src/llm.py
 
 from abc import ABC, abstractmethod
-from typing import List, Iterator
-import google.generativeai as genai
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Iterator, Optional, Tuple, TypeVar
+from google.api_core import exceptions as google_exceptions
+import asyncio
+import itertools
 import logging
 import os
-from src.config import LLM_MODEL_NAME
+import queue
+import random
+import re
+import threading
+import time
+import weakref
+import zlib
+from src import telemetry
+from src.lazy_import import lazy_import
+from src.config import (
+    LLM_MODEL_NAME,
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECONDS,
+    LLM_DEADLINE_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_SECONDS,
+    LLM_RATE_LIMIT_PER_MINUTE,
+    LLM_PROVIDER,
+    SIMULATED_LLM_TTFT_SECONDS,
+    SIMULATED_LLM_TOKENS_PER_SECOND,
+    SIMULATED_LLM_ERROR_RATE,
+    SIMULATED_LLM_ANSWER_TOKENS,
+    SIMULATED_LLM_SEED
+)
+
+# The Gemini SDK is only imported when a GeminiModel is created.
+genai = lazy_import("google.generativeai")
+
+T = TypeVar("T")
+
+# Messages returned in place of an answer when generation fails. Callers can
+# compare against these to avoid caching or post-processing failed generations.
+MODEL_NOT_INITIALIZED_MESSAGE = "Error: Gemini model is not initialized. Check API key."
+GENERATION_ERROR_MESSAGE = "An error occurred while generating an answer."
+ERROR_MESSAGES = (MODEL_NOT_INITIALIZED_MESSAGE, GENERATION_ERROR_MESSAGE)
+
+# --- Concurrency Limit ---
+# asyncio semaphores belong to one event loop, so each loop gets its own limit.
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore limiting concurrent LLM calls on the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            _semaphores[loop] = semaphore
+        return semaphore
+
+_DONE = object()
+
+async def iterate_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """Consumes a blocking iterator from a worker thread, one item at a time."""
+    while True:
+        item = await asyncio.to_thread(next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
 
 class LanguageModel(ABC):
     """Abstract base class for a language model."""
@@ -17,11 +82,266 @@ class LanguageModel(ABC):
     def generate_stream(self, prompt: str) -> Iterator[str]:
         pass
 
+    async def agenerate(self, prompt: str) -> str:
+        """
+        Generates a complete response without blocking the event loop.
+
+        The default implementation runs `generate` in a worker thread. Calls are limited
+        to LLM_MAX_CONCURRENCY at a time per event loop.
+        """
+        async with llm_semaphore():
+            return await asyncio.to_thread(self.generate, prompt)
+
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Generates a response as an async stream of chunks.
+
+        The default implementation consumes `generate_stream` from a worker thread. The
+        concurrency slot is held until the stream ends.
+        """
+        async with llm_semaphore():
+            async for chunk in iterate_in_thread(self.generate_stream(prompt)):
+                yield chunk
+
+# --- Resilience ---
+
+# Errors worth retrying: rate limiting, server-side failures and timeouts. Anything else
+# (e.g. an invalid request or API key) fails the same way on every attempt.
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+TIMEOUT_ERRORS = (google_exceptions.DeadlineExceeded, google_exceptions.GatewayTimeout, TimeoutError)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+def backoff_delay(attempt: int, base: float = LLM_BACKOFF_BASE_SECONDS, maximum: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """Returns a "full jitter" exponential backoff delay for a zero-based retry attempt."""
+    return random.uniform(0.0, min(maximum, base * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated failures instead of piling more load onto a failing API.
+
+    After `failure_threshold` consecutive failures the circuit opens and `allow()` returns
+    False for `reset_seconds`. Then a single trial call is let through (half-open): its
+    success closes the circuit, its failure opens it again.
+    """
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._clock() - self._opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        """Returns whether a call may be made now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logging.warning(f"LLM circuit breaker opened after {self._failures} consecutive failures.")
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+class RateLimiter:
+    """
+    A token bucket allowing `rate_per_minute` requests on average, with bursts of up to `burst`.
+
+    `reserve()` takes a token immediately and returns how long the caller must wait before
+    using it, so sync and async callers can each sleep in their own way.
+    """
+    def __init__(self, rate_per_minute: float, burst: int = 5, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = clock()
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Reserves a request slot and returns the seconds to wait, or None if that would exceed `max_wait`."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            wait = 0.0 if self._tokens >= 1.0 else (1.0 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1.0
+            return wait
+
+class LLMMetrics:
+    """Thread-safe call counters and a window of recent call latencies."""
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {
+            "calls": 0, "attempts": 0, "successes": 0, "failures": 0, "retries": 0,
+            "timeouts": 0, "circuit_rejections": 0, "rate_limit_wait_seconds": 0.0,
+        }
+        self._latencies = deque(maxlen=window)
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] += amount
+        telemetry.increment(f"llm_{name}", amount)
+
+    def observe_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Returns the counters plus p50/p95/p99 latency (seconds) over the recent window."""
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+        for name, quantile in (("latency_p50", 0.50), ("latency_p95", 0.95), ("latency_p99", 0.99)):
+            stats[name] = latencies[min(len(latencies) - 1, int(quantile * len(latencies)))] if latencies else 0.0
+        return stats
+
+# Quota and API health are per process and API key, so all Gemini models share these.
+llm_metrics = LLMMetrics()
+_circuit_breaker = CircuitBreaker()
+_rate_limiter = RateLimiter(LLM_RATE_LIMIT_PER_MINUTE) if LLM_RATE_LIMIT_PER_MINUTE else None
+
+def get_llm_metrics() -> Dict[str, float]:
+    """Returns the process-wide LLM call metrics."""
+    return llm_metrics.snapshot()
+
+def _record_ttft(span: telemetry.Span, started_at: float, model_name: str):
+    """Records the time from the start of a streamed call to its first chunk."""
+    ttft = time.perf_counter() - started_at
+    span.set("ttft_seconds", ttft)
+    telemetry.observe("llm_time_to_first_token_seconds", ttft, model=model_name)
+
+def _record_tokens(span: telemetry.Span, model_name: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """Records the token counts of a call, where known."""
+    for name, count in (("prompt_tokens", prompt_tokens), ("completion_tokens", completion_tokens)):
+        if isinstance(count, int):
+            span.set(name, count)
+            telemetry.observe(f"llm_{name}", count, model=model_name)
+
+def _record_usage(span: telemetry.Span, response: object, model_name: str):
+    """Records the token counts Gemini reports in a response (or the last chunk of a stream)."""
+    usage = getattr(response, "usage_metadata", None)
+    _record_tokens(span, model_name, getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
+
+# --- Shared Gemini Client ---
+# `genai.configure` builds the underlying client (and its connection); doing it once per
+# process and sharing model handles lets every GeminiModel reuse the same connection.
+_client_lock = threading.Lock()
+_configured_api_key: Optional[str] = None
+_generative_models: Dict[str, "genai.GenerativeModel"] = {}
+
+def _get_generative_model(model_name: str, api_key: str) -> "genai.GenerativeModel":
+    global _configured_api_key
+    with _client_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+            _generative_models.clear()
+        model = _generative_models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            _generative_models[model_name] = model
+        return model
+
+_STREAM_END = object()
+
+def _iter_with_timeout(chunks: Iterator[T], timeout: float) -> Iterator[T]:
+    """
+    Yields from `chunks`, raising TimeoutError when the next item takes longer than `timeout`.
+
+    The blocking iterator is read on a daemon thread, so a stalled stream is abandoned
+    instead of hanging the caller.
+    """
+    items: "queue.Queue" = queue.Queue()
+
+    def read():
+        try:
+            for item in chunks:
+                items.put((item, None))
+        except Exception as e:
+            items.put((None, e))
+        items.put((_STREAM_END, None))
+
+    threading.Thread(target=read, name="llm-stream-reader", daemon=True).start()
+    while True:
+        try:
+            item, error = items.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No stream chunk arrived within {timeout}s.") from None
+        if error is not None:
+            raise error
+        if item is _STREAM_END:
+            return
+        yield item
+
+async def _aiter_with_timeout(chunks: AsyncIterator[T], timeout: float) -> AsyncIterator[T]:
+    """Async variant of `_iter_with_timeout`; a stalled `__anext__` is cancelled."""
+    while True:
+        try:
+            item = await asyncio.wait_for(chunks.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No stream chunk arrived within {timeout}s.") from None
+        yield item
+
 class GeminiModel(LanguageModel):
-    """Implementation of the LanguageModel class for Google's Gemini."""
-    def __init__(self, model_name: str = LLM_MODEL_NAME):
+    """
+    Implementation of the LanguageModel class for Google's Gemini.
+
+    Every call has a per-attempt timeout and an overall deadline. Transient errors are
+    retried with jittered exponential backoff, behind a shared circuit breaker and
+    client-side rate limiter. Streams are only retried until their first chunk arrives,
+    so a retry never repeats text the caller has already seen; after that, a stream that
+    sends no chunk for LLM_TIMEOUT_SECONDS is abandoned. Failures still surface as
+    GENERATION_ERROR_MESSAGE, once retries are exhausted.
+    """
+    def __init__(
+        self,
+        model_name: str = LLM_MODEL_NAME,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        metrics: Optional[LLMMetrics] = None
+    ):
         self.model_name = model_name
         self.model = None
+        self.circuit_breaker = circuit_breaker or _circuit_breaker
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.metrics = metrics or llm_metrics
         self._configure_api_key()
 
     def _configure_api_key(self):
@@ -31,36 +351,318 @@ class GeminiModel(LanguageModel):
             logging.error("GEMINI_API_KEY not found in environment variables.")
             return
         try:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel(self.model_name)
+            self.model = _get_generative_model(self.model_name, api_key)
             logging.info(f"Successfully initialized Gemini model: {self.model_name}")
         except Exception as e:
             logging.error(f"Failed to initialize Gemini model '{self.model_name}': {e}")
 
+    # --- Retry Loop ---
+
+    def _admit(self, deadline: float) -> float:
+        """Checks the circuit breaker and rate limiter; returns how long to wait before the attempt."""
+        if not self.circuit_breaker.allow():
+            self.metrics.increment("circuit_rejections")
+            raise CircuitOpenError("Gemini API circuit breaker is open.")
+        if self.rate_limiter is None:
+            return 0.0
+        wait = self.rate_limiter.reserve(max_wait=deadline - time.monotonic())
+        if wait is None:
+            raise TimeoutError("Rate limit wait would exceed the call deadline.")
+        self.metrics.increment("rate_limit_wait_seconds", wait)
+        return wait
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        self.metrics.increment("attempts")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Gemini API call deadline exceeded.")
+        return min(LLM_TIMEOUT_SECONDS, remaining)
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """Records a failed attempt and returns the backoff before the next one, or None to give up."""
+        if isinstance(error, TIMEOUT_ERRORS):
+            self.metrics.increment("timeouts")
+        if not isinstance(error, RETRYABLE_ERRORS):
+            # The API answered (e.g. with a 400), so it is healthy even though the call failed.
+            self.circuit_breaker.record_success()
+            return None
+        self.circuit_breaker.record_failure()
+        delay = backoff_delay(attempt)
+        if attempt >= LLM_MAX_RETRIES or time.monotonic() + delay >= deadline or self.circuit_breaker.state == "open":
+            return None
+        self.metrics.increment("retries")
+        logging.warning(f"Gemini API attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s.")
+        return delay
+
+    def _record_success(self, started_at: float):
+        self.circuit_breaker.record_success()
+        self.metrics.increment("successes")
+        self.metrics.observe_latency(time.monotonic() - started_at)
+
+    def _call(self, request: Callable[[float], T]) -> T:
+        """Calls `request(timeout)` with retries, backoff, rate limiting and the circuit breaker."""
+        self.metrics.increment("calls")
+        started_at = time.monotonic()
+        deadline = started_at + LLM_DEADLINE_SECONDS
+        for attempt in itertools.count():
+            try:
+                time.sleep(self._admit(deadline))
+                timeout = self._attempt_timeout(deadline)
+            except Exception:
+                self.metrics.increment("failures")
+                raise
+            try:
+                result = request(timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    self.metrics.increment("failures")
+                    raise
+                time.sleep(delay)
+                continue
+            self._record_success(started_at)
+            return result
+
+    async def _acall(self, request: Callable[[float], Awaitable[T]]) -> T:
+        """Async variant of `_call`."""
+        self.metrics.increment("calls")
+        started_at = time.monotonic()
+        deadline = started_at + LLM_DEADLINE_SECONDS
+        for attempt in itertools.count():
+            try:
+                await asyncio.sleep(self._admit(deadline))
+                timeout = self._attempt_timeout(deadline)
+            except Exception:
+                self.metrics.increment("failures")
+                raise
+            try:
+                result = await request(timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    self.metrics.increment("failures")
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._record_success(started_at)
+            return result
+
+    # --- Generation ---
+
+    def _open_stream(self, prompt: str, timeout: float) -> Tuple[object, Iterator]:
+        """Starts a stream and waits for its first chunk, so failures before any output can be retried."""
+        chunks = iter(self.model.generate_content(prompt, stream=True, request_options={"timeout": timeout}))
+        return next(chunks, None), chunks
+
+    async def _aopen_stream(self, prompt: str, timeout: float) -> Tuple[object, AsyncIterator]:
+        response_stream = await self.model.generate_content_async(prompt, stream=True, request_options={"timeout": timeout})
+        chunks = response_stream.__aiter__()
+        try:
+            return await chunks.__anext__(), chunks
+        except StopAsyncIteration:
+            return None, chunks
+
     def generate(self, prompt: str) -> str:
         """Generates a complete response."""
         if not self.model:
-            return "Error: Gemini model is not initialized. Check API key."
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            logging.error(f"Gemini API call error: {e}")
-            return "An error occurred while generating an answer."
+            return MODEL_NOT_INITIALIZED_MESSAGE
+        with telemetry.span("llm_generate", model=self.model_name) as span:
+            try:
+                response = self._call(lambda timeout: self.model.generate_content(prompt, request_options={"timeout": timeout}))
+                _record_usage(span, response, self.model_name)
+                return response.text.strip()
+            except Exception as e:
+                span.set("error", type(e).__name__)
+                logging.error(f"Gemini API call error: {e}")
+                return GENERATION_ERROR_MESSAGE
 
     def generate_stream(self, prompt: str) -> Iterator[str]:
         """Generates a response as a stream of chunks."""
         if not self.model:
-            yield "Error: Gemini model is not initialized. Check API key."
+            yield MODEL_NOT_INITIALIZED_MESSAGE
             return
-        try:
-            response_stream = self.model.generate_content(prompt, stream=True)
-            for chunk in response_stream:
-                yield chunk.text
-        except Exception as e:
-            logging.error(f"Gemini API stream error: {e}")
-            yield "An error occurred while generating an answer."
+        # Not activated: the span stays open across yields to the caller.
+        with telemetry.span("llm_stream", activate=False, model=self.model_name) as span:
+            started_at = time.perf_counter()
+            try:
+                first_chunk, response_stream = self._call(lambda timeout: self._open_stream(prompt, timeout))
+                if first_chunk is None:
+                    return
+                _record_ttft(span, started_at, self.model_name)
+                yield first_chunk.text
+                last_chunk = first_chunk
+                for chunk in _iter_with_timeout(response_stream, LLM_TIMEOUT_SECONDS):
+                    last_chunk = chunk
+                    yield chunk.text
+                _record_usage(span, last_chunk, self.model_name)
+            except Exception as e:
+                span.set("error", type(e).__name__)
+                logging.error(f"Gemini API stream error: {e}")
+                yield GENERATION_ERROR_MESSAGE
+
+    async def agenerate(self, prompt: str) -> str:
+        """Generates a complete response with the native async client."""
+        if not self.model:
+            return MODEL_NOT_INITIALIZED_MESSAGE
+        with telemetry.span("llm_generate", model=self.model_name) as span:
+            try:
+                async with llm_semaphore():
+                    response = await self._acall(
+                        lambda timeout: self.model.generate_content_async(prompt, request_options={"timeout": timeout})
+                    )
+                _record_usage(span, response, self.model_name)
+                return response.text.strip()
+            except Exception as e:
+                span.set("error", type(e).__name__)
+                logging.error(f"Gemini API call error: {e}")
+                return GENERATION_ERROR_MESSAGE
+
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Generates a response as an async stream of chunks with the native async client."""
+        if not self.model:
+            yield MODEL_NOT_INITIALIZED_MESSAGE
+            return
+        with telemetry.span("llm_stream", activate=False, model=self.model_name) as span:
+            started_at = time.perf_counter()
+            try:
+                async with llm_semaphore():
+                    first_chunk, response_stream = await self._acall(lambda timeout: self._aopen_stream(prompt, timeout))
+                    if first_chunk is None:
+                        return
+                    _record_ttft(span, started_at, self.model_name)
+                    yield first_chunk.text
+                    last_chunk = first_chunk
+                    async for chunk in _aiter_with_timeout(response_stream, LLM_TIMEOUT_SECONDS):
+                        last_chunk = chunk
+                        yield chunk.text
+                    _record_usage(span, last_chunk, self.model_name)
+            except Exception as e:
+                span.set("error", type(e).__name__)
+                logging.error(f"Gemini API stream error: {e}")
+                yield GENERATION_ERROR_MESSAGE
+
+class SimulatedModel(LanguageModel):
+    """
+    A local, deterministic stand-in for a real language model, for load tests and offline runs.
+
+    Responses take `ttft` seconds to start and then arrive at `tokens_per_second`; a
+    fraction `error_rate` of calls fail with GENERATION_ERROR_MESSAGE, like a Gemini call
+    whose retries were exhausted. Query rewrite prompts are answered with the user's
+    question unchanged, and answers cite every source id found in the prompt, so the
+    rest of the pipeline sees realistic output. The text depends only on the prompt, and
+    the sequence of failures only on `seed`.
+    """
+    MODEL_NAME = "simulated"
+    _SOURCE_RE = re.compile(r"^Source: \[([^\]]+)\]", re.MULTILINE)
+    _QUESTION_RE = re.compile(r"^User's Final Question: (.*)$", re.MULTILINE)
+    _WORDS = ("the", "information", "in", "our", "knowledge", "base", "suggests", "that", "this", "condition",
+              "is", "usually", "managed", "with", "rest", "and", "a", "doctor", "should", "be", "consulted")
+
+    def __init__(
+        self,
+        ttft: float = SIMULATED_LLM_TTFT_SECONDS,
+        tokens_per_second: float = SIMULATED_LLM_TOKENS_PER_SECOND,
+        error_rate: float = SIMULATED_LLM_ERROR_RATE,
+        answer_tokens: int = SIMULATED_LLM_ANSWER_TOKENS,
+        seed: int = SIMULATED_LLM_SEED
+    ):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.answer_tokens = answer_tokens
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _fails(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def _tokens(self, prompt: str) -> List[str]:
+        """Returns the response to `prompt` as a list of tokens (words with trailing spaces)."""
+        question = self._QUESTION_RE.search(prompt)
+        if question and prompt.rstrip().endswith("Rewritten Question:"):
+            return [word + " " for word in question.group(1).split()]
+
+        start = zlib.crc32(prompt.encode("utf-8"))
+        words = [self._WORDS[(start + i) % len(self._WORDS)] for i in range(self.answer_tokens)]
+        words[0] = words[0].capitalize()
+        words[-1] += "."
+        citations = [f"[{source_id}]" for source_id in dict.fromkeys(self._SOURCE_RE.findall(prompt))]
+        return [word + " " for word in words + citations]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def generate(self, prompt: str) -> str:
+        """Returns the full response after the simulated generation time."""
+        with telemetry.span("llm_generate", model=self.MODEL_NAME) as span:
+            tokens = self._tokens(prompt)
+            time.sleep(self.ttft)
+            if self._fails():
+                span.set("error", "SimulatedError")
+                return GENERATION_ERROR_MESSAGE
+            time.sleep(self._token_delay() * len(tokens))
+            _record_tokens(span, self.MODEL_NAME, len(prompt.split()), len(tokens))
+            return "".join(tokens).strip()
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        """Yields the response one token at a time, at the simulated rate."""
+        with telemetry.span("llm_stream", activate=False, model=self.MODEL_NAME) as span:
+            started_at = time.perf_counter()
+            tokens = self._tokens(prompt)
+            time.sleep(self.ttft)
+            if self._fails():
+                span.set("error", "SimulatedError")
+                yield GENERATION_ERROR_MESSAGE
+                return
+            _record_ttft(span, started_at, self.MODEL_NAME)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(self._token_delay())
+                yield token
+            _record_tokens(span, self.MODEL_NAME, len(prompt.split()), len(tokens))
+
+    async def agenerate(self, prompt: str) -> str:
+        """Async variant of `generate` that sleeps on the event loop instead of a thread."""
+        with telemetry.span("llm_generate", model=self.MODEL_NAME) as span:
+            async with llm_semaphore():
+                tokens = self._tokens(prompt)
+                await asyncio.sleep(self.ttft)
+                if self._fails():
+                    span.set("error", "SimulatedError")
+                    return GENERATION_ERROR_MESSAGE
+                await asyncio.sleep(self._token_delay() * len(tokens))
+                _record_tokens(span, self.MODEL_NAME, len(prompt.split()), len(tokens))
+                return "".join(tokens).strip()
+
+    async def agenerate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """Async variant of `generate_stream` that sleeps on the event loop instead of a thread."""
+        with telemetry.span("llm_stream", activate=False, model=self.MODEL_NAME) as span:
+            started_at = time.perf_counter()
+            async with llm_semaphore():
+                tokens = self._tokens(prompt)
+                await asyncio.sleep(self.ttft)
+                if self._fails():
+                    span.set("error", "SimulatedError")
+                    yield GENERATION_ERROR_MESSAGE
+                    return
+                _record_ttft(span, started_at, self.MODEL_NAME)
+                for i, token in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(self._token_delay())
+                    yield token
+                _record_tokens(span, self.MODEL_NAME, len(prompt.split()), len(tokens))
+
+def get_language_model(provider: str = LLM_PROVIDER) -> LanguageModel:
+    """
+    Factory function to get the currently configured language model.
 
-def get_language_model() -> LanguageModel:
-    """Factory function to get the currently configured language model."""
-    return GeminiModel()
+    Args:
+        provider: 'gemini' or 'simulated'. Defaults to LLM_PROVIDER.
+    """
+    if provider == "gemini":
+        return GeminiModel()
+    if provider == "simulated":
+        logging.info("Using the simulated language model.")
+        return SimulatedModel()
+    raise ValueError(f"Unknown LLM provider '{provider}'. Expected 'gemini' or 'simulated'.")
@@ -0,0 +1,157 @@
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from src import telemetry
+from src.answer_index import afind_canonical_answer
+from src.answer_generator import arewrite_and_retrieve, agenerate_answer, agenerate_answer_stream, get_llm
+from src.config import COLLECTION_NAME, DB_PATH, VECTOR_BACKEND
+from src.retriever import aretrieve_context, get_retriever
+
+# Returned instead of calling the model when no context was retrieved.
+NO_CONTEXT_ANSWER = "I could not find any relevant information to answer your question."
+
+async def prepare_turn(
+    query: str,
+    history: List[Dict[str, str]],
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = 0.0,
+    backend: str = VECTOR_BACKEND
+) -> Tuple[str, List[Dict[str, any]]]:
+    """
+    Rewrites a chat turn into a standalone question and retrieves its context.
+
+    The rewrite is skipped or overlapped with retrieval according to REWRITE_MODE.
+
+    Returns:
+        The rewritten query and the retrieved documents.
+    """
+    async def aretrieve(text: str) -> List[Dict[str, any]]:
+        return await aretrieve_context(text, collection_name, db_path=db_path, threshold=threshold, backend=backend)
+
+    def probe(text: str) -> List[str]:
+        retriever = get_retriever(collection_name, db_path=db_path, backend=backend)
+        return retriever.search_sources(text, threshold=threshold)
+
+    rewritten, context = await arewrite_and_retrieve(query, history, aretrieve, probe)
+    logging.info(f"Rewritten query: '{rewritten}'")
+    return rewritten, context
+
+async def answer_question(
+    query: str,
+    history: List[Dict[str, str]],
+    language: str = "English",
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = 0.0,
+    backend: str = VECTOR_BACKEND
+) -> Dict[str, any]:
+    """
+    Runs one chat turn end to end: rewrite, retrieve, generate.
+
+    A standalone question that matches a curated FAQ question is answered with the
+    curated answer instead, without a rewrite or an LLM call. Every step awaits instead
+    of blocking, so a single process can serve many conversations concurrently; outbound
+    LLM calls are limited by LLM_MAX_CONCURRENCY.
+
+    Args:
+        query: The user's question, as typed.
+        history: The previous messages of the conversation.
+        language: The language to answer in.
+        collection_name: The name of the collection to query.
+        db_path: Path for the persistent database.
+        threshold: The maximum distance score for relevance. 0.0 disables filtering.
+        backend: The vector backend ('chroma' or 'numpy').
+
+    Returns:
+        A dictionary with the 'rewritten' query, the retrieved 'context' and the 'answer'.
+    """
+    match = await afind_canonical_answer(query, history, language=language, db_path=db_path, backend=backend)
+    if match is not None:
+        return {"rewritten": query, "context": match["context"], "answer": match["answer"]}
+    rewritten, context = await prepare_turn(query, history, collection_name, db_path, threshold, backend)
+    if not context:
+        return {"rewritten": rewritten, "context": [], "answer": NO_CONTEXT_ANSWER}
+    answer = await agenerate_answer(query, context, history=history, language=language, cache_query=rewritten)
+    return {"rewritten": rewritten, "context": context, "answer": answer}
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def open_answer_stream(
+    query: str,
+    history: List[Dict[str, str]],
+    language: str = "English",
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = 0.0,
+    backend: str = VECTOR_BACKEND
+) -> Dict[str, any]:
+    """
+    Runs the steps of `answer_question` that come before generation, and returns the
+    answer as a stream that has not started yet.
+
+    Callers such as the HTTP API can report the rewritten query and the sources (or an
+    error) before the first answer chunk.
+
+    Returns:
+        A dictionary with the 'rewritten' query, the retrieved 'context' and the 'stream'
+        of answer chunks.
+    """
+    match = await afind_canonical_answer(query, history, language=language, db_path=db_path, backend=backend)
+    if match is not None:
+        return {"rewritten": query, "context": match["context"], "stream": _single_chunk(match["answer"])}
+    rewritten, context = await prepare_turn(query, history, collection_name, db_path, threshold, backend)
+    if not context:
+        return {"rewritten": rewritten, "context": [], "stream": _single_chunk(NO_CONTEXT_ANSWER)}
+    stream = agenerate_answer_stream(query, context, history=history, language=language, cache_query=rewritten)
+    return {"rewritten": rewritten, "context": context, "stream": stream}
+
+async def answer_question_stream(
+    query: str,
+    history: List[Dict[str, str]],
+    language: str = "English",
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    threshold: float = 0.0,
+    backend: str = VECTOR_BACKEND
+) -> AsyncIterator[str]:
+    """Streaming variant of `answer_question` that yields the answer as it is generated."""
+    turn = await open_answer_stream(query, history, language, collection_name, db_path, threshold, backend)
+    async for chunk in turn["stream"]:
+        yield chunk
+
+# --- Warm-Up ---
+# Models and stores are created lazily on first use. Warming up in the background lets
+# an interactive front end start immediately and still answer the first question fast.
+_warm_up_lock = threading.Lock()
+_warm_up_thread: Optional[threading.Thread] = None
+
+def warm_up(collection_name: str = COLLECTION_NAME, db_path: Optional[str] = DB_PATH, backend: str = VECTOR_BACKEND):
+    """Creates the language model, opens the vector store and loads the embedding model."""
+    with telemetry.span("warm_up"):
+        get_llm()
+        retriever = get_retriever(collection_name, db_path=db_path, backend=backend)
+        # A first encode initializes the model's kernels; the result is not cached.
+        retriever.model.encode("warm-up")
+    logging.info("Warm-up complete.")
+
+def start_warm_up(collection_name: str = COLLECTION_NAME, db_path: Optional[str] = DB_PATH, backend: str = VECTOR_BACKEND) -> threading.Thread:
+    """
+    Runs `warm_up` in a daemon thread, once per process.
+
+    Returns:
+        The warm-up thread (the already running or finished one on later calls).
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            def run():
+                try:
+                    warm_up(collection_name, db_path, backend)
+                except Exception as e:
+                    logging.warning(f"Warm-up failed; models will load on first use instead: {e}")
+            _warm_up_thread = threading.Thread(target=run, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
@@ -0,0 +1,117 @@
+# src/prompt_builder.py
+
+import re
+from typing import Dict, List, Tuple
+
+from src.cache import LRUCache
+from src.config import (
+    PROMPT_HISTORY_TOKEN_BUDGET,
+    PROMPT_VERBATIM_MESSAGES,
+    PROMPT_COMPACT_MESSAGE_TOKENS,
+    PROMPT_CHARS_PER_TOKEN
+)
+from src.retriever import merge_chunks
+
+# (role, content) -> (compacted line, its token estimate). History grows by appending, so
+# each message is compacted once and reused on every later turn of the conversation.
+_compacted_messages = LRUCache(4096)
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+_CITATION_RE = re.compile(r"\[[^\[\]\n]{1,64}\]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of LLM tokens in `text` from its length."""
+    return -(-len(text) // PROMPT_CHARS_PER_TOKEN)
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cuts `text` at a word boundary so that it fits in about `max_tokens` tokens."""
+    max_chars = max_tokens * PROMPT_CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+def compact_message(message: Dict[str, str]) -> Tuple[str, int]:
+    """
+    Returns a short "role: content" line for an older history message and its token estimate.
+
+    The message is reduced to its first sentence (truncated to PROMPT_COMPACT_MESSAGE_TOKENS)
+    and keeps the source citations of the original, so follow-ups can still refer to them.
+    """
+    key = (message['role'], message['content'])
+    cached = _compacted_messages.get(key)
+    if cached is not None:
+        return cached
+
+    content = _WHITESPACE_RE.sub(" ", message['content']).strip()
+    first_sentence = _SENTENCE_END_RE.split(content, maxsplit=1)[0]
+    summary = _truncate(first_sentence, PROMPT_COMPACT_MESSAGE_TOKENS)
+    if summary != content:
+        citations = [c for c in dict.fromkeys(_CITATION_RE.findall(content)) if c not in summary]
+        summary = " ".join([summary] + citations)
+    line = f"{message['role']}: {summary}"
+    compacted = (line, estimate_tokens(line) + 1)
+    _compacted_messages.put(key, compacted)
+    return compacted
+
+def format_history(history: List[Dict[str, str]], token_budget: int = PROMPT_HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Formats the conversation history to fit in `token_budget` tokens.
+
+    The newest PROMPT_VERBATIM_MESSAGES messages are kept verbatim if they fit; older
+    messages (and recent ones that do not fit) are compacted. The oldest messages are
+    dropped once the budget is spent.
+    """
+    lines = []
+    remaining = token_budget
+    for age, message in enumerate(reversed(history)):
+        line = f"{message['role']}: {message['content']}"
+        tokens = estimate_tokens(line) + 1 # + the newline
+        if age >= PROMPT_VERBATIM_MESSAGES or tokens > remaining:
+            line, tokens = compact_message(message)
+        if tokens > remaining:
+            break
+        lines.append(line)
+        remaining -= tokens
+    return "\n".join(reversed(lines))
+
+def _normalized(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text).strip().casefold()
+
+def dedupe_context(context: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Removes redundant context: touching chunks of the same source are merged, and items
+    whose text repeats (or is contained in) a higher-ranked item are dropped.
+    """
+    kept: List[Dict[str, any]] = []
+    kept_texts: List[str] = []
+    for item in merge_chunks(context):
+        text = _normalized(item.get("text", ""))
+        if any(text in other for other in kept_texts):
+            continue
+        kept.append(item)
+        kept_texts.append(text)
+    return kept
+
+def fit_context(context: List[Dict[str, any]], token_budget: int, per_item_overhead: int = 0) -> List[Dict[str, any]]:
+    """
+    Selects context items, in rank order, that fit in `token_budget` tokens.
+
+    Items that do not fit are skipped, except the top item, which is truncated instead so
+    the answer always has a source. `per_item_overhead` is the formatting cost of an item.
+    """
+    selected = []
+    remaining = token_budget
+    for item in context:
+        tokens = estimate_tokens(item.get("text", "")) + per_item_overhead
+        if tokens <= remaining:
+            selected.append(item)
+            remaining -= tokens
+        elif not selected and remaining > per_item_overhead:
+            selected.append(dict(item, text=_truncate(item.get("text", ""), remaining - per_item_overhead)))
+            remaining = 0
+    return selected
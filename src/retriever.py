@@ -1,30 +1,609 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-from typing import List, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Tuple, Iterable, Iterator
+import asyncio
+import contextvars
+import functools
 import logging
+import os
+import threading
+import uuid
+import weakref
+
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 from src.config import (
-    DB_PATH, 
-    COLLECTION_NAME, 
-    EMBEDDING_MODEL_NAME, 
-    CONTEXT_RETRIEVAL_N_RESULTS, 
-    CONTEXT_RETRIEVAL_THRESHOLD
+    DB_PATH,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL_NAME,
+    CONTEXT_RETRIEVAL_N_RESULTS,
+    CONTEXT_RETRIEVAL_THRESHOLD,
+    RETRIEVAL_BATCH_SIZE,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_MERGE_CHUNKS,
+    HYBRID_RETRIEVAL,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    RETRIEVAL_THREADS,
+    EMBEDDING_BATCHING,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    VECTOR_BACKEND,
+    EMBEDDING_BACKEND
 )
+from src import telemetry
+from src.batching import MicroBatcher
+from src.lazy_import import lazy_import
+from src.bm25 import get_bm25_index, reciprocal_rank_fusion
+from src.cache import LRUCache
+from src.embedding_backends import embedding_model_key, load_embedding_model
+from src.vector_store import ChromaVectorStore, VectorStore, open_vector_store
+
+# Imported on first use: loading PyTorch and ChromaDB dominates startup otherwise.
+chromadb = lazy_import("chromadb")
+sentence_transformers = lazy_import("sentence_transformers")
+
+# --- Shared Registry ---
+# Loading a Sentence Transformers model or opening a vector store is far more
+# expensive than a single query, so both are created once per process and shared
+# by every caller (Streamlit sessions, CLI turns, worker threads).
+_registry_lock = threading.RLock()
+_embedding_models: Dict[str, "sentence_transformers.SentenceTransformer"] = {}
+_retrievers: Dict[Tuple[str, str, str, str], "Retriever"] = {}
+# client -> (model name, collection) -> Retriever; entries go away with the client.
+_client_retrievers: "weakref.WeakKeyDictionary[chromadb.Client, Dict[Tuple[str, str], Retriever]]" = weakref.WeakKeyDictionary()
+# model name -> batcher coalescing concurrent query encodes for that model
+_query_batchers: Dict[str, MicroBatcher] = {}
+
+# --- Query Caches ---
+# (model name, normalized query) -> embedding
+_query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE, ttl=QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+# (store, collection, generation, model name, normalized query, n_results, threshold, merge, hybrid) -> results
+_retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL_SECONDS)
+# Bumped whenever a collection is rebuilt, so results computed against the old
+# contents can never be served again, even if a query was in flight during the rebuild.
+_collection_generations: Dict[str, int] = {}
+
+# --- Async Executor ---
+# Encoding and search release the GIL for most of their work, so a small thread pool
+# lets the async pipeline keep several retrievals running without blocking the event loop.
+_retrieval_executor: Optional[ThreadPoolExecutor] = None
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide thread pool used by the async retrieval functions."""
+    global _retrieval_executor
+    if _retrieval_executor is None:
+        with _registry_lock:
+            if _retrieval_executor is None:
+                _retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="retriever")
+    return _retrieval_executor
+
+def normalize_query(query: str) -> str:
+    """Normalizes a query for caching: case-insensitive, with collapsed whitespace."""
+    return " ".join(query.split()).casefold()
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Returns hit/miss counters for the query embedding and retrieval result caches."""
+    return {
+        "query_embeddings": _query_embedding_cache.stats(),
+        "retrieval_results": _retrieval_cache.stats(),
+    }
+
+def clear_caches():
+    """Empties the query embedding and retrieval result caches."""
+    _query_embedding_cache.clear()
+    _retrieval_cache.clear()
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME, backend: str = EMBEDDING_BACKEND) -> "sentence_transformers.SentenceTransformer":
+    """Returns the process-wide Sentence Transformers model for `model_name` run with `backend`, loading it on first use."""
+    key = embedding_model_key(model_name, backend)
+    model = _embedding_models.get(key)
+    if model is None:
+        with _registry_lock:
+            model = _embedding_models.get(key)
+            if model is None:
+                model = load_embedding_model(model_name, backend)
+                _embedding_models[key] = model
+    return model
+
+def _encode_queries(model_name: str, queries: List[str]) -> List[List[float]]:
+    """Encodes a batch of normalized queries with one model call."""
+    model = get_embedding_model(model_name)
+    if len(queries) == 1:
+        return [model.encode(queries[0]).tolist()]
+    return model.encode(queries, batch_size=len(queries)).tolist()
+
+def get_query_batcher(model_name: str = EMBEDDING_MODEL_NAME) -> MicroBatcher:
+    """Returns the process-wide batcher that coalesces concurrent query encodes for `model_name`."""
+    batcher = _query_batchers.get(model_name)
+    if batcher is None:
+        with _registry_lock:
+            batcher = _query_batchers.get(model_name)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    functools.partial(_encode_queries, model_name),
+                    max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+                    max_wait=EMBEDDING_BATCH_MAX_WAIT_MS / 1000.0,
+                    name="query_embedding"
+                )
+                _query_batchers[model_name] = batcher
+    return batcher
+
+def get_batching_stats() -> Dict[str, Dict[str, float]]:
+    """Returns batch size and queueing delay statistics for each query batcher."""
+    return {model_name: batcher.stats() for model_name, batcher in list(_query_batchers.items())}
+
+def embed_query(query: str, model_name: str = EMBEDDING_MODEL_NAME) -> List[float]:
+    """
+    Returns the embedding of `query`, using the shared embedding cache.
+
+    The cache key is the normalized query, but the encoder sees the query with its case
+    kept (only whitespace is collapsed), as documents are encoded: the multilingual
+    tokenizer is case-sensitive, so casefolding would shift distances.
+    """
+    text = " ".join(query.split())
+    key = (embedding_model_key(model_name), normalize_query(query))
+    embedding = _query_embedding_cache.get(key)
+    telemetry.increment("cache_requests", cache="query_embedding", result="miss" if embedding is None else "hit")
+    if embedding is None:
+        with telemetry.span("encode_query", model=model_name):
+            if EMBEDDING_BATCHING:
+                embedding = get_query_batcher(model_name).run(text)
+            else:
+                embedding = _encode_queries(model_name, [text])[0]
+        _query_embedding_cache.put(key, embedding)
+    return embedding
+
+class Retriever:
+    """
+    Retrieves relevant context for queries from a single vector store collection.
+
+    The embedding model is taken from the shared registry and the store keeps its
+    collection handle (or memory map) open, so repeated queries only pay for encoding
+    and search. Pass either a ChromaDB `client` or any VectorStore as `store`.
+    Query embeddings and results are memoized in the module-level LRU caches; `store_key`
+    identifies the database so results from different stores never collide. With
+    `merge_chunks`, overlapping or adjacent chunks of the same source are merged back
+    into a single result.
+
+    With `hybrid`, the vector ranking is fused with the collection's BM25 index (found
+    under `db_path`, or in memory for client-backed stores) using Reciprocal Rank Fusion,
+    so exact terms such as drug names are not lost to the embedding. Documents found only
+    by BM25 get their true vector distance, so the threshold applies to every result.
+    If the collection has no BM25 index, retrieval is vector-only.
+    """
+    def __init__(
+        self,
+        collection_name: str,
+        client: Optional["chromadb.Client"] = None,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        store_key: Optional[str] = None,
+        merge_chunks: bool = RETRIEVAL_MERGE_CHUNKS,
+        store: Optional[VectorStore] = None,
+        db_path: Optional[str] = None,
+        hybrid: bool = HYBRID_RETRIEVAL
+    ):
+        self.collection_name = collection_name
+        self.store = store if store is not None else open_vector_store(collection_name, client=client)
+        self.model_name = model_name
+        self.merge_chunks = merge_chunks
+        self.db_path = db_path
+        self.hybrid = hybrid
+        # A fresh key per instance: ids of collected stores are reused by new objects.
+        self.store_key = store_key or f"store-{uuid.uuid4().hex}"
+
+    @property
+    def model(self) -> "sentence_transformers.SentenceTransformer":
+        return get_embedding_model(self.model_name)
+
+    def invalidate(self):
+        """Drops cached store state, e.g. after the collection was rebuilt."""
+        self.store.invalidate()
+
+    def embed_query(self, query: str) -> List[float]:
+        """Returns the embedding of the normalized `query`, using the shared embedding cache."""
+        return embed_query(query, self.model_name)
+
+    def search_sources(
+        self,
+        query: str,
+        n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+        threshold: float = CONTEXT_RETRIEVAL_THRESHOLD
+    ) -> List[str]:
+        """
+        Returns the source ids of the vector-only top `n_results` for `query`.
+
+        A cheap probe (no BM25 fusion, chunk merging or result caching) to check whether
+        a query finds the same sources as another.
+        """
+        with telemetry.span("vector_search", queries=1, n_results=n_results):
+            results = self.store.query([self.embed_query(query)], n_results)
+        metadatas = (results.get('metadatas') or [[]])[0]
+        distances = (results.get('distances') or [[]])[0]
+        return [
+            meta.get("source_id", "") for meta, distance in zip(metadatas, distances)
+            if threshold <= 0.0 or distance <= threshold
+        ]
+
+    def _query(self, queries: List[str], query_embeddings: List[List[float]], n_results: int) -> Dict[str, List]:
+        """Searches the store, fusing in BM25 results when hybrid retrieval is available."""
+        index = get_bm25_index(self.collection_name, self.store, self.db_path) if self.hybrid else None
+        if index is None:
+            with telemetry.span("vector_search", queries=len(queries), n_results=n_results):
+                return self.store.query(query_embeddings, n_results)
+
+        with telemetry.span("vector_search", queries=len(queries), n_results=max(n_results, HYBRID_CANDIDATES)):
+            results = self.store.query(query_embeddings, max(n_results, HYBRID_CANDIDATES))
+        fused_ids = []
+        for query, vector_ids in zip(queries, results.get('ids') or [[] for _ in queries]):
+            with telemetry.span("bm25_search"):
+                lexical_ids = [doc_id for doc_id, _ in index.search(query, HYBRID_CANDIDATES)]
+            fused = reciprocal_rank_fusion([vector_ids, lexical_ids], k=RRF_K)
+            fused_ids.append([doc_id for doc_id, _ in fused[:n_results]])
+        return self._fused_results(results, fused_ids, query_embeddings)
+
+    def _fused_results(
+        self,
+        results: Dict[str, List],
+        fused_ids: List[List[str]],
+        query_embeddings: List[List[float]]
+    ) -> Dict[str, List]:
+        """Assembles store-shaped results for the fused rankings, fetching lexical-only hits from the store."""
+        known: Dict[str, Tuple[str, Dict[str, any], Optional[List[float]]]] = {}
+        for ids, docs, metas, dists in zip(results['ids'], results['documents'], results['metadatas'], results['distances']):
+            for doc_id, doc, meta, dist in zip(ids, docs, metas, dists):
+                known.setdefault(doc_id, (doc, meta, None))
+        missing = {doc_id for ids in fused_ids for doc_id in ids if doc_id not in known}
+        if missing:
+            fetched = self.store.get(list(missing))
+            for doc_id, doc, meta, embedding in zip(fetched['ids'], fetched['documents'], fetched['metadatas'], fetched['embeddings']):
+                known[doc_id] = (doc, meta, embedding)
+
+        fused = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for i, ids in enumerate(fused_ids):
+            vector_distances = dict(zip(results['ids'][i], results['distances'][i]))
+            query = np.asarray(query_embeddings[i], dtype=np.float32)
+            row = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for doc_id in ids:
+                if doc_id not in known:
+                    continue # Deleted since the BM25 index was built.
+                doc, meta, embedding = known[doc_id]
+                distance = vector_distances.get(doc_id)
+                if distance is None:
+                    difference = np.asarray(embedding, dtype=np.float32) - query
+                    distance = float(difference @ difference) # Squared L2, like the store.
+                row["ids"].append(doc_id)
+                row["documents"].append(doc)
+                row["metadatas"].append(meta)
+                row["distances"].append(distance)
+            for key in fused:
+                fused[key].append(row[key])
+        return fused
+
+    def retrieve(
+        self,
+        query: str,
+        n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+        threshold: float = CONTEXT_RETRIEVAL_THRESHOLD
+    ) -> List[Dict[str, any]]:
+        """
+        Retrieves the documents most relevant to `query`.
+
+        Args:
+            query: The user's query.
+            n_results: The number of documents to retrieve.
+            threshold: The maximum distance score for relevance. 0.0 disables filtering.
+
+        Returns:
+            A list of dictionaries, where each dictionary contains the document
+            text, its metadata and its distance to the query. Results may be
+            served from the shared cache and should be treated as read-only.
+        """
+        with telemetry.span("retrieve", collection=self.collection_name, n_results=n_results) as span:
+            results = self._retrieve(query, n_results, threshold, span)
+        for result in results:
+            if result.get('distance') is not None:
+                telemetry.observe("retrieved_distance", result['distance'], collection=self.collection_name)
+        return results
+
+    def _retrieve(self, query: str, n_results: int, threshold: float, span: telemetry.Span) -> List[Dict[str, any]]:
+        cache_key = (
+            self.store_key,
+            self.collection_name,
+            _collection_generations.get(self.collection_name, 0),
+            embedding_model_key(self.model_name),
+            normalize_query(query),
+            n_results,
+            threshold,
+            self.merge_chunks,
+            self.hybrid,
+        )
+        cached = _retrieval_cache.get(cache_key)
+        telemetry.increment("cache_requests", cache="retrieval", result="miss" if cached is None else "hit")
+        span.set("cache_hit", cached is not None)
+        if cached is not None:
+            return list(cached)
+
+        query_embedding = self.embed_query(query)
+
+        try:
+            results = self._query([query], [query_embedding], n_results)
+        except Exception as e:
+            logging.error(f"Failed to get collection '{self.collection_name}': {e}")
+            return []
+
+        combined_results = _combine_results(
+            results.get('documents', [[]])[0],
+            results.get('metadatas', [[]])[0],
+            results.get('distances', [[]])[0],
+            threshold,
+            self.merge_chunks
+        )
+        _retrieval_cache.put(cache_key, combined_results)
+        span.set("results", len(combined_results))
+        return list(combined_results)
+
+    async def aretrieve(
+        self,
+        query: str,
+        n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+        threshold: float = CONTEXT_RETRIEVAL_THRESHOLD
+    ) -> List[Dict[str, any]]:
+        """Async variant of `retrieve` that runs encoding and search on the shared retrieval thread pool."""
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so the retrieval span nests under the current turn.
+        call = functools.partial(contextvars.copy_context().run, self.retrieve, query, n_results, threshold)
+        return await loop.run_in_executor(get_retrieval_executor(), call)
+
+    def iter_retrieve_batch(
+        self,
+        queries: Iterable[str],
+        n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+        threshold: float = CONTEXT_RETRIEVAL_THRESHOLD,
+        batch_size: int = RETRIEVAL_BATCH_SIZE
+    ) -> Iterator[List[Dict[str, any]]]:
+        """
+        Lazily retrieves context for many queries, yielding one result list per query in order.
+
+        Queries are processed `batch_size` at a time: each chunk is encoded with a single
+        `model.encode` call and searched with a single `collection.query` call, so memory
+        stays bounded no matter how many queries are supplied. Batched retrieval bypasses
+        the in-memory query caches so bulk jobs do not evict the hot interactive entries;
+        embeddings are reused from the persistent embedding cache instead.
+        """
+        chunk: List[str] = []
+        for query in queries:
+            chunk.append(query)
+            if len(chunk) >= batch_size:
+                yield from self._retrieve_chunk(chunk, n_results, threshold, batch_size)
+                chunk = []
+        if chunk:
+            yield from self._retrieve_chunk(chunk, n_results, threshold, batch_size)
+
+    def retrieve_batch(
+        self,
+        queries: Iterable[str],
+        n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+        threshold: float = CONTEXT_RETRIEVAL_THRESHOLD,
+        batch_size: int = RETRIEVAL_BATCH_SIZE
+    ) -> List[List[Dict[str, any]]]:
+        """Retrieves context for many queries at once. See `iter_retrieve_batch`."""
+        return list(self.iter_retrieve_batch(queries, n_results, threshold, batch_size))
+
+    def _embed_queries(self, queries: List[str], batch_size: int) -> List[List[float]]:
+        """
+        Returns the embeddings of `queries`, encoding the ones missing from the shared
+        query-embedding cache in one `model.encode` call.
+
+        Queries go through the bounded in-memory cache rather than the persistent
+        embedding cache, which is meant for corpus documents and is never evicted.
+        """
+        model_key = embedding_model_key(self.model_name)
+        keys = [(model_key, normalize_query(query)) for query in queries]
+        embeddings = [_query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        telemetry.increment("cache_requests", len(queries) - len(missing), cache="query_embedding", result="hit")
+        telemetry.increment("cache_requests", len(missing), cache="query_embedding", result="miss")
+        if missing:
+            texts = [" ".join(queries[i].split()) for i in missing]
+            with telemetry.span("encode_query", model=self.model_name):
+                encoded = self.model.encode(texts, batch_size=batch_size).tolist()
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                _query_embedding_cache.put(keys[i], embedding)
+        return embeddings
+
+    def _retrieve_chunk(
+        self,
+        queries: List[str],
+        n_results: int,
+        threshold: float,
+        batch_size: int
+    ) -> List[List[Dict[str, any]]]:
+        """Encodes and searches one chunk of queries."""
+        query_embeddings = self._embed_queries(queries, batch_size)
+
+        try:
+            results = self._query(queries, query_embeddings, n_results)
+        except Exception as e:
+            logging.error(f"Failed to get collection '{self.collection_name}': {e}")
+            return [[] for _ in queries]
+
+        documents = results.get('documents') or [[] for _ in queries]
+        metadatas = results.get('metadatas') or [[] for _ in queries]
+        distances = results.get('distances') or [[] for _ in queries]
+        return [
+            _combine_results(docs, metas, dists, threshold, self.merge_chunks)
+            for docs, metas, dists in zip(documents, metadatas, distances)
+        ]
+
+def _combine_results(
+    documents: List[str],
+    metadatas: List[Dict[str, any]],
+    distances: List[float],
+    threshold: float,
+    merge: bool = False
+) -> List[Dict[str, any]]:
+    """Combines the parallel lists of one query's results, applies the distance threshold and merges chunks."""
+    if not documents:
+        return []
+
+    # Combine the results into a list of dictionaries
+    combined_results = [
+        {"text": doc, "metadata": meta, "distance": dist}
+        for doc, meta, dist in zip(documents, metadatas, distances)
+    ]
+
+    if threshold > 0.0:
+        # Filter based on distance, now that we have all the data
+        combined_results = [res for res in combined_results if res["distance"] <= threshold]
+
+    if merge:
+        return merge_chunks(combined_results)
+    return combined_results
+
+def merge_chunks(results: List[Dict[str, any]]) -> List[Dict[str, any]]:
+    """
+    Merges retrieved chunks of the same source whose character ranges overlap or touch.
+
+    Chunks are identified by the 'chunk_start'/'chunk_end' offsets stored in their metadata
+    at build time; results without offsets are passed through. Each merged result takes
+    the best (smallest) distance of its chunks and keeps the rank of its best chunk.
+    Overlapping text is only included once, and the merged text is joined in a single pass.
+    """
+    groups: Dict[str, List[Tuple[int, Dict[str, any]]]] = {}
+    ranked: List[Tuple[int, Dict[str, any]]] = []
+    for rank, res in enumerate(results):
+        meta = res.get("metadata") or {}
+        if "chunk_start" in meta and "chunk_end" in meta:
+            groups.setdefault(meta.get("source_id"), []).append((rank, res))
+        else:
+            ranked.append((rank, res))
+
+    for chunks in groups.values():
+        chunks.sort(key=lambda item: item[1]["metadata"]["chunk_start"])
+        run = [chunks[0]]
+        for item in chunks[1:]:
+            # A one-character gap is the whitespace between two non-overlapping windows.
+            if item[1]["metadata"]["chunk_start"] <= run[-1][1]["metadata"]["chunk_end"] + 1:
+                run.append(item)
+            else:
+                ranked.append(_merge_run(run))
+                run = [item]
+        ranked.append(_merge_run(run))
+
+    ranked.sort(key=lambda item: item[0])
+    return [res for _, res in ranked]
+
+def _merge_run(run: List[Tuple[int, Dict[str, any]]]) -> Tuple[int, Dict[str, any]]:
+    """Merges a run of touching chunks, sorted by start offset, into one ranked result."""
+    if len(run) == 1:
+        return run[0]
+
+    first = run[0][1]
+    pieces = [first["text"]]
+    end = first["metadata"]["chunk_end"]
+    for _, res in run[1:]:
+        start = res["metadata"]["chunk_start"]
+        if res["metadata"]["chunk_end"] <= end:
+            continue # Fully contained in what we already have.
+        if start > end:
+            pieces.append(" ")
+            pieces.append(res["text"])
+        else:
+            pieces.append(res["text"][end - start:])
+        end = res["metadata"]["chunk_end"]
+
+    metadata = dict(first["metadata"])
+    metadata["chunk_end"] = end
+    distances = [res["distance"] for _, res in run if res.get("distance") is not None]
+    merged = {
+        "text": "".join(pieces),
+        "metadata": metadata,
+        "distance": min(distances) if distances else None,
+    }
+    return min(rank for rank, _ in run), merged
+
+def get_retriever(
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    client: Optional["chromadb.Client"] = None,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    backend: str = VECTOR_BACKEND
+) -> Retriever:
+    """
+    Returns a Retriever for the given collection.
+
+    Retrievers are shared per (model, backend, db path, collection), or per (model,
+    collection) of a provided client. Client-backed Retrievers only hold the client weakly
+    and are dropped with it, so the registry does not keep clients alive.
+    """
+    if client is not None:
+        return _get_client_retriever(client, collection_name, model_name)
+    if not db_path:
+        raise ValueError("Either a 'db_path' or a 'client' instance must be provided.")
+
+    key = (model_name, backend, os.path.abspath(db_path), collection_name)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        with _registry_lock:
+            retriever = _retrievers.get(key)
+            if retriever is None:
+                store = open_vector_store(collection_name, db_path=db_path, backend=backend)
+                retriever = Retriever(
+                    collection_name,
+                    model_name=model_name,
+                    store_key=f"{backend}:{key[2]}",
+                    store=store,
+                    db_path=db_path
+                )
+                _retrievers[key] = retriever
+    return retriever
+
+def _get_client_retriever(client: "chromadb.Client", collection_name: str, model_name: str) -> Retriever:
+    with _registry_lock:
+        retrievers = _client_retrievers.setdefault(client, {})
+        retriever = retrievers.get((model_name, collection_name))
+        if retriever is None:
+            store = ChromaVectorStore(client, collection_name, weak_client=True)
+            retriever = Retriever(collection_name, model_name=model_name, store=store)
+            retrievers[(model_name, collection_name)] = retriever
+    return retriever
+
+def invalidate_collection(collection_name: str):
+    """
+    Invalidates everything cached for `collection_name`: collection handles held by
+    shared Retrievers and cached retrieval results. Called when the collection is rebuilt.
+    """
+    with _registry_lock:
+        _collection_generations[collection_name] = _collection_generations.get(collection_name, 0) + 1
+        retrievers = list(_retrievers.values())
+        retrievers.extend(retriever for per_client in _client_retrievers.values() for retriever in per_client.values())
+    _retrieval_cache.invalidate(lambda key: key[1] == collection_name)
+    for retriever in retrievers:
+        if retriever.collection_name == collection_name:
+            retriever.invalidate()
 
 def retrieve_context(
-    query: str, 
-    collection_name: str = COLLECTION_NAME, 
+    query: str,
+    collection_name: str = COLLECTION_NAME,
     db_path: Optional[str] = DB_PATH,
-    client: Optional[chromadb.Client] = None,
+    client: Optional["chromadb.Client"] = None,
     model_name: str = EMBEDDING_MODEL_NAME,
     n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
-    threshold: float = CONTEXT_RETRIEVAL_THRESHOLD
+    threshold: float = CONTEXT_RETRIEVAL_THRESHOLD,
+    backend: str = VECTOR_BACKEND
 ) -> List[Dict[str, any]]:
     """
-    Retrieves relevant context from a ChromaDB vector store.
+    Retrieves relevant context from the vector store.
+
+    This is a thin wrapper around the shared Retriever for the collection, so the
+    embedding model and database client are only loaded once per process.
 
     Args:
         query: The user's query.
@@ -34,60 +613,84 @@ def retrieve_context(
         model_name: The Sentence Transformers model to use.
         n_results: The number of documents to retrieve.
         threshold: The maximum distance score for relevance.
+        backend: The vector backend ('chroma' or 'numpy') used with `db_path`.
 
     Returns:
         A list of dictionaries, where each dictionary contains the document
         text and its metadata.
     """
-    if client is None:
-        if db_path:
-            logging.info(f"Initializing ChromaDB persistent client at path: {db_path}")
-            client = chromadb.PersistentClient(path=db_path)
-        else:
-            raise ValueError("Either a 'db_path' or a 'client' instance must be provided.")
-    else:
-        logging.info("Using provided ChromaDB client.")
-
-    try:
-        collection = client.get_collection(name=collection_name)
-        logging.info(f"Querying collection: '{collection_name}'")
-    except Exception as e:
-        logging.error(f"Failed to get collection '{collection_name}': {e}")
-        return []
+    retriever = get_retriever(collection_name, db_path=db_path, client=client, model_name=model_name, backend=backend)
+    return retriever.retrieve(query, n_results=n_results, threshold=threshold)
 
-    model = SentenceTransformer(model_name)
-    query_embedding = model.encode(query).tolist()
+async def aretrieve_context(
+    query: str,
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    client: Optional["chromadb.Client"] = None,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+    threshold: float = CONTEXT_RETRIEVAL_THRESHOLD,
+    backend: str = VECTOR_BACKEND
+) -> List[Dict[str, any]]:
+    """
+    Async variant of `retrieve_context`.
 
-    results = collection.query(
-        query_embeddings=[query_embedding], 
+    The whole call, including loading the shared model and store on first use, runs on
+    the retrieval thread pool, so the event loop is never blocked.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_retrieval_executor(), functools.partial(
+        contextvars.copy_context().run,
+        retrieve_context,
+        query,
+        collection_name=collection_name,
+        db_path=db_path,
+        client=client,
+        model_name=model_name,
         n_results=n_results,
-        include=["documents", "metadatas", "distances"]
-    )
-    
-    documents = results.get('documents', [[]])[0]
-    metadatas = results.get('metadatas', [[]])[0]
-    distances = results.get('distances', [[]])[0]
+        threshold=threshold,
+        backend=backend
+    ))
 
-    if not documents:
-        return []
+def retrieve_context_batch(
+    queries: Iterable[str],
+    collection_name: str = COLLECTION_NAME,
+    db_path: Optional[str] = DB_PATH,
+    client: Optional["chromadb.Client"] = None,
+    model_name: str = EMBEDDING_MODEL_NAME,
+    n_results: int = CONTEXT_RETRIEVAL_N_RESULTS,
+    threshold: float = CONTEXT_RETRIEVAL_THRESHOLD,
+    batch_size: int = RETRIEVAL_BATCH_SIZE,
+    backend: str = VECTOR_BACKEND
+) -> List[List[Dict[str, any]]]:
+    """
+    Retrieves relevant context for many queries at once.
 
-    # Combine the results into a list of dictionaries
-    combined_results = [
-        {"text": doc, "metadata": meta} 
-        for doc, meta in zip(documents, metadatas)
-    ]
+    Queries are encoded and searched in chunks of `batch_size`, one `model.encode` and one
+    `collection.query` call per chunk. For very large query sets, use
+    `get_retriever(...).iter_retrieve_batch(...)` to consume results lazily.
 
-    if threshold > 0.0:
-        # Filter based on distance, now that we have all the data
-        return [
-            res for res, dist in zip(combined_results, distances) if dist <= threshold
-        ]
-    
-    return combined_results
+    Args:
+        queries: The queries to retrieve context for.
+        collection_name: The name of the collection to query.
+        db_path: Path for the persistent database. If None, a client instance must be provided.
+        client: An optional chromadb.Client instance.
+        model_name: The Sentence Transformers model to use.
+        n_results: The number of documents to retrieve per query.
+        threshold: The maximum distance score for relevance.
+        batch_size: The number of queries encoded and searched per call.
+        backend: The vector backend ('chroma' or 'numpy') used with `db_path`.
+
+    Returns:
+        One list of results per query, in input order. Each result contains the
+        document text, its metadata and its distance to the query.
+    """
+    retriever = get_retriever(collection_name, db_path=db_path, client=client, model_name=model_name, backend=backend)
+    return retriever.retrieve_batch(queries, n_results=n_results, threshold=threshold, batch_size=batch_size)
 
 if __name__ == '__main__':
     test_query_english = "What are the symptoms of the flu?"
     print(f"\n--- Querying with: '{test_query_english}' ---")
     context = retrieve_context(test_query_english)
     for i, doc in enumerate(context):
-        print(f"  Result {i+1}: {doc[:100]}...")
\ No newline at end of file
+        print(f"  Result {i+1}: {doc['text'][:100]}...")
@@ -0,0 +1,260 @@
+# src/telemetry.py
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC
+from typing import Dict, List, Optional, Tuple
+
+from src.config import TELEMETRY_METRICS_ENABLED, TELEMETRY_TRACE_PATH
+
+class Span:
+    """
+    A timed pipeline stage. Use through `span(...)` as a context manager; attributes set
+    while it runs (token counts, cache hits, ...) are recorded with its duration.
+    """
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_time", "duration", "_start", "_activate", "_token")
+
+    def __init__(self, name: str, attributes: Dict[str, object], activate: bool = True):
+        self.name = name
+        self.attributes = attributes
+        self._activate = activate
+        self.duration = 0.0
+
+    def set(self, key: str, value: object):
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self) if self._activate else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        if self._token is not None:
+            _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        for sink in _sinks:
+            try:
+                sink.record_span(self)
+            except Exception as e:
+                # A broken sink must not fail the instrumented code.
+                logging.error(f"Telemetry sink {type(sink).__name__} failed to record span '{self.name}': {e}")
+        return False
+
+class _NoopSpan:
+    """Returned by `span()` while telemetry is disabled, so instrumented code costs next to nothing."""
+    __slots__ = ()
+    duration = 0.0
+
+    def set(self, key: str, value: object):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+class TelemetrySink(ABC):
+    """Receives finished spans and metric updates. All methods are optional no-ops."""
+    def record_span(self, span: Span):
+        pass
+
+    def increment(self, name: str, amount: float, labels: Dict[str, str]):
+        pass
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]):
+        pass
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class MetricsRegistry(TelemetrySink):
+    """
+    Aggregates counters, observations and span durations in memory and exports them in
+    the Prometheus text exposition format. Span durations become a histogram per stage;
+    other observations (distances, token counts) are summaries with a count and a sum.
+    """
+    DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, prefix: str = "rag"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters: Dict[LabelKey, float] = {}
+        self._summaries: Dict[LabelKey, List[float]] = {}
+        self._histograms: Dict[str, List[float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> LabelKey:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def record_span(self, span: Span):
+        with self._lock:
+            counts = self._histograms.setdefault(span.name, [0.0] * (len(self.DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(self.DURATION_BUCKETS):
+                if span.duration <= bound:
+                    counts[i] += 1
+            counts[-2] += 1 # count (+Inf)
+            counts[-1] += span.duration # sum
+
+    def increment(self, name: str, amount: float, labels: Dict[str, str]):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]):
+        key = self._key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+
+    def counter(self, name: str, **labels) -> float:
+        """Returns the current value of a counter."""
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0.0)
+
+    def prometheus_text(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        def label_str(labels: Tuple[Tuple[str, str], ...]) -> str:
+            if not labels:
+                return ""
+            escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            summaries = sorted(self._summaries.items())
+            histograms = sorted(self._histograms.items())
+
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {self.prefix}_{name}_total counter")
+            lines.extend(f"{self.prefix}_{name}_total{label_str(labels)} {value:g}" for (n, labels), value in counters if n == name)
+        for name in sorted({name for (name, _), _ in summaries}):
+            lines.append(f"# TYPE {self.prefix}_{name} summary")
+            for (n, labels), (count, total) in summaries:
+                if n == name:
+                    lines.append(f"{self.prefix}_{name}_count{label_str(labels)} {count:g}")
+                    lines.append(f"{self.prefix}_{name}_sum{label_str(labels)} {total:g}")
+        if histograms:
+            metric = f"{self.prefix}_stage_duration_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, counts in histograms:
+                stage_label = (("stage", stage),)
+                for bound, count in zip(self.DURATION_BUCKETS, counts):
+                    lines.append(f'{metric}_bucket{label_str(stage_label + (("le", f"{bound:g}"),))} {count:g}')
+                lines.append(f'{metric}_bucket{label_str(stage_label + (("le", "+Inf"),))} {counts[-2]:g}')
+                lines.append(f"{metric}_count{label_str(stage_label)} {counts[-2]:g}")
+                lines.append(f"{metric}_sum{label_str(stage_label)} {counts[-1]:g}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+class JsonlTraceSink(TelemetrySink):
+    """Appends every finished span to a JSON Lines file, one object per span."""
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record_span(self, span: Span):
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start_time": span.start_time,
+            "duration_ms": round(span.duration * 1000.0, 3),
+            "attributes": span.attributes,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# --- Module API ---
+# Instrumented code calls these functions unconditionally; with no sinks configured
+# they return immediately.
+_sinks: List[TelemetrySink] = []
+_metrics: Optional[MetricsRegistry] = None
+
+def span(name: str, activate: bool = True, **attributes) -> Span:
+    """
+    Returns a context manager timing the stage `name`.
+
+    Spans opened inside it become its children. Pass `activate=False` for spans held
+    open across generator yields, which must not become the parent of the caller's spans.
+    """
+    if not _sinks:
+        return _NOOP_SPAN
+    return Span(name, attributes, activate)
+
+def increment(name: str, amount: float = 1, **labels):
+    """Adds `amount` to the counter `name`."""
+    for sink in _sinks:
+        sink.increment(name, amount, labels)
+
+def observe(name: str, value: float, **labels):
+    """Records one observation (e.g. a distance or a token count) of `name`."""
+    for sink in _sinks:
+        sink.observe(name, value, labels)
+
+def enabled() -> bool:
+    """Returns whether any telemetry sink is configured."""
+    return bool(_sinks)
+
+def configure_telemetry(metrics: bool = TELEMETRY_METRICS_ENABLED, trace_path: Optional[str] = TELEMETRY_TRACE_PATH, sinks: Optional[List[TelemetrySink]] = None) -> Optional[MetricsRegistry]:
+    """
+    Replaces the active sinks. With no arguments, applies the configured defaults.
+
+    Args:
+        metrics: If True, aggregate metrics in memory for `prometheus_text()`.
+        trace_path: If set, append spans to this JSONL file.
+        sinks: Additional custom sinks.
+
+    Returns:
+        The metrics registry, or None if metrics are disabled.
+    """
+    global _metrics, _sinks
+    new_sinks: List[TelemetrySink] = []
+    _metrics = MetricsRegistry() if metrics else None
+    if _metrics is not None:
+        new_sinks.append(_metrics)
+    if trace_path:
+        new_sinks.append(JsonlTraceSink(trace_path))
+        logging.info(f"Writing telemetry traces to {trace_path}")
+    new_sinks.extend(sinks or [])
+    # Swap in the new list before closing the old sinks: spans finishing concurrently
+    # keep iterating the old list, and a closed trace sink drops their records.
+    old_sinks, _sinks = _sinks, new_sinks
+    for sink in old_sinks:
+        if isinstance(sink, JsonlTraceSink):
+            sink.close()
+    return _metrics
+
+def get_metrics_registry() -> Optional[MetricsRegistry]:
+    """Returns the in-memory metrics registry, or None if metrics are disabled."""
+    return _metrics
+
+def prometheus_text() -> str:
+    """Returns the current metrics in the Prometheus text format (empty if metrics are disabled)."""
+    return _metrics.prometheus_text() if _metrics is not None else ""
+
+configure_telemetry()
@@ -0,0 +1,757 @@
+# src/vector_store.py
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import weakref
+
+import numpy as np
+
+from src.config import (
+    DB_PATH,
+    VECTOR_BACKEND,
+    VECTOR_STORAGE,
+    VECTOR_RERANK_FACTOR,
+    PQ_SUBVECTORS,
+    PQ_TRAIN_SAMPLES,
+    PQ_TRAIN_ITERATIONS
+)
+from src.lazy_import import lazy_import
+
+chromadb = lazy_import("chromadb")
+torch = lazy_import("torch")
+
+class VectorStore(ABC):
+    """Abstract base class for a single collection of embedded documents."""
+    # The backend name, which also separates the files of each backend under a db path.
+    backend = "custom"
+
+    @property
+    def owner(self) -> object:
+        """The object holding the collection's data, identifying the database in in-memory registries."""
+        return self
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict[str, any]]):
+        pass
+
+    @abstractmethod
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, any]]):
+        pass
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        pass
+
+    @abstractmethod
+    def get_metadata(self) -> Dict[str, Dict[str, any]]:
+        """Returns the metadata of every document in the collection, keyed by id."""
+        pass
+
+    @abstractmethod
+    def get_collection_metadata(self) -> Dict[str, any]:
+        """Returns the metadata recorded for the collection as a whole, e.g. the embedding model it was built with."""
+        pass
+
+    @abstractmethod
+    def set_collection_metadata(self, metadata: Dict[str, any]):
+        """Replaces the metadata recorded for the collection as a whole."""
+        pass
+
+    @abstractmethod
+    def get(self, ids: List[str]) -> Dict[str, List]:
+        """Returns the 'ids', 'documents', 'metadatas' and 'embeddings' of the given documents that exist."""
+        pass
+
+    @abstractmethod
+    def iter_documents(self, page_size: int = 5000) -> Iterator[Tuple[str, str]]:
+        """Yields (id, text) for every document in the collection."""
+        pass
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> Dict[str, List[List]]:
+        """
+        Returns the `n_results` nearest documents for each query embedding, as a dictionary
+        of per-query lists under 'ids', 'documents', 'metadatas' and 'distances' (squared L2).
+        """
+        pass
+
+    @abstractmethod
+    def reset(self):
+        """Deletes every document, leaving an empty collection."""
+        pass
+
+    def flush(self):
+        """Makes all pending changes durable and visible to queries."""
+        pass
+
+    def invalidate(self):
+        """Drops any cached state, e.g. after the collection was rebuilt by another writer."""
+        pass
+
+# --- Shared ChromaDB Clients ---
+_clients_lock = threading.Lock()
+_clients: Dict[str, "chromadb.Client"] = {}
+
+def get_client(db_path: str = DB_PATH) -> "chromadb.Client":
+    """Returns the process-wide persistent ChromaDB client for `db_path`, opening it on first use."""
+    key = os.path.abspath(db_path)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                logging.info(f"Initializing ChromaDB persistent client at path: {db_path}")
+                client = chromadb.PersistentClient(path=db_path)
+                _clients[key] = client
+    return client
+
+class ChromaVectorStore(VectorStore):
+    """
+    A VectorStore backed by a ChromaDB collection. The collection handle is cached.
+
+    With `weak_client`, the store does not keep the client alive, so it can be cached for
+    as long as the caller holds the client.
+    """
+    backend = "chroma"
+
+    def __init__(self, client: "chromadb.Client", collection_name: str, weak_client: bool = False):
+        self._client = weakref.ref(client) if weak_client else lambda: client
+        self.collection_name = collection_name
+        self._collection = None
+        self._lock = threading.Lock()
+
+    def _get_collection(self, create: bool = False):
+        """Returns the cached collection handle, looking it up on first use."""
+        collection = self._collection
+        if collection is None:
+            with self._lock:
+                if self._collection is None:
+                    if create:
+                        self._collection = self.client.get_or_create_collection(name=self.collection_name)
+                    else:
+                        self._collection = self.client.get_collection(name=self.collection_name)
+                collection = self._collection
+        return collection
+
+    @property
+    def client(self) -> "chromadb.Client":
+        client = self._client()
+        if client is None:
+            raise ReferenceError(f"The ChromaDB client of collection '{self.collection_name}' no longer exists.")
+        return client
+
+    @property
+    def owner(self) -> "chromadb.Client":
+        return self.client
+
+    def invalidate(self):
+        with self._lock:
+            self._collection = None
+
+    def count(self) -> int:
+        try:
+            collection = self._get_collection()
+        except Exception:
+            # Counting must not create the collection; a missing one is empty.
+            return 0
+        return collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self._get_collection(create=True).add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self._get_collection(create=True).update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self._get_collection(create=True).delete(ids=ids)
+
+    def get_metadata(self, page_size: int = 5000) -> Dict[str, Dict[str, any]]:
+        collection = self._get_collection(create=True)
+        existing = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get('ids') or []
+            existing.update(zip(ids, page.get('metadatas') or [{} for _ in ids]))
+            if len(ids) < page_size:
+                return existing
+            offset += page_size
+
+    def get_collection_metadata(self) -> Dict[str, any]:
+        return dict(self._get_collection(create=True).metadata or {})
+
+    def set_collection_metadata(self, metadata):
+        self._get_collection(create=True).modify(metadata=metadata)
+
+    def get(self, ids):
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        result = self._get_collection().get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        return {
+            "ids": list(result["ids"]),
+            "documents": list(result["documents"]),
+            "metadatas": list(result["metadatas"]),
+            "embeddings": [list(embedding) for embedding in result["embeddings"]],
+        }
+
+    def iter_documents(self, page_size: int = 5000):
+        collection = self._get_collection(create=True)
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=page_size, offset=offset)
+            ids = page.get('ids') or []
+            yield from zip(ids, page.get('documents') or [])
+            if len(ids) < page_size:
+                return
+            offset += page_size
+
+    def query(self, query_embeddings, n_results):
+        """Runs a collection query, refreshing a stale collection handle once on failure."""
+        try:
+            collection = self._get_collection()
+            logging.info(f"Querying collection: '{self.collection_name}'")
+            return collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+        except Exception:
+            # The collection may have been deleted and recreated by a rebuild.
+            self.invalidate()
+            collection = self._get_collection()
+            return collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+
+    def reset(self):
+        with self._lock:
+            try:
+                self.client.delete_collection(name=self.collection_name)
+                logging.info(f"Successfully deleted existing collection: '{self.collection_name}'")
+            except Exception:
+                logging.info(f"Collection '{self.collection_name}' did not exist, creating new one.")
+                pass # Collection doesn't exist, so we don't need to delete it
+            self._collection = self.client.create_collection(name=self.collection_name)
+            logging.info(f"Successfully created new empty collection: '{self.collection_name}'")
+
+class NumpyVectorStore(VectorStore):
+    """
+    An in-process VectorStore that searches a memory-mapped NumPy matrix.
+
+    Each collection is a directory holding a `manifest.json`, which names the current
+    version directory and holds the collection metadata. A version directory (`v<n>`)
+    holds the embedding matrix (`vectors.f32`), the squared norm of every row
+    (`norms.f32`) and one JSON record per row with its id, metadata and text
+    (`records.jsonl`). Compact storage modes add the matrix that is scanned instead: `vectors.f16`, `vectors.i8` plus
+    per-row `scales.f32`, or product-quantized `vectors.pq` codes plus `pq_codebooks.f32`.
+    Search is a vectorized scan in blocks with `argpartition` top-k. With compact storage
+    the scan is approximate, and its best `k * rerank_factor` candidates are re-ranked
+    against the memory-mapped float32 rows, which are only read for those candidates.
+    Distances are squared L2, like ChromaDB's default space, so the configured retrieval
+    threshold applies to both backends.
+
+    Changes are staged in memory and written by `flush()` into a new version directory.
+    Replacing the manifest then switches readers to it at once, so they never see a mix of
+    two versions; readers in other processes reload when the manifest changes. The
+    previous version is kept for readers still opening it, and older ones are deleted.
+    Every flush rewrites the whole collection, so changes are best flushed in batches.
+    """
+    backend = "numpy"
+    _BLOCK_ROWS = 65536
+    # int8 rows are cast to float32 this many at a time, into a buffer that stays in cache.
+    _CAST_ROWS = 1024
+
+    STORAGE_MODES = ("float32", "float16", "int8", "pq")
+    _DATA_FILES = ("records.jsonl", "norms.f32", "vectors.f32", "vectors.f16", "vectors.i8", "scales.f32", "vectors.pq", "pq_codebooks.f32")
+
+    def __init__(self, directory: str, storage: str = VECTOR_STORAGE, rerank_factor: int = VECTOR_RERANK_FACTOR):
+        if storage not in self.STORAGE_MODES:
+            raise ValueError(f"Unsupported vector storage '{storage}'. Expected one of: {', '.join(self.STORAGE_MODES)}.")
+        self.directory = directory
+        self.storage = storage
+        self.rerank_factor = rerank_factor
+        self._configured_storage = storage
+        self._lock = threading.RLock()
+        self._manifest_version = None
+        self._load()
+
+    # --- Loading ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _data_path(self, name: str) -> str:
+        """Returns the path of a file of the loaded version."""
+        return os.path.join(self._data_dir, name)
+
+    def _load(self):
+        self._pending_ids: List[str] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_documents: List[str] = []
+        self._pending_metadatas: List[Dict[str, any]] = []
+        self._deleted: set = set()
+        self._metadata_updates: Dict[str, Dict[str, any]] = {}
+        self._pending_collection_metadata: Optional[Dict[str, any]] = None
+        self._collection_metadata: Dict[str, any] = {}
+        self._ids: List[str] = []
+        self._metadatas: List[Dict[str, any]] = []
+        self._offsets: List[int] = []
+        self._row_of: Dict[str, int] = {}
+        self._vectors = None
+        self._full_vectors = None
+        self._scales = None
+        self._codebooks = None
+        self._norms = None
+        self._generation = 0
+        self._data_dir = self.directory
+        self.dim = None
+
+        manifest_path = self._path("manifest.json")
+        if not os.path.exists(manifest_path):
+            self._manifest_version = None
+            return
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self._manifest_version = self._stat_manifest()
+        count, self.dim = manifest["count"], manifest["dim"]
+        self.storage = manifest.get("storage", self.storage)
+        self._collection_metadata = manifest.get("metadata", {})
+        # Stores written before versioning keep their files next to the manifest.
+        if "generation" in manifest:
+            self._generation = manifest["generation"]
+            self._data_dir = self._path(f"v{self._generation}")
+        if count == 0:
+            return
+
+        with open(self._data_path("records.jsonl"), "rb") as f:
+            offset = 0
+            for line in f:
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._metadatas.append(record["metadata"])
+                self._offsets.append(offset)
+                offset += len(line)
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        # Stores written before compact modes kept float32 rows have only the int8 codes.
+        if os.path.exists(self._data_path("vectors.f32")):
+            self._full_vectors = np.memmap(self._data_path("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+        if self.storage == "float16":
+            # Copy-on-write (never written) so PyTorch can wrap the rows without a copy.
+            self._vectors = np.memmap(self._data_path("vectors.f16"), dtype=np.float16, mode="c", shape=(count, self.dim))
+        elif self.storage == "int8":
+            self._vectors = np.memmap(self._data_path("vectors.i8"), dtype=np.int8, mode="r", shape=(count, self.dim))
+            self._scales = np.fromfile(self._data_path("scales.f32"), dtype=np.float32)
+        elif self.storage == "pq":
+            self._codebooks = np.fromfile(self._data_path("pq_codebooks.f32"), dtype=np.float32).reshape(manifest["pq_shape"])
+            self._vectors = np.memmap(self._data_path("vectors.pq"), dtype=np.uint8, mode="r", shape=(count, len(self._codebooks)))
+        else:
+            self._vectors = self._full_vectors
+        self._norms = np.fromfile(self._data_path("norms.f32"), dtype=np.float32)
+        logging.info(f"Loaded NumPy vector store '{self.directory}' with {count} vectors ({self.storage}).")
+
+    def _stat_manifest(self):
+        """Identifies the current manifest; `os.replace` gives every flush a new inode."""
+        try:
+            stat = os.stat(self._path("manifest.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _reload_if_changed(self):
+        """Reloads the persisted files if another writer has flushed since they were loaded."""
+        if self._stat_manifest() != self._manifest_version and not self._has_pending_changes():
+            self._load()
+
+    def _has_pending_changes(self) -> bool:
+        return bool(self._pending_ids or self._deleted or self._metadata_updates or self._pending_collection_metadata is not None)
+
+    def invalidate(self):
+        with self._lock:
+            self._reload_if_changed()
+
+    # --- Mutations ---
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._ids) - len(self._deleted) + len(self._pending_ids)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        with self._lock:
+            self._pending_ids.extend(ids)
+            self._pending_vectors.append(np.asarray(embeddings, dtype=np.float32))
+            self._pending_documents.extend(documents)
+            self._pending_metadatas.extend(metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                self._metadata_updates[doc_id] = metadata
+
+    def delete(self, ids):
+        with self._lock:
+            self._deleted.update(doc_id for doc_id in ids if doc_id in self._row_of)
+
+    def get_metadata(self) -> Dict[str, Dict[str, any]]:
+        with self._lock:
+            metadata = {
+                doc_id: self._metadata_updates.get(doc_id, meta)
+                for doc_id, meta in zip(self._ids, self._metadatas)
+                if doc_id not in self._deleted
+            }
+            metadata.update(zip(self._pending_ids, self._pending_metadatas))
+            return metadata
+
+    def get_collection_metadata(self) -> Dict[str, any]:
+        with self._lock:
+            if self._pending_collection_metadata is not None:
+                return dict(self._pending_collection_metadata)
+            return dict(self._collection_metadata)
+
+    def set_collection_metadata(self, metadata):
+        with self._lock:
+            self._pending_collection_metadata = dict(metadata)
+
+    def reset(self):
+        with self._lock:
+            if os.path.isdir(self.directory):
+                shutil.rmtree(self.directory)
+            self.storage = self._configured_storage
+            self._load()
+
+    def flush(self):
+        """Writes a new version of the collection with all staged changes, switches to it and reloads it."""
+        with self._lock:
+            if not self._has_pending_changes() and self._manifest_version is not None:
+                return
+            generation = self._generation + 1
+            version_dir = self._path(f"v{generation}")
+            # A flush that was interrupted may have left a partial version behind.
+            shutil.rmtree(version_dir, ignore_errors=True)
+            os.makedirs(version_dir)
+            keep_rows = [row for row, doc_id in enumerate(self._ids) if doc_id not in self._deleted]
+
+            vector_blocks = []
+            if keep_rows:
+                vector_blocks.append(self._read_rows(np.asarray(keep_rows)))
+            vector_blocks.extend(self._pending_vectors)
+            dim = self.dim or (vector_blocks[0].shape[1] if vector_blocks else 0)
+            vectors = np.concatenate(vector_blocks) if vector_blocks else np.empty((0, dim), dtype=np.float32)
+
+            with open(os.path.join(version_dir, "records.jsonl"), "wb") as out:
+                if keep_rows:
+                    with open(self._data_path("records.jsonl"), "rb") as src:
+                        for row in keep_rows:
+                            record = _read_record(src, self._offsets[row])
+                            record["metadata"] = self._metadata_updates.get(record["id"], record["metadata"])
+                            out.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                for doc_id, document, metadata in zip(self._pending_ids, self._pending_documents, self._pending_metadatas):
+                    record = {"id": doc_id, "metadata": metadata, "document": document}
+                    out.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+            manifest = {
+                "generation": generation, "count": len(vectors), "dim": dim, "storage": self.storage,
+                "metadata": self.get_collection_metadata()
+            }
+            arrays = {"norms.f32": np.einsum("ij,ij->i", vectors, vectors).astype(np.float32), "vectors.f32": vectors}
+            if self.storage == "float16":
+                arrays["vectors.f16"] = vectors.astype(np.float16)
+            elif self.storage == "int8":
+                arrays["vectors.i8"], arrays["scales.f32"] = quantize_int8(vectors)
+            elif self.storage == "pq" and len(vectors):
+                codebooks = train_pq(vectors)
+                arrays["vectors.pq"], arrays["pq_codebooks.f32"] = encode_pq(vectors, codebooks), codebooks
+                manifest["pq_shape"] = list(codebooks.shape)
+            for name, array in arrays.items():
+                np.ascontiguousarray(array).tofile(os.path.join(version_dir, name))
+
+            # The only step readers can observe: the manifest now names the new version.
+            with open(self._path("manifest.json.tmp"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(self._path("manifest.json.tmp"), self._path("manifest.json"))
+            self._remove_old_versions(keep={f"v{generation}", f"v{self._generation}"}, keep_unversioned=self._generation == 0)
+            self._load()
+
+    def _remove_old_versions(self, keep: set, keep_unversioned: bool):
+        """Deletes version directories not in `keep`, and the files of an unversioned store unless kept."""
+        for entry in os.listdir(self.directory):
+            path = self._path(entry)
+            if re.fullmatch(r"v\d+", entry) and entry not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif not keep_unversioned and entry in self._DATA_FILES:
+                os.remove(path)
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Returns the stored rows as float32 (dequantized for old int8 stores without float32 rows)."""
+        if self._full_vectors is None:
+            return self._vectors[rows].astype(np.float32) * self._scales[rows, None]
+        return np.asarray(self._full_vectors[rows], dtype=np.float32)
+
+    def get(self, ids):
+        with self._lock:
+            self._reload_if_changed()
+            rows = [self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of and doc_id not in self._deleted]
+            result = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            if not rows:
+                return result
+            embeddings = self._read_rows(np.asarray(rows))
+            with open(self._data_path("records.jsonl"), "rb") as f:
+                for row, embedding in zip(rows, embeddings):
+                    record = _read_record(f, self._offsets[row])
+                    result["ids"].append(record["id"])
+                    result["documents"].append(record["document"])
+                    result["metadatas"].append(self._metadata_updates.get(record["id"], record["metadata"]))
+                    result["embeddings"].append(embedding.tolist())
+            return result
+
+    def iter_documents(self, page_size: int = 5000):
+        # Open the records under the lock, then stream them without holding it;
+        # a concurrent flush replaces the file, so this handle keeps reading the old one.
+        with self._lock:
+            self._reload_if_changed()
+            if not self._ids:
+                return
+            deleted = set(self._deleted)
+            f = open(self._data_path("records.jsonl"), "rb")
+        with f:
+            for line in f:
+                record = json.loads(line)
+                if record["id"] not in deleted:
+                    yield record["id"], record["document"]
+
+    # --- Search ---
+
+    def query(self, query_embeddings, n_results):
+        # Take the loaded state and open the records under the lock, then search without
+        # holding it; a concurrent flush replaces the files, so the memory maps and this
+        # handle keep reading the old ones.
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            self._reload_if_changed()
+            if self._vectors is None or n_results <= 0:
+                for key in results:
+                    results[key] = [[] for _ in queries]
+                return results
+            state = _SearchState(self)
+            f = open(self._data_path("records.jsonl"), "rb")
+
+        with f:
+            rows, distances = self._top_k(state, queries, n_results)
+            for query_rows, query_distances in zip(rows, distances):
+                records = [_read_record(f, state.offsets[row]) for row in query_rows]
+                results["ids"].append([record["id"] for record in records])
+                results["documents"].append([record["document"] for record in records])
+                results["metadatas"].append([
+                    state.metadata_updates.get(record["id"], record["metadata"]) for record in records
+                ])
+                results["distances"].append([float(d) for d in query_distances])
+        return results
+
+    def _prepare_queries(self, state: "_SearchState", queries: np.ndarray):
+        """Returns what the scan of each block needs besides the float32 queries, computed once per search."""
+        if state.storage == "pq":
+            return pq_distance_tables(queries, state.codebooks)
+        if state.storage == "float16":
+            return torch.from_numpy(queries.astype(np.float16))
+        if state.storage == "int8":
+            return np.empty((min(self._CAST_ROWS, len(state.ids)), queries.shape[1]), dtype=np.float32)
+        return None
+
+    def _block_distances(self, state: "_SearchState", queries: np.ndarray, query_norms: np.ndarray, prepared, start: int, end: int) -> np.ndarray:
+        """Returns the (approximate, for compact storage) squared L2 distances of `queries` to rows [start, end)."""
+        block = state.vectors[start:end]
+        if state.storage == "pq":
+            # Asymmetric distance: sum the query's distance to each code's centroid.
+            return prepared[:, np.arange(block.shape[1]), block].sum(axis=2)
+        if state.storage == "float16":
+            # NumPy has no fast float16 kernels (casting the block costs ten times the scan
+            # itself), so float16 rows are scored natively by PyTorch, without a copy.
+            scores = (prepared @ torch.from_numpy(block).T).float().numpy()
+        elif state.storage == "int8":
+            # Cast a few rows at a time into the reused buffer instead of the whole block,
+            # then apply the per-row scales to the scores.
+            scores = np.empty((len(queries), end - start), dtype=np.float32)
+            for offset in range(0, end - start, self._CAST_ROWS):
+                rows = block[offset:offset + self._CAST_ROWS]
+                buffer = prepared[:len(rows)]
+                np.copyto(buffer, rows)
+                np.matmul(queries, buffer.T, out=scores[:, offset:offset + len(rows)])
+            scores *= state.scales[start:end]
+        else:
+            scores = queries @ block.T
+        return query_norms + state.norms[start:end] - 2.0 * scores
+
+    def _reranks(self, state: "_SearchState") -> bool:
+        return state.storage != "float32" and state.full_vectors is not None and self.rerank_factor > 0
+
+    def _top_k(self, state: "_SearchState", queries: np.ndarray, k: int):
+        """Returns the row indices and squared L2 distances of the k nearest live rows per query."""
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        prepared = self._prepare_queries(state, queries)
+        rerank = self._reranks(state)
+        scan_k = k * self.rerank_factor if rerank else k
+        deleted_rows = np.asarray([state.row_of[doc_id] for doc_id in state.deleted], dtype=np.int64)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, len(state.ids), self._BLOCK_ROWS):
+            end = min(start + self._BLOCK_ROWS, len(state.ids))
+            distances = self._block_distances(state, queries, query_norms, prepared, start, end)
+            if len(deleted_rows):
+                in_block = deleted_rows[(deleted_rows >= start) & (deleted_rows < end)]
+                distances[:, in_block - start] = np.inf
+            block_k = min(scan_k, end - start)
+            candidates = np.argpartition(distances, block_k - 1, axis=1)[:, :block_k]
+            best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+            best_distances = np.concatenate([best_distances, np.take_along_axis(distances, candidates, axis=1)], axis=1)
+            if best_rows.shape[1] > scan_k:
+                keep = np.argpartition(best_distances, scan_k - 1, axis=1)[:, :scan_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+
+        rows, distances = [], []
+        for query, query_norm, query_rows, query_distances in zip(queries, query_norms[:, 0], best_rows, best_distances):
+            live = np.isfinite(query_distances)
+            query_rows, query_distances = query_rows[live], query_distances[live]
+            if rerank and len(query_rows):
+                full = np.asarray(state.full_vectors[query_rows], dtype=np.float32)
+                query_distances = query_norm + state.norms[query_rows] - 2.0 * (full @ query)
+            order = np.argsort(query_distances, kind="stable")[:k]
+            rows.append(query_rows[order].tolist())
+            distances.append(np.maximum(query_distances[order], 0.0).tolist())
+        return rows, distances
+
+    def storage_stats(self) -> Dict[str, float]:
+        """
+        Returns the size of the stored vectors.
+
+        `scanned_bytes_per_vector` is what every query reads for each row, and so what has
+        to stay in memory for fast search; `fixed_bytes` is per-collection data read by
+        every query (PQ codebooks); `disk_bytes_per_vector` adds the float32 rows kept for
+        re-ranking.
+        """
+        with self._lock:
+            count = len(self._ids)
+            if not count:
+                return {"count": 0, "scanned_bytes_per_vector": 0.0, "fixed_bytes": 0, "disk_bytes_per_vector": 0.0}
+            # PQ distances come from the codes alone; the norms are only read for re-ranking.
+            scanned = self._vectors.nbytes + (self._norms.nbytes if self.storage != "pq" else 0)
+            scanned += self._scales.nbytes if self._scales is not None else 0
+            fixed = self._codebooks.nbytes if self._codebooks is not None else 0
+            disk = self._vectors.nbytes + self._norms.nbytes + (self._scales.nbytes if self._scales is not None else 0)
+            disk += self._full_vectors.nbytes if self._full_vectors is not None and self.storage != "float32" else 0
+            return {"count": count, "scanned_bytes_per_vector": scanned / count, "fixed_bytes": fixed, "disk_bytes_per_vector": disk / count}
+
+class _SearchState:
+    """The loaded files and staged changes of a NumpyVectorStore that one query reads."""
+    def __init__(self, store: NumpyVectorStore):
+        self.storage = store.storage
+        self.ids = store._ids
+        self.row_of = store._row_of
+        self.offsets = store._offsets
+        self.vectors = store._vectors
+        self.full_vectors = store._full_vectors
+        self.norms = store._norms
+        self.scales = store._scales
+        self.codebooks = store._codebooks
+        # Loading replaces the attributes above; these two are changed in place.
+        self.deleted = set(store._deleted)
+        self.metadata_updates = dict(store._metadata_updates)
+
+def _read_record(f, offset: int) -> Dict[str, any]:
+    f.seek(offset)
+    return json.loads(f.readline())
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization. Returns the codes and the per-row scales."""
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.empty(0, dtype=np.float32)
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+def _pq_subvectors(dim: int, requested: int) -> int:
+    """Returns the largest number of subvectors, at most `requested`, that divides `dim`."""
+    return max(m for m in range(1, min(dim, requested) + 1) if dim % m == 0)
+
+def train_pq(vectors: np.ndarray, subvectors: int = PQ_SUBVECTORS, samples: int = PQ_TRAIN_SAMPLES, iterations: int = PQ_TRAIN_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Learns product quantization codebooks with k-means on a sample of `vectors`.
+
+    Returns:
+        A float32 array of shape (subvectors, centroids, dim // subvectors), with up to
+        256 centroids per subvector so codes fit in one byte.
+    """
+    rng = np.random.default_rng(seed)
+    m = _pq_subvectors(vectors.shape[1], subvectors)
+    sample = vectors[rng.choice(len(vectors), size=min(samples, len(vectors)), replace=False)]
+    centroids = min(256, len(sample))
+    parts = sample.reshape(len(sample), m, -1)
+    codebooks = np.empty((m, centroids, parts.shape[2]), dtype=np.float32)
+    for i in range(m):
+        points = parts[:, i, :]
+        codebook = points[rng.choice(len(points), size=centroids, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _nearest_centroids(points, codebook)
+            counts = np.bincount(assignment, minlength=centroids)
+            sums = np.stack([np.bincount(assignment, weights=points[:, d], minlength=centroids) for d in range(points.shape[1])], axis=1)
+            filled = counts > 0 # Empty clusters keep their previous centroid.
+            codebook[filled] = sums[filled] / counts[filled, None]
+        codebooks[i] = codebook
+    return codebooks
+
+def _nearest_centroids(points: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    distances = (codebook ** 2).sum(axis=1)[None, :] - 2.0 * points @ codebook.T
+    return distances.argmin(axis=1)
+
+def encode_pq(vectors: np.ndarray, codebooks: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+    """Returns the uint8 code of every subvector of `vectors`: the index of its nearest centroid."""
+    m = len(codebooks)
+    codes = np.empty((len(vectors), m), dtype=np.uint8)
+    for start in range(0, len(vectors), block_rows):
+        parts = vectors[start:start + block_rows].reshape(-1, m, codebooks.shape[2])
+        for i in range(m):
+            codes[start:start + block_rows, i] = _nearest_centroids(parts[:, i, :], codebooks[i])
+    return codes
+
+def pq_distance_tables(queries: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """Returns the squared distance of each query subvector to each centroid, shaped (queries, subvectors, centroids)."""
+    parts = queries.reshape(len(queries), len(codebooks), -1)
+    return ((parts[:, :, None, :] - codebooks[None, :, :, :]) ** 2).sum(axis=3)
+
+def open_vector_store(
+    collection_name: str,
+    db_path: Optional[str] = None,
+    client: Optional["chromadb.Client"] = None,
+    backend: str = VECTOR_BACKEND
+) -> VectorStore:
+    """
+    Factory function to open a collection in the configured vector backend.
+
+    Args:
+        collection_name: The name of the collection.
+        db_path: Path for the persistent database. If None, a ChromaDB client must be provided.
+        client: An optional chromadb.Client instance. Implies the 'chroma' backend.
+        backend: 'chroma' or 'numpy'.
+    """
+    if client is not None:
+        return ChromaVectorStore(client, collection_name)
+    if not db_path:
+        raise ValueError("Either a 'db_path' or a 'client' instance must be provided.")
+    if backend == "chroma":
+        return ChromaVectorStore(get_client(db_path), collection_name)
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(db_path, "numpy", collection_name))
+    raise ValueError(f"Unknown vector backend '{backend}'. Expected 'chroma' or 'numpy'.")
@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import patch
+from src.answer_cache import SemanticAnswerCache, replay_stream
+
+class TestSemanticAnswerCache(unittest.TestCase):
+
+    def setUp(self):
+        """Use an in-memory SQLite database for each test."""
+        self.cache = SemanticAnswerCache(path=":memory:", threshold=0.9, max_entries=2)
+
+    def test_returns_answer_for_similar_query(self):
+        """Test that a similar embedding with the same sources and language is a hit."""
+        self.cache.store([1.0, 0.0, 0.0], ["FAQ-1", "FAQ-2"], "English", "The flu is an illness.")
+
+        answer = self.cache.lookup([0.98, 0.05, 0.0], ["FAQ-2", "FAQ-1"], "English")
+
+        self.assertEqual(answer, "The flu is an illness.")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_misses_on_dissimilar_query_sources_or_language(self):
+        """Test that the sources, language and similarity threshold all have to match."""
+        self.cache.store([1.0, 0.0, 0.0], ["FAQ-1"], "English", "The flu is an illness.")
+
+        self.assertIsNone(self.cache.lookup([0.0, 1.0, 0.0], ["FAQ-1"], "English"))
+        self.assertIsNone(self.cache.lookup([1.0, 0.0, 0.0], ["FAQ-3"], "English"))
+        self.assertIsNone(self.cache.lookup([1.0, 0.0, 0.0], ["FAQ-1"], "Spanish"))
+        self.assertEqual(self.cache.stats()["misses"], 3)
+
+    def test_evicts_least_recently_used_entries(self):
+        """Test that the cache never holds more than max_entries answers."""
+        with patch('src.answer_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]):
+            self.cache.store([1.0, 0.0], ["FAQ-1"], "English", "first")
+            self.cache.store([0.0, 1.0], ["FAQ-2"], "English", "second")
+            self.assertEqual(self.cache.lookup([1.0, 0.0], ["FAQ-1"], "English"), "first")
+            self.cache.store([1.0, 1.0], ["FAQ-3"], "English", "third")
+
+        self.assertEqual(self.cache.stats()["size"], 2)
+        self.assertIsNone(self.cache.lookup([0.0, 1.0], ["FAQ-2"], "English"))
+
+    def test_replay_stream_reconstructs_answer(self):
+        """Test that replaying a cached answer yields the original text."""
+        answer = "The flu is a contagious respiratory illness caused by influenza viruses. [FAQ-1]"
+        chunks = list(replay_stream(answer))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), answer)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,16 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from src.answer_generator import generate_answer
+from src.answer_generator import (
+    _rewrite_prompt,
+    generate_answer,
+    generate_answer_stream,
+    get_rewrite_stats,
+    needs_rewrite,
+    rewrite_and_retrieve
+)
+from src.answer_cache import SemanticAnswerCache
+from src.config import PROMPT_HISTORY_TOKEN_BUDGET
+from src.prompt_builder import estimate_tokens
 
 class TestAnswerGenerator(unittest.TestCase):
 
@@ -70,5 +80,101 @@ class TestAnswerGenerator(unittest.TestCase):
         self.assertIn("assistant: Diabetes is a chronic disease.", prompt)
         self.assertIn("Question: What are the risk factors?", prompt)
 
+    @patch('src.answer_generator.embed_query', return_value=[1.0, 0.0])
+    @patch('src.answer_generator.get_answer_cache')
+    @patch('src.answer_generator.llm')
+    def test_answer_cache_replays_stream(self, mock_llm, mock_get_cache, mock_embed_query):
+        """Test that a cached answer is replayed through the stream without calling the LLM."""
+        mock_get_cache.return_value = SemanticAnswerCache(path=":memory:")
+        mock_llm.generate_stream.return_value = iter(["The flu is ", "an illness. [FAQ-1]"])
+        context = [{"text": "The flu is a contagious respiratory illness.", "metadata": {"source_id": "FAQ-1"}}]
+
+        first = "".join(generate_answer_stream("What is the flu?", context, cache_query="What is the flu?"))
+        second = "".join(generate_answer_stream("what's the flu", context, cache_query="What is the flu?"))
+
+        self.assertEqual(first, "The flu is an illness. [FAQ-1]")
+        self.assertEqual(second, first)
+        mock_llm.generate_stream.assert_called_once()
+
+    def test_needs_rewrite_heuristics(self):
+        """Test that standalone questions skip the rewrite and follow-ups do not."""
+        history = [{"role": "user", "content": "Tell me about diabetes."}]
+        self.assertFalse(needs_rewrite("What are the symptoms of diabetes?", []))
+        self.assertFalse(needs_rewrite("What are the symptoms of the flu?", history))
+        self.assertFalse(needs_rewrite("¿Cuáles son los síntomas de la gripe?", history))
+        self.assertTrue(needs_rewrite("Is it hereditary?", history))
+        self.assertTrue(needs_rewrite("What about children with type 1?", history))
+        self.assertTrue(needs_rewrite("Treatment?", history))
+
+    def test_rewrite_prompt_history_fits_the_budget(self):
+        """Test that the rewrite prompt formats a long history within the history token budget."""
+        history = [{"role": "user", "content": f"Message {i}. " + "word " * 200} for i in range(50)]
+
+        prompt = _rewrite_prompt("Is it hereditary?", history)
+
+        self.assertIn("Message 49.", prompt)
+        self.assertLess(estimate_tokens(prompt), 2 * PROMPT_HISTORY_TOKEN_BUDGET)
+
+    @patch('src.answer_generator.REWRITE_MODE', "speculative")
+    @patch('src.answer_generator.embed_query', side_effect=lambda text: [1.0, 0.0] if "it" in text.split() else [0.0, 1.0])
+    @patch('src.answer_generator.llm')
+    def test_rewrite_and_retrieve_reuses_speculative_results(self, mock_llm, mock_embed_query):
+        """Test that retrieval is only repeated when the rewrite changed the query."""
+        history = [{"role": "user", "content": "Tell me about diabetes."}]
+        retrieved = []
+        def retrieve(text):
+            retrieved.append(text)
+            return [{"text": text, "metadata": {"source_id": "FAQ-1"}}]
+        before = get_rewrite_stats()
+
+        self.assertEqual(rewrite_and_retrieve("What causes the flu?", history, retrieve)[0], "What causes the flu?")
+        mock_llm.generate.assert_not_called()
+
+        mock_llm.generate.return_value = "Is diabetes hereditary?"
+        rewritten, context = rewrite_and_retrieve("Is it hereditary?", history, retrieve)
+        self.assertEqual(rewritten, "Is diabetes hereditary?")
+        self.assertEqual(context[0]["text"], "Is diabetes hereditary?")
+
+        mock_llm.generate.return_value = "is it hereditary?"
+        rewrite_and_retrieve("Is it hereditary?", history, retrieve)
+
+        self.assertEqual(retrieved, ["What causes the flu?", "Is it hereditary?", "Is diabetes hereditary?", "Is it hereditary?"])
+        after = get_rewrite_stats()
+        self.assertEqual(after["skipped"] - before["skipped"], 1)
+        self.assertEqual(after["rewritten"] - before["rewritten"], 2)
+        self.assertEqual(after["speculative_hits"] - before["speculative_hits"], 1)
+        self.assertEqual(after["re_retrieved"] - before["re_retrieved"], 1)
+
+    @patch('src.answer_generator.REWRITE_MODE', "speculative")
+    @patch('src.answer_generator.embed_query')
+    @patch('src.answer_generator.llm')
+    def test_rewrite_with_the_same_meaning_reuses_speculative_results(self, mock_llm, mock_embed_query):
+        """Test that a rewrite that differs in text but not in meaning or sources is not retrieved again."""
+        history = [{"role": "user", "content": "Tell me about diabetes."}]
+        retrieved = []
+        def retrieve(text):
+            retrieved.append(text)
+            return [{"text": text, "metadata": {"source_id": "FAQ-1"}}]
+        mock_llm.generate.return_value = "Is diabetes hereditary?"
+
+        # Close embeddings: the speculative results are kept without a probe.
+        mock_embed_query.side_effect = lambda text: [1.0, 0.1] if "it" in text.split() else [1.0, 0.0]
+        rewritten, context = rewrite_and_retrieve("Is it hereditary?", history, retrieve)
+        self.assertEqual(rewritten, "Is diabetes hereditary?")
+        self.assertEqual(context[0]["text"], "Is it hereditary?")
+
+        # Distant embeddings, but a vector-only search for the rewrite finds the same sources.
+        mock_embed_query.side_effect = lambda text: [1.0, 0.0] if "it" in text.split() else [0.0, 1.0]
+        probe = MagicMock(return_value=["FAQ-1"])
+        rewrite_and_retrieve("Is it hereditary?", history, retrieve, probe=probe)
+        probe.assert_called_once_with("Is diabetes hereditary?")
+
+        # Different sources: the rewrite is retrieved.
+        probe.return_value = ["FAQ-2"]
+        rewritten, context = rewrite_and_retrieve("Is it hereditary?", history, retrieve, probe=probe)
+        self.assertEqual(context[0]["text"], "Is diabetes hereditary?")
+
+        self.assertEqual(retrieved, ["Is it hereditary?", "Is it hereditary?", "Is it hereditary?", "Is diabetes hereditary?"])
+
 if __name__ == '__main__':
     unittest.main()
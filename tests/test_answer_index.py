@@ -0,0 +1,91 @@
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src import retriever as retriever_module
+from src.answer_index import find_canonical_answer, get_fast_path_stats
+from src.build_vector_store import build_answer_index
+from src.config import EMBEDDING_MODEL_NAME
+from src.pipeline import answer_question
+
+FAQS = [
+    {"Question": "What is the flu?", "Answer": "The flu is a contagious respiratory illness.", "source_id": "FAQ-1"},
+    {"Question": "How is high blood pressure treated?", "Answer": "With lifestyle changes and medication.", "source_id": "FAQ-2"},
+]
+
+class BagOfWordsEncoder:
+    """A deterministic stand-in for the embedding model: similar wording gives similar vectors."""
+    def _vector(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.casefold().strip("?¿!. ").split():
+            vector[sum(map(ord, word)) % 64] += 1.0
+        return vector
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts])
+
+@patch('src.embedding_cache.get_embedding_cache', return_value=None)
+@patch('src.build_vector_store.detect_language', return_value="English")
+@patch.dict(retriever_module._retrievers, clear=True)
+@patch.dict(retriever_module._embedding_models, {EMBEDDING_MODEL_NAME: BagOfWordsEncoder()})
+class TestAnswerIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        retriever_module.clear_caches()
+
+    def tearDown(self):
+        retriever_module.clear_caches()
+        self.temp_dir.cleanup()
+
+    def _build(self):
+        build_answer_index(FAQS, db_path=self.temp_dir.name, backend="numpy")
+
+    def _find(self, query, history=[], language="English"):
+        return find_canonical_answer(query, history, language=language, db_path=self.temp_dir.name, backend="numpy")
+
+    def test_matching_question_returns_curated_answer(self, *mocks):
+        """Test that a canonical question is answered with its curated, cited answer."""
+        self._build()
+        before = get_fast_path_stats()
+
+        match = self._find("what is the flu")
+
+        self.assertEqual(match["answer"], "The flu is a contagious respiratory illness. [FAQ-1]")
+        self.assertEqual((match["source_id"], match["question"]), ("FAQ-1", "What is the flu?"))
+        self.assertGreater(match["similarity"], 0.99)
+        self.assertEqual(get_fast_path_stats()["hits"], before["hits"] + 1)
+
+    def test_misses_fall_through(self, *mocks):
+        """Test that dissimilar questions, other languages and follow-ups are not answered from the index."""
+        self._build()
+        before = get_fast_path_stats()
+
+        self.assertIsNone(self._find("Can children get migraines from screens?"))
+        self.assertIsNone(self._find("What is the flu?", language="Spanish"))
+        self.assertIsNone(self._find("Is it contagious?", history=[{"role": "user", "content": "What is the flu?"}]))
+
+        stats = get_fast_path_stats()
+        self.assertEqual(stats["lookups"], before["lookups"] + 3)
+        self.assertEqual(stats["below_threshold"], before["below_threshold"] + 1)
+        self.assertEqual(stats["language_mismatches"], before["language_mismatches"] + 1)
+        self.assertEqual(stats["follow_ups"], before["follow_ups"] + 1)
+
+    @patch('src.answer_generator.llm')
+    def test_pipeline_skips_rewrite_and_generation(self, mock_llm, *mocks):
+        """Test that a fast-path hit never calls the language model."""
+        self._build()
+
+        result = asyncio.run(answer_question("What is the flu?", [], db_path=self.temp_dir.name, backend="numpy"))
+
+        self.assertEqual(result["answer"], "The flu is a contagious respiratory illness. [FAQ-1]")
+        self.assertEqual(result["context"][0]["metadata"]["source_id"], "FAQ-1")
+        mock_llm.agenerate.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from src import retriever
+from src.batching import MicroBatcher
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_coalesces_concurrent_requests(self):
+        """Test that requests queued while a batch runs are processed together and routed back in order."""
+        started, release = threading.Event(), threading.Event()
+        batches = []
+
+        def process(items):
+            batches.append(list(items))
+            started.set()
+            if len(batches) == 1:
+                release.wait(timeout=5)
+            return [item * 10 for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=8, max_wait=0.05)
+        first = batcher.submit(0)
+        started.wait(timeout=5)
+        # These arrive while the first batch is still being processed.
+        futures = [batcher.submit(i) for i in range(1, 6)]
+        release.set()
+
+        self.assertEqual(first.result(timeout=5), 0)
+        self.assertEqual([future.result(timeout=5) for future in futures], [10, 20, 30, 40, 50])
+        self.assertEqual(batches, [[0], [1, 2, 3, 4, 5]])
+        stats = batcher.stats()
+        self.assertEqual((stats["batches"], stats["items"], stats["max_batch_size"]), (2, 6, 5))
+        self.assertEqual(stats["mean_batch_size"], 3.0)
+
+    def test_respects_max_batch_size(self):
+        """Test that a backlog is split into batches of at most max_batch_size."""
+        release = threading.Event()
+        sizes = []
+
+        def process(items):
+            sizes.append(len(items))
+            release.wait(timeout=5)
+            return items
+
+        batcher = MicroBatcher(process, max_batch_size=2, max_wait=0.0)
+        futures = [batcher.submit(i) for i in range(5)]
+        release.set()
+        self.assertEqual([future.result(timeout=5) for future in futures], list(range(5)))
+        self.assertTrue(all(size <= 2 for size in sizes))
+        self.assertEqual(sum(sizes), 5)
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        """Test that a failed batch raises in each waiting caller and the worker keeps serving."""
+        calls = []
+
+        def process(items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError("encoder failed")
+            return items
+
+        batcher = MicroBatcher(process)
+        with self.assertRaises(RuntimeError):
+            batcher.run("a")
+        self.assertEqual(batcher.run("b"), "b")
+
+    @patch('src.retriever.get_embedding_model')
+    def test_embed_query_batches_through_the_model(self, mock_get_model):
+        """Test that the retriever's batcher encodes several queries with one model call."""
+        model = MagicMock()
+        model.encode.return_value = np.array([[0.1, 0.2], [0.3, 0.4]])
+        mock_get_model.return_value = model
+
+        self.assertEqual(retriever._encode_queries("test-model", ["a", "b"]), [[0.1, 0.2], [0.3, 0.4]])
+        model.encode.assert_called_once_with(["a", "b"], batch_size=2)
+
+if __name__ == '__main__':
+    unittest.main()
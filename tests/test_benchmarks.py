@@ -0,0 +1,30 @@
+import unittest
+
+from benchmarks.harness import compare_reports, measure_concurrent, summarize
+
+class TestBenchmarkHarness(unittest.TestCase):
+
+    def test_summarize_percentiles_and_throughput(self):
+        """Test that latency percentiles are reported in milliseconds."""
+        summary = summarize([i / 1000.0 for i in range(1, 101)], operations=100, wall_seconds=2.0)
+        self.assertAlmostEqual(summary["p50_ms"], 51.0)
+        self.assertAlmostEqual(summary["p95_ms"], 96.0)
+        self.assertAlmostEqual(summary["p99_ms"], 100.0)
+        self.assertAlmostEqual(summary["throughput_per_sec"], 50.0)
+
+    def test_measure_concurrent_runs_every_operation(self):
+        """Test that concurrent runs complete the requested number of operations."""
+        async def operation(i):
+            return i
+        self.assertEqual(measure_concurrent(operation, concurrency=4, total=10)["n"], 10)
+
+    def test_compare_reports_flags_p95_regressions(self):
+        """Test that only nested measurements slower than the tolerance are reported."""
+        baseline = {"results": {"vector_query": {"numpy": {"1000": summarize([0.010])}}, "prompt_build": summarize([0.001])}}
+        current = {"results": {"vector_query": {"numpy": {"1000": summarize([0.020])}}, "prompt_build": summarize([0.00105])}}
+        regressions = compare_reports(baseline, current)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("vector_query/numpy/1000"))
+
+if __name__ == '__main__':
+    unittest.main()
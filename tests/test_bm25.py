@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.bm25 import (
+    BM25Index,
+    get_bm25_index,
+    publish_bm25_index,
+    reciprocal_rank_fusion,
+    tokenize
+)
+
+class TestBM25(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [
+            ("doc-flu", "The flu is a contagious respiratory illness caused by influenza viruses."),
+            ("doc-ibuprofen", "Ibuprofen is a nonsteroidal anti-inflammatory drug used for pain."),
+            ("doc-fiebre", "La fiebre es un síntoma común de la gripe."),
+        ]
+        self.index = BM25Index.build(self.documents)
+
+    def test_tokenize_is_case_insensitive_and_unicode_aware(self):
+        """Test that tokens are case-folded words, including accented characters."""
+        self.assertEqual(tokenize("Síntoma, FIEBRE!"), ["síntoma", "fiebre"])
+
+    def test_search_ranks_exact_term_matches(self):
+        """Test that a rare exact term finds its document and unknown terms find nothing."""
+        results = self.index.search("ibuprofen dosage", n_results=3)
+        self.assertEqual(results[0][0], "doc-ibuprofen")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self.index.search("paracetamol", n_results=3), [])
+
+    def test_save_and_load_round_trip(self):
+        """Test that a saved index loads with identical search results."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "test.bm25")
+            self.index.save(path)
+            loaded = BM25Index.load(path)
+            self.assertEqual(len(loaded), 3)
+            self.assertEqual(loaded.search("la gripe", 3), self.index.search("la gripe", 3))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_registry_reloads_published_index(self):
+        """Test that a published index is found on disk and reloaded after it changes."""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            store = MagicMock(backend="numpy")
+            self.assertIsNone(get_bm25_index("test_registry", store, tmp_dir))
+            publish_bm25_index(self.index, "test_registry", store, tmp_dir)
+            self.assertEqual(len(get_bm25_index("test_registry", store, tmp_dir)), 3)
+
+            publish_bm25_index(BM25Index.build(self.documents[:1]), "test_registry", store, tmp_dir)
+            self.assertEqual(len(get_bm25_index("test_registry", store, tmp_dir)), 1)
+            # Another backend's collection of the same name has its own index.
+            self.assertIsNone(get_bm25_index("test_registry", MagicMock(backend="chroma"), tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_in_memory_indexes_are_kept_per_store(self):
+        """Test that in-memory stores with the same collection name do not share an index."""
+        first, second = MagicMock(), MagicMock()
+        publish_bm25_index(self.index, "test_memory", first)
+
+        self.assertEqual(len(get_bm25_index("test_memory", first)), 3)
+        self.assertIsNone(get_bm25_index("test_memory", second))
+
+    def test_reciprocal_rank_fusion(self):
+        """Test that documents ranked well by both rankings come first."""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        self.assertEqual([doc_id for doc_id, _ in fused], ["b", "a", "d", "c"])
+
+if __name__ == '__main__':
+    unittest.main()
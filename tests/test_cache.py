@@ -0,0 +1,57 @@
+import unittest
+from unittest.mock import patch
+from src.cache import LRUCache
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        """Test that stored values are returned and counted as hits."""
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used entry is evicted when the cache is full."""
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        """Test that entries older than the TTL are treated as misses."""
+        cache = LRUCache(max_size=2, ttl=10)
+        with patch('src.cache.time.monotonic', return_value=100.0):
+            cache.put("a", 1)
+        with patch('src.cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get("a"), 1)
+        with patch('src.cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get("a"))
+
+        self.assertEqual(cache.stats()["expirations"], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_by_predicate(self):
+        """Test that only entries matching the predicate are removed."""
+        cache = LRUCache(max_size=4)
+        cache.put(("faqs", "q1"), 1)
+        cache.put(("faqs", "q2"), 2)
+        cache.put(("other", "q1"), 3)
+
+        removed = cache.invalidate(lambda key: key[0] == "faqs")
+
+        self.assertEqual(removed, 2)
+        self.assertIsNone(cache.get(("faqs", "q1")))
+        self.assertEqual(cache.get(("other", "q1")), 3)
+
+if __name__ == '__main__':
+    unittest.main()
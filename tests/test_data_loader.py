@@ -1,7 +1,10 @@
 import unittest
 import os
+import json
+import types
+import re
 import pandas as pd
-from src.data_loader import load_data
+from src.data_loader import load_data, iter_documents, chunk_documents
 
 class TestDataLoader(unittest.TestCase):
 
@@ -45,5 +48,85 @@ class TestDataLoader(unittest.TestCase):
         
         os.remove(empty_csv_path)
 
+    def test_iter_documents_streams_csv_in_chunks(self):
+        """Test that streaming a CSV in small chunks matches load_data."""
+        data = {
+            'Question': ['Q1', None, 'Q3', 'Q4', 'Q5'],
+            'Answer': ['A1', 'A2', 'A3', 'A4', 'A5']
+        }
+        pd.DataFrame(data).to_csv(self.test_csv_path, index=False)
+
+        documents = iter_documents(self.test_csv_path, chunk_size=2)
+
+        self.assertIsInstance(documents, types.GeneratorType)
+        streamed = list(documents)
+        loaded = load_data(self.test_csv_path)
+        self.assertEqual([doc['source_id'] for doc in streamed], ['FAQ-1', 'FAQ-3', 'FAQ-4', 'FAQ-5'])
+        self.assertEqual([doc['source_id'] for doc in streamed], [doc['source_id'] for doc in loaded])
+        self.assertEqual([doc['text'] for doc in streamed], [doc['text'] for doc in loaded])
+
+    def test_iter_documents_jsonl(self):
+        """Test that JSONL files are streamed through the same interface."""
+        jsonl_path = 'test_data.jsonl'
+        with open(jsonl_path, 'w') as f:
+            for question, answer in [('Q1', 'A1'), ('Q2', 'A2'), ('Q3', 'A3')]:
+                f.write(json.dumps({'Question': question, 'Answer': answer}) + "\n")
+
+        try:
+            documents = list(iter_documents(jsonl_path, chunk_size=2))
+        finally:
+            os.remove(jsonl_path)
+
+        self.assertEqual([doc['source_id'] for doc in documents], ['FAQ-1', 'FAQ-2', 'FAQ-3'])
+        self.assertEqual(documents[2]['text'], 'Q3 A3')
+
+    def test_iter_documents_jsonl_with_missing_keys(self):
+        """Test that JSONL rows without a question or answer are skipped, even when a whole chunk lacks the key."""
+        jsonl_path = 'test_data.jsonl'
+        rows = [{'Question': 'Q1'}, {'Question': 'Q2'}, {'Question': 'Q3', 'Answer': 'A3'}, {'Answer': 'A4'}]
+        with open(jsonl_path, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+        try:
+            documents = list(iter_documents(jsonl_path, chunk_size=2))
+        finally:
+            os.remove(jsonl_path)
+
+        self.assertEqual([doc['source_id'] for doc in documents], ['FAQ-3'])
+        self.assertEqual(documents[0]['text'], 'Q3 A3')
+
+    def test_iter_documents_unsupported_format(self):
+        """Test that a ValueError is raised for unsupported file formats."""
+        txt_path = 'test_data.txt'
+        with open(txt_path, 'w') as f:
+            f.write('Q1 A1')
+        try:
+            with self.assertRaises(ValueError):
+                iter_documents(txt_path)
+        finally:
+            os.remove(txt_path)
+
+    def test_chunk_documents_by_tokens(self):
+        """Test that long documents are split into overlapping token windows with offsets."""
+        def whitespace_tokenizer(texts, **kwargs):
+            return {'offset_mapping': [[m.span() for m in re.finditer(r'\S+', text)] for text in texts]}
+
+        text = "one two three four five six seven"
+        docs = [
+            {"text": text, "source_id": "FAQ-1"},
+            {"text": "short text", "source_id": "FAQ-2"},
+        ]
+
+        chunks = list(chunk_documents(docs, whitespace_tokenizer, max_tokens=3, overlap=1))
+
+        self.assertEqual([chunk['text'] for chunk in chunks], [
+            "one two three", "three four five", "five six seven", "short text"
+        ])
+        self.assertEqual([chunk['source_id'] for chunk in chunks], ["FAQ-1", "FAQ-1", "FAQ-1", "FAQ-2"])
+        self.assertEqual([chunk['chunk_index'] for chunk in chunks], [0, 1, 2, 0])
+        for chunk in chunks[:3]:
+            self.assertEqual(text[chunk['chunk_start']:chunk['chunk_end']], chunk['text'])
+
 if __name__ == '__main__':
     unittest.main()
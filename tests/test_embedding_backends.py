@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.embedding_backends import embedding_model_key, load_embedding_model, recall_at_k
+
+class TestEmbeddingBackends(unittest.TestCase):
+
+    def test_model_key_separates_quantized_backends(self):
+        """Test that only the reference backend shares the plain model name."""
+        self.assertEqual(embedding_model_key("mini", "torch"), "mini")
+        self.assertEqual(embedding_model_key("mini", "int8"), "mini#int8")
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            load_embedding_model("mini", "fp4")
+
+    @patch('src.embedding_backends.sentence_transformers.SentenceTransformer')
+    def test_int8_backend_quantizes_linear_layers(self, mock_model_cls):
+        """Test that the int8 backend replaces the model's linear layers with dynamically quantized ones."""
+        import torch
+        mock_model_cls.return_value = torch.nn.Sequential(torch.nn.Linear(8, 4))
+
+        model = load_embedding_model("mini", "int8")
+
+        mock_model_cls.assert_called_once_with("mini", device="cpu")
+        self.assertIsInstance(model[0], torch.ao.nn.quantized.dynamic.Linear)
+        self.assertEqual(tuple(model(torch.ones(2, 8)).shape), (2, 4))
+
+    def test_recall_at_k(self):
+        """Test that parity is perfect for identical embeddings and drops when neighbours change."""
+        rng = np.random.default_rng(0)
+        docs = rng.normal(size=(20, 8)).astype(np.float32)
+        queries = docs[:5] + 0.01
+
+        same = recall_at_k(queries, docs, queries, docs, k=3)
+        self.assertEqual((same["recall_at_3"], same["top1_agreement"]), (1.0, 1.0))
+        self.assertAlmostEqual(same["mean_cosine"], 1.0, places=5)
+
+        shuffled = recall_at_k(queries, docs, queries, docs[::-1].copy(), k=3)
+        self.assertLess(shuffled["top1_agreement"], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import tempfile
+import threading
+import numpy as np
+from src.embedding_cache import EmbeddingCache
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        """Use a fresh cache directory for each test."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.encoded = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _encode(self, texts):
+        """Fake encoder that records which texts it was asked to encode."""
+        self.encoded.extend(texts)
+        return np.array([[len(text), 1.0, 2.0] for text in texts], dtype=np.float32)
+
+    def test_only_unseen_texts_are_encoded(self):
+        """Test that cached texts are served without calling the encoder."""
+        cache = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+
+        first = cache.get_or_encode(["flu", "fever"], self._encode)
+        second = cache.get_or_encode(["fever", "aphasia", "flu"], self._encode)
+
+        self.assertEqual(self.encoded, ["flu", "fever", "aphasia"])
+        self.assertEqual(first.dtype, np.float32)
+        np.testing.assert_array_equal(second[0], first[1])
+        np.testing.assert_array_equal(second[2], first[0])
+        self.assertEqual(second[1][0], len("aphasia"))
+
+    def test_encoding_does_not_block_other_threads(self):
+        """Test that cached texts are served while another thread encodes, and a text encoded twice is stored once."""
+        cache = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        cache.get_or_encode(["flu"], self._encode)
+        encoding, release = threading.Event(), threading.Event()
+
+        def slow_encode(texts):
+            encoding.set()
+            release.wait(5)
+            return self._encode(texts)
+
+        writer = threading.Thread(target=cache.get_or_encode, args=(["fever"], slow_encode))
+        writer.start()
+        self.assertTrue(encoding.wait(5))
+        try:
+            np.testing.assert_array_equal(cache.get_or_encode(["flu"], self._encode)[0], [3.0, 1.0, 2.0])
+            cache.get_or_encode(["fever"], self._encode)
+        finally:
+            release.set()
+            writer.join(5)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(self.encoded, ["flu", "fever", "fever"])
+
+    def test_cache_persists_across_instances(self):
+        """Test that a new cache instance reads vectors written by a previous one."""
+        EmbeddingCache("test-model", cache_dir=self.temp_dir.name).get_or_encode(["flu"], self._encode)
+        self.encoded.clear()
+
+        reopened = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        embeddings = reopened.get_or_encode(["flu"], self._encode)
+
+        self.assertEqual(self.encoded, [])
+        self.assertEqual(len(reopened), 1)
+        np.testing.assert_array_equal(embeddings[0], [3.0, 1.0, 2.0])
+
+    def test_orphan_rows_from_an_interrupted_append_are_dropped(self):
+        """Test that rows written without index entries are truncated on reload instead of being served."""
+        cache = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        cache.get_or_encode(["flu"], self._encode)
+        # Simulate a crash between the matrix write and the index write.
+        with open(cache.matrix_path, "ab") as f:
+            f.write(np.full((1, 3), 9.0, dtype=np.float32).tobytes())
+
+        reopened = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        embeddings = reopened.get_or_encode(["fever", "flu"], self._encode)
+
+        np.testing.assert_array_equal(embeddings, [[5.0, 1.0, 2.0], [3.0, 1.0, 2.0]])
+        np.testing.assert_array_equal(EmbeddingCache("test-model", cache_dir=self.temp_dir.name).get_or_encode(["fever"], self._encode), [[5.0, 1.0, 2.0]])
+
+    def test_matrix_without_index_is_treated_as_empty(self):
+        """Test that a matrix file left without its index is discarded."""
+        cache = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        with open(cache.matrix_path, "wb") as f:
+            f.write(np.full((2, 3), 9.0, dtype=np.float32).tobytes())
+
+        reopened = EmbeddingCache("test-model", cache_dir=self.temp_dir.name)
+        embeddings = reopened.get_or_encode(["flu"], self._encode)
+
+        self.assertEqual(len(reopened), 1)
+        np.testing.assert_array_equal(embeddings[0], [3.0, 1.0, 2.0])
+
+if __name__ == '__main__':
+    unittest.main()
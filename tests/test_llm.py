@@ -0,0 +1,197 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from google.api_core import exceptions as google_exceptions
+
+from src.llm import (
+    CircuitBreaker,
+    GeminiModel,
+    LLMMetrics,
+    RateLimiter,
+    SimulatedModel,
+    get_language_model,
+    GENERATION_ERROR_MESSAGE
+)
+from src.answer_generator import generate_answer, rewrite_query
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@patch('src.llm.LLM_BACKOFF_BASE_SECONDS', 0.0)
+@patch('src.llm.genai')
+@patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+class TestGeminiResilience(unittest.TestCase):
+
+    def _model(self, genai_mock, **kwargs) -> GeminiModel:
+        with patch('src.llm._configured_api_key', None), patch.dict('src.llm._generative_models', clear=True):
+            model = GeminiModel(circuit_breaker=kwargs.get("circuit_breaker", CircuitBreaker()), metrics=LLMMetrics())
+        model.rate_limiter = None
+        return model
+
+    def test_retries_transient_errors(self, genai_mock):
+        """Test that a 429 is retried and a later success is returned."""
+        model = self._model(genai_mock)
+        model.model.generate_content.side_effect = [
+            google_exceptions.ResourceExhausted("quota"),
+            MagicMock(text=" The answer. "),
+        ]
+
+        self.assertEqual(model.generate("prompt"), "The answer.")
+        self.assertEqual(model.model.generate_content.call_count, 2)
+        self.assertIn("timeout", model.model.generate_content.call_args.kwargs["request_options"])
+        stats = model.metrics.snapshot()
+        self.assertEqual((stats["calls"], stats["retries"], stats["successes"]), (1, 1, 1))
+
+    def test_does_not_retry_client_errors(self, genai_mock):
+        """Test that a non-transient error fails on the first attempt."""
+        model = self._model(genai_mock)
+        model.model.generate_content.side_effect = google_exceptions.InvalidArgument("bad request")
+
+        self.assertEqual(model.generate("prompt"), GENERATION_ERROR_MESSAGE)
+        self.assertEqual(model.model.generate_content.call_count, 1)
+
+    def test_circuit_breaker_fails_fast(self, genai_mock):
+        """Test that an open circuit stops calling the API."""
+        model = self._model(genai_mock, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+        model.model.generate_content.side_effect = google_exceptions.ServiceUnavailable("down")
+
+        self.assertEqual(model.generate("prompt"), GENERATION_ERROR_MESSAGE)
+        calls = model.model.generate_content.call_count
+        self.assertEqual(model.generate("prompt"), GENERATION_ERROR_MESSAGE)
+
+        self.assertEqual(calls, 2)
+        self.assertEqual(model.model.generate_content.call_count, calls)
+        self.assertEqual(model.metrics.snapshot()["circuit_rejections"], 1)
+
+    def test_async_generate_retries(self, genai_mock):
+        """Test that the native async call goes through the same retry loop."""
+        model = self._model(genai_mock)
+        model.model.generate_content_async = AsyncMock(side_effect=[
+            google_exceptions.DeadlineExceeded("slow"),
+            MagicMock(text="Async answer."),
+        ])
+
+        self.assertEqual(asyncio.run(model.agenerate("prompt")), "Async answer.")
+        self.assertEqual(model.metrics.snapshot()["timeouts"], 1)
+
+    def test_stream_retries_only_before_first_chunk(self, genai_mock):
+        """Test that a stream is retried before any output, but not after it started."""
+        def broken_stream():
+            yield MagicMock(text="Partial ")
+            raise google_exceptions.ServiceUnavailable("dropped")
+
+        model = self._model(genai_mock)
+        model.model.generate_content.side_effect = [
+            google_exceptions.ServiceUnavailable("down"),
+            broken_stream(),
+        ]
+
+        chunks = list(model.generate_stream("prompt"))
+
+        self.assertEqual(chunks, ["Partial ", GENERATION_ERROR_MESSAGE])
+        self.assertEqual(model.model.generate_content.call_count, 2)
+
+    @patch('src.llm.LLM_TIMEOUT_SECONDS', 0.05)
+    def test_stalled_stream_times_out_after_first_chunk(self, genai_mock):
+        """Test that a stream which stops sending chunks ends with an error instead of hanging."""
+        release = threading.Event()
+
+        def stalled_stream():
+            yield MagicMock(text="Partial ")
+            release.wait(5)
+
+        async def astalled_stream():
+            yield MagicMock(text="Partial ")
+            await asyncio.sleep(5)
+
+        async def collect(stream):
+            return [chunk async for chunk in stream]
+
+        model = self._model(genai_mock)
+        model.model.generate_content.return_value = stalled_stream()
+        model.model.generate_content_async = AsyncMock(return_value=astalled_stream())
+
+        try:
+            self.assertEqual(list(model.generate_stream("prompt")), ["Partial ", GENERATION_ERROR_MESSAGE])
+        finally:
+            release.set()
+        self.assertEqual(asyncio.run(collect(model.agenerate_stream("prompt"))), ["Partial ", GENERATION_ERROR_MESSAGE])
+
+class TestResiliencePrimitives(unittest.TestCase):
+
+    def test_circuit_breaker_half_open_trial(self):
+        """Test that the circuit lets one trial through after the reset period."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_rate_limiter_spaces_requests_after_burst(self):
+        """Test that requests beyond the burst wait for the bucket to refill."""
+        clock = FakeClock()
+        limiter = RateLimiter(rate_per_minute=60, burst=2, clock=clock)
+
+        self.assertEqual([limiter.reserve(), limiter.reserve()], [0.0, 0.0])
+        self.assertAlmostEqual(limiter.reserve(), 1.0)
+        self.assertIsNone(limiter.reserve(max_wait=1.5))
+        clock.now = 2.0
+        self.assertAlmostEqual(limiter.reserve(), 0.0)
+
+class TestSimulatedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.model = SimulatedModel(ttft=0.0, tokens_per_second=0, answer_tokens=12)
+
+    def test_factory_selects_simulated_model(self):
+        """Test that the provider setting selects the simulated model."""
+        self.assertIsInstance(get_language_model("simulated"), SimulatedModel)
+        with self.assertRaises(ValueError):
+            get_language_model("unknown")
+
+    def test_answers_cite_sources_deterministically(self):
+        """Test that the pipeline gets a cited, repeatable answer without mocks."""
+        context = [
+            {"text": "The flu is a contagious respiratory illness.", "metadata": {"source_id": "FAQ-1"}},
+            {"text": "Symptoms include fever and cough.", "metadata": {"source_id": "FAQ-2"}},
+        ]
+        with patch('src.answer_generator.llm', self.model), patch('src.answer_generator.get_answer_cache', return_value=None):
+            answer = generate_answer("What is the flu?", context)
+            self.assertTrue(answer.endswith("[FAQ-1] [FAQ-2]"))
+            self.assertEqual(answer, generate_answer("What is the flu?", context))
+
+            history = [{"role": "user", "content": "Tell me about the flu."}]
+            self.assertEqual(rewrite_query("Is it contagious?", history), "Is it contagious?")
+
+    def test_stream_matches_generate(self):
+        """Test that the stream yields one token per chunk and adds up to the full answer."""
+        chunks = list(self.model.generate_stream("Source: [FAQ-9]\nContent: text"))
+        self.assertEqual(len(chunks), 13)
+        self.assertEqual("".join(chunks).strip(), self.model.generate("Source: [FAQ-9]\nContent: text"))
+
+    def test_error_rate_and_latency(self):
+        """Test the simulated failures and time to first token."""
+        failing = SimulatedModel(ttft=0.0, error_rate=1.0)
+        self.assertEqual(failing.generate("prompt"), GENERATION_ERROR_MESSAGE)
+        self.assertEqual(asyncio.run(SimulatedModel(ttft=0.0, error_rate=1.0).agenerate("prompt")), GENERATION_ERROR_MESSAGE)
+
+        slow = SimulatedModel(ttft=0.05, tokens_per_second=0, answer_tokens=3)
+        start = time.perf_counter()
+        next(slow.generate_stream("prompt"))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
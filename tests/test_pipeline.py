@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+import unittest
+from typing import Iterator
+from unittest.mock import patch, AsyncMock
+
+from src.llm import LanguageModel
+from src.pipeline import answer_question, answer_question_stream, NO_CONTEXT_ANSWER
+
+class FakeModel(LanguageModel):
+    """A blocking model that records how many calls run at the same time."""
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str) -> str:
+        with self._lock:
+            self.prompts.append(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return "Rewritten question" if "Rewritten Question:" in prompt else "An answer."
+
+    def generate_stream(self, prompt: str) -> Iterator[str]:
+        yield "An "
+        yield "answer."
+
+CONTEXT = [{"text": "The flu is a contagious respiratory illness.", "metadata": {"source_id": "FAQ-1"}, "distance": 0.5}]
+
+@patch('src.answer_generator.get_answer_cache', return_value=None)
+class TestPipeline(unittest.TestCase):
+
+    def test_answer_question_runs_all_steps(self, mock_get_cache):
+        """Test that a follow-up is rewritten, retrieved with the rewrite and answered."""
+        model = FakeModel(delay=0)
+        history = [{"role": "user", "content": "Tell me about the flu."}]
+        with patch('src.answer_generator.llm', model), \
+             patch('src.answer_generator.embed_query', side_effect=lambda text: [1.0, 0.0] if "it" in text.split() else [0.0, 1.0]), \
+             patch('src.pipeline.get_retriever') as mock_get_retriever, \
+             patch('src.pipeline.aretrieve_context', new_callable=AsyncMock, return_value=CONTEXT) as mock_retrieve:
+            mock_get_retriever.return_value.search_sources.return_value = ["FAQ-2"]
+            result = asyncio.run(answer_question("Is it contagious?", history))
+
+        self.assertEqual(result["rewritten"], "Rewritten question")
+        self.assertEqual(result["answer"], "An answer.")
+        self.assertEqual(mock_retrieve.call_args[0][0], "Rewritten question")
+        # The answer prompt carries the (budgeted) conversation history.
+        self.assertIn("user: Tell me about the flu.", model.prompts[-1])
+        self.assertIn("Context:", model.prompts[-1])
+
+    def test_concurrent_turns_respect_llm_limit(self, mock_get_cache):
+        """Test that many turns run concurrently but never exceed LLM_MAX_CONCURRENCY model calls."""
+        model = FakeModel()
+
+        async def run_turns():
+            return await asyncio.gather(*(answer_question(f"Question {i}?", []) for i in range(6)))
+
+        with patch('src.answer_generator.llm', model), \
+             patch('src.llm.LLM_MAX_CONCURRENCY', 2), \
+             patch('src.pipeline.aretrieve_context', new_callable=AsyncMock, return_value=CONTEXT):
+            results = asyncio.run(run_turns())
+
+        self.assertEqual([result["answer"] for result in results], ["An answer."] * 6)
+        self.assertEqual(model.max_in_flight, 2)
+
+    def test_answer_question_stream(self, mock_get_cache):
+        """Test that the streamed answer is produced through the async stream, or a fallback without context."""
+        async def collect(context):
+            with patch('src.pipeline.aretrieve_context', new_callable=AsyncMock, return_value=context):
+                return [chunk async for chunk in answer_question_stream("What is the flu?", [])]
+
+        with patch('src.answer_generator.llm', FakeModel(delay=0)):
+            self.assertEqual(asyncio.run(collect(CONTEXT)), ["An ", "answer."])
+            self.assertEqual(asyncio.run(collect([])), [NO_CONTEXT_ANSWER])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from src.answer_generator import _construct_prompt
+from src.prompt_builder import _compacted_messages, dedupe_context, estimate_tokens, fit_context, format_history
+
+class TestPromptBuilder(unittest.TestCase):
+
+    def test_history_keeps_recent_messages_and_compacts_older_ones(self):
+        """Test that old answers are cut to their first sentence but keep their citations."""
+        long_answer = "Diabetes is a chronic disease. " + "It affects how the body uses sugar. " * 30 + "[FAQ-12]"
+        history = [
+            {"role": "user", "content": "Tell me about diabetes."},
+            {"role": "assistant", "content": long_answer},
+        ] + [{"role": "user", "content": f"Question {i}?"} for i in range(4)]
+
+        formatted = format_history(history)
+        lines = formatted.split("\n")
+        self.assertEqual(lines[1], "assistant: Diabetes is a chronic disease. [FAQ-12]")
+        self.assertEqual(lines[-1], "user: Question 3?")
+
+        hits_before = _compacted_messages.hits
+        self.assertEqual(format_history(history), formatted)
+        self.assertGreater(_compacted_messages.hits, hits_before)
+
+    def test_history_drops_oldest_messages_over_budget(self):
+        """Test that the history never exceeds its token budget."""
+        history = [{"role": "user", "content": f"This is question number {i} about a symptom?"} for i in range(50)]
+        formatted = format_history(history, token_budget=60)
+        self.assertLessEqual(estimate_tokens(formatted), 60)
+        self.assertTrue(formatted.endswith("question number 49 about a symptom?"))
+        self.assertNotIn("number 0 ", formatted)
+
+    def test_context_is_deduplicated_and_fitted(self):
+        """Test that repeated and overlapping chunks are removed before budgeting."""
+        context = [
+            {"text": "Fever is a common symptom of the flu.", "metadata": {"source_id": "FAQ-1"}},
+            {"text": "fever is a common   symptom", "metadata": {"source_id": "FAQ-2"}},
+            {"text": "Rest and fluids help.", "metadata": {"source_id": "FAQ-3", "chunk_start": 0, "chunk_end": 21}},
+            {"text": "fluids help. See a doctor.", "metadata": {"source_id": "FAQ-3", "chunk_start": 9, "chunk_end": 35}},
+        ]
+        deduped = dedupe_context(context)
+        self.assertEqual([item["metadata"]["source_id"] for item in deduped], ["FAQ-1", "FAQ-3"])
+        self.assertEqual(deduped[1]["text"], "Rest and fluids help. See a doctor.")
+
+        fitted = fit_context([{"text": "word " * 400, "metadata": {}}, {"text": "short", "metadata": {}}], token_budget=50)
+        self.assertEqual(len(fitted), 1)
+        self.assertLessEqual(estimate_tokens(fitted[0]["text"]), 50)
+
+    def test_prompt_respects_token_budget(self):
+        """Test that a long conversation and large context are fitted into the budget."""
+        context = [{"text": f"Document {i}. " + "details " * 300, "metadata": {"source_id": f"FAQ-{i}"}} for i in range(10)]
+        history = [{"role": "assistant", "content": "A long answer. " * 200}] * 10
+        prompt = _construct_prompt("What is the flu?", context, history, "English", token_budget=1500)
+
+        self.assertLessEqual(estimate_tokens(prompt), 1500)
+        self.assertIn("Source: [FAQ-0]", prompt)
+        self.assertIn("Question: What is the flu?", prompt)
+
+if __name__ == '__main__':
+    unittest.main()
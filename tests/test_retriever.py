@@ -1,11 +1,31 @@
+import gc
 import unittest
+import weakref
+from unittest.mock import patch, MagicMock
 import chromadb
+import numpy as np
+from src import retriever as retriever_module
+from src import vector_store as vector_store_module
+from src.bm25 import BM25Index, publish_bm25_index
 from src.build_vector_store import create_vector_store
-from src.retriever import retrieve_context
+from src.retriever import (
+    retrieve_context,
+    retrieve_context_batch,
+    get_retriever,
+    get_cache_stats,
+    clear_caches,
+    invalidate_collection,
+    merge_chunks,
+    Retriever
+)
 from src.config import EMBEDDING_MODEL_NAME
 
 class TestRetriever(unittest.TestCase):
 
+    def setUp(self):
+        """Start every test with empty query caches."""
+        clear_caches()
+
     def test_retrieve_context_english_query(self):
         """Test retrieving context with an English query."""
         client = chromadb.Client()
@@ -79,5 +99,192 @@ class TestRetriever(unittest.TestCase):
         
         self.assertEqual(len(retrieved_docs), 0)
 
+    @patch.dict(retriever_module._retrievers, clear=True)
+    @patch.dict(vector_store_module._clients, clear=True)
+    @patch.dict(retriever_module._embedding_models, clear=True)
+    @patch('src.retriever.chromadb.PersistentClient')
+    @patch('src.retriever.sentence_transformers.SentenceTransformer')
+    def test_registry_loads_model_and_client_once(self, mock_model_cls, mock_client_cls):
+        """Test that repeated queries reuse the shared model, client and retriever."""
+        mock_model_cls.return_value.encode.return_value = MagicMock(tolist=lambda: [0.1, 0.2])
+        collection = mock_client_cls.return_value.get_collection.return_value
+        collection.query.return_value = {
+            "documents": [["The flu is a contagious respiratory illness."]],
+            "metadatas": [[{"source_id": "test-flu"}]],
+            "distances": [[0.5]],
+        }
+
+        for _ in range(3):
+            retrieved_docs = retrieve_context("What is the flu?", "test_registry", db_path="registry_db", threshold=0.0)
+            self.assertEqual(retrieved_docs[0]["metadata"]["source_id"], "test-flu")
+
+        mock_model_cls.assert_called_once()
+        mock_client_cls.assert_called_once()
+        mock_client_cls.return_value.get_collection.assert_called_once()
+        self.assertIs(get_retriever("test_registry", db_path="registry_db"), get_retriever("test_registry", db_path="registry_db"))
+
+    def test_client_retrievers_are_shared_per_client(self):
+        """Test that a client's Retriever is reused, that other clients get their own, and that clients are not kept alive."""
+        client, other_client = MagicMock(), MagicMock()
+
+        retriever = get_retriever("test_client_registry", client=client)
+
+        self.assertIs(get_retriever("test_client_registry", client=client), retriever)
+        other = get_retriever("test_client_registry", client=other_client)
+        self.assertIsNot(other, retriever)
+        self.assertNotEqual(other.store_key, retriever.store_key)
+
+        client_ref = weakref.ref(client)
+        del client, retriever
+        gc.collect()
+        self.assertIsNone(client_ref())
+
+    def test_retrieve_context_batch(self):
+        """Test that batched retrieval returns one result list per query, in order."""
+        client = chromadb.Client()
+        collection_name = "test_batch_query"
+        test_docs = [
+            {"text": "The flu is a contagious respiratory illness.", "source_id": "test-flu"},
+            {"text": "La fiebre es un síntoma común.", "source_id": "test-fiebre"},
+        ]
+
+        create_vector_store(
+            docs=test_docs,
+            collection_name=collection_name,
+            client=client,
+            model_name=EMBEDDING_MODEL_NAME
+        )
+
+        results = retrieve_context_batch(
+            ["What is the flu?", "qué es la fiebre", "What is the flu?"],
+            collection_name,
+            client=client,
+            n_results=1,
+            threshold=0.0,
+            batch_size=2
+        )
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0][0]["metadata"]["source_id"], "test-flu")
+        self.assertEqual(results[1][0]["metadata"]["source_id"], "test-fiebre")
+        self.assertEqual(results[2][0]["metadata"]["source_id"], "test-flu")
+        self.assertIsInstance(results[0][0]["distance"], float)
+
+    @patch('src.embedding_cache.get_embedding_cache', return_value=None)
+    @patch('src.retriever.get_embedding_model')
+    def test_retrieve_batch_encodes_and_queries_once_per_chunk(self, mock_get_model, mock_get_cache):
+        """Test that each chunk of queries costs one encode and one collection query, and that queries stay out of the persistent cache."""
+        mock_get_model.return_value.encode.side_effect = lambda texts, **kwargs: np.array(
+            [[0.1, 0.2] for _ in texts], dtype=np.float32
+        )
+        client = MagicMock()
+        collection = client.get_collection.return_value
+        collection.query.side_effect = lambda query_embeddings, **kwargs: {
+            "documents": [["doc"] for _ in query_embeddings],
+            "metadatas": [[{"source_id": "s"}] for _ in query_embeddings],
+            "distances": [[0.3] for _ in query_embeddings],
+        }
+
+        results = Retriever("test_chunks", client).retrieve_batch(
+            [f"query {i}" for i in range(5)], threshold=0.0, batch_size=2
+        )
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(mock_get_model.return_value.encode.call_count, 3)
+        self.assertEqual(collection.query.call_count, 3)
+        self.assertEqual(len(collection.query.call_args_list[0].kwargs["query_embeddings"]), 2)
+        mock_get_cache.assert_not_called()
+
+        # Repeated queries are served from the in-memory query-embedding cache.
+        Retriever("test_chunks", client).retrieve_batch(["query 0", "query 1"], threshold=0.0)
+        self.assertEqual(mock_get_model.return_value.encode.call_count, 3)
+
+    @patch('src.retriever.get_embedding_model')
+    def test_repeated_queries_are_cached_until_invalidated(self, mock_get_model):
+        """Test that repeated queries hit the caches and a rebuild invalidates results."""
+        mock_get_model.return_value.encode.return_value = MagicMock(tolist=lambda: [0.1, 0.2])
+        client = MagicMock()
+        collection = client.get_collection.return_value
+        collection.query.return_value = {
+            "documents": [["The flu is a contagious respiratory illness."]],
+            "metadatas": [[{"source_id": "test-flu"}]],
+            "distances": [[0.5]],
+        }
+        retriever = Retriever("test_cached", client)
+        hits_before = get_cache_stats()["retrieval_results"]["hits"]
+
+        retriever.retrieve("What is the flu?", threshold=0.0)
+        retriever.retrieve("  what is THE flu? ", threshold=0.0)
+
+        # The cache key is normalized; the encoder sees the query as typed.
+        mock_get_model.return_value.encode.assert_called_once_with("What is the flu?")
+        self.assertEqual(collection.query.call_count, 1)
+        self.assertEqual(get_cache_stats()["retrieval_results"]["hits"] - hits_before, 1)
+
+        invalidate_collection("test_cached")
+        retriever.retrieve("What is the flu?", threshold=0.0)
+
+        # The embedding is still valid; only the results must be recomputed.
+        self.assertEqual(mock_get_model.return_value.encode.call_count, 1)
+        self.assertEqual(collection.query.call_count, 2)
+
+    @patch('src.retriever.get_embedding_model')
+    def test_hybrid_retrieval_fuses_keyword_matches(self, mock_get_model):
+        """Test that a BM25-only match is fused in with its true distance and still thresholded."""
+        mock_get_model.return_value.encode.return_value = MagicMock(tolist=lambda: [0.0, 0.0])
+        store = MagicMock()
+        publish_bm25_index(BM25Index.build([
+            ("doc-flu", "The flu is a contagious respiratory illness."),
+            ("doc-ibuprofen", "Ibuprofen relieves pain and fever."),
+        ]), "test_hybrid", store)
+        store.query.return_value = {
+            "ids": [["doc-flu"]],
+            "documents": [["The flu is a contagious respiratory illness."]],
+            "metadatas": [[{"source_id": "test-flu"}]],
+            "distances": [[0.5]],
+        }
+        store.get.return_value = {
+            "ids": ["doc-ibuprofen"],
+            "documents": ["Ibuprofen relieves pain and fever."],
+            "metadatas": [{"source_id": "test-ibuprofen"}],
+            "embeddings": [[1.0, 1.0]],
+        }
+        retriever = Retriever("test_hybrid", store=store)
+
+        results = retriever.retrieve("Can I take ibuprofen?", n_results=2, threshold=0.0)
+        self.assertEqual([res["metadata"]["source_id"] for res in results], ["test-flu", "test-ibuprofen"])
+        self.assertAlmostEqual(results[1]["distance"], 2.0)
+
+        results = retriever.retrieve("Can I take ibuprofen?", n_results=2, threshold=1.0)
+        self.assertEqual([res["metadata"]["source_id"] for res in results], ["test-flu"])
+
+    def test_merge_chunks_joins_adjacent_chunks_per_source(self):
+        """Test that overlapping chunks of one source are merged and ranks are preserved."""
+        text = "one two three four five six seven"
+
+        def chunk(start, end, distance, source_id="FAQ-1"):
+            return {
+                "text": text[start:end],
+                "metadata": {"source_id": source_id, "chunk_start": start, "chunk_end": end},
+                "distance": distance,
+            }
+
+        results = [
+            chunk(8, 23, 0.4),                                       # "three four five"
+            {"text": "Other", "metadata": {"source_id": "FAQ-2"}, "distance": 0.5},
+            chunk(0, 13, 0.6),                                       # "one two three"
+            chunk(28, 33, 0.7, source_id="FAQ-3"),                   # "seven"
+        ]
+
+        merged = merge_chunks(results)
+
+        self.assertEqual(len(merged), 3)
+        self.assertEqual(merged[0]["text"], "one two three four five")
+        self.assertEqual(merged[0]["distance"], 0.4)
+        self.assertEqual(merged[0]["metadata"]["chunk_start"], 0)
+        self.assertEqual(merged[0]["metadata"]["chunk_end"], 23)
+        self.assertEqual(merged[1]["metadata"]["source_id"], "FAQ-2")
+        self.assertEqual(merged[2]["metadata"]["source_id"], "FAQ-3")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
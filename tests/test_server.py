@@ -0,0 +1,75 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from server import AdmissionController, create_app
+from src.llm import SimulatedModel
+
+CONTEXT = [{"text": "The flu is a contagious respiratory illness.", "metadata": {"source_id": "FAQ-1"}, "distance": 0.5}]
+
+@patch('src.answer_generator.get_answer_cache', return_value=None)
+@patch('src.answer_generator.llm', SimulatedModel(ttft=0.0, tokens_per_second=0, answer_tokens=4))
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(create_app(warm_up=False, admission=AdmissionController(max_in_flight=2, max_queued=2)))
+
+    def test_ask_returns_answer_and_sources(self, mock_get_cache):
+        """Test that /ask runs the pipeline and returns the cited answer."""
+        with patch('src.pipeline.aretrieve_context', new_callable=AsyncMock, return_value=CONTEXT):
+            response = self.client.post("/ask", json={"query": "What is the flu?"})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["sources"], ["FAQ-1"])
+        self.assertTrue(body["answer"].endswith("[FAQ-1]"))
+        self.assertEqual(self.client.get("/health").json()["in_flight"], 0)
+
+    def test_ask_stream_sends_server_sent_events(self, mock_get_cache):
+        """Test that /ask/stream sends the metadata, one event per token and a final event."""
+        with patch('src.pipeline.aretrieve_context', new_callable=AsyncMock, return_value=CONTEXT):
+            response = self.client.post("/ask/stream", json={"query": "What is the flu?", "history": []})
+
+        self.assertEqual(response.headers["content-type"].split(";")[0], "text/event-stream")
+        events = [block.split("\n", 1) for block in response.text.strip().split("\n\n")]
+        names = [name.removeprefix("event: ") for name, _ in events]
+        self.assertEqual((names[0], names[-1]), ("meta", "done"))
+        self.assertEqual(names.count("token"), 5)
+        tokens = "".join(json.loads(data.removeprefix("data: "))["text"] for name, data in events if name == "event: token")
+        self.assertTrue(tokens.strip().endswith("[FAQ-1]"))
+        self.assertEqual(self.client.get("/health").json()["in_flight"], 0)
+
+    def test_rejects_invalid_requests(self, mock_get_cache):
+        """Test that empty queries are rejected before any work is done."""
+        self.assertEqual(self.client.post("/ask", json={"query": ""}).status_code, 422)
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_sheds_load_beyond_the_queue(self):
+        """Test that requests beyond the in-flight and queue limits get a 503."""
+        async def scenario():
+            controller = AdmissionController(max_in_flight=1, max_queued=1, queue_timeout=0.05)
+            first = await controller.acquire()
+            waiting = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            with self.assertRaises(HTTPException) as full:
+                await controller.acquire()
+            with self.assertRaises(HTTPException) as timeout:
+                await waiting
+            first.release()
+            first.release()
+            second = await controller.acquire()
+            second.release()
+            return full.exception, timeout.exception, controller.stats()
+
+        full, timeout, stats = asyncio.run(scenario())
+        self.assertEqual((full.status_code, timeout.status_code), (503, 503))
+        self.assertEqual(full.headers["Retry-After"], "1")
+        self.assertEqual(stats, {"in_flight": 0, "queued": 0, "rejected": 2})
+
+if __name__ == '__main__':
+    unittest.main()
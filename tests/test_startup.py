@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from src import pipeline
+from src.lazy_import import lazy_import
+
+# Importing the pipeline must not load any model or heavy dependency.
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+HEAVY_MODULES = ("torch", "sentence_transformers", "chromadb", "google.generativeai", "langdetect")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_time_budget(self):
+        """Test that importing the pipeline is fast and defers heavy imports and the model."""
+        code = (
+            "import json, sys, time\n"
+            "start = time.perf_counter()\n"
+            "import src.pipeline, src.answer_generator\n"
+            "elapsed = time.perf_counter() - start\n"
+            f"print(json.dumps({{'seconds': elapsed, 'llm': src.answer_generator.llm is not None, "
+            f"'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+        )
+        output = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(result["loaded"], [])
+        self.assertFalse(result["llm"])
+        self.assertLess(result["seconds"], IMPORT_TIME_BUDGET_SECONDS)
+
+    def test_lazy_module_loads_on_first_use(self):
+        """Test that a lazy module is shared and imported on first attribute access."""
+        module = lazy_import("colorsys")
+        self.assertIs(module, lazy_import("colorsys"))
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn("loaded", repr(module))
+
+    @patch('src.pipeline._warm_up_thread', None)
+    @patch('src.pipeline.warm_up')
+    def test_warm_up_runs_once_in_background(self, mock_warm_up):
+        """Test that repeated warm-up requests share a single background thread."""
+        thread = pipeline.start_warm_up("faq", db_path="warm_db")
+        self.assertIs(pipeline.start_warm_up("faq", db_path="warm_db"), thread)
+        thread.join(timeout=5)
+        mock_warm_up.assert_called_once_with("faq", "warm_db", pipeline.VECTOR_BACKEND)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src import telemetry
+from src.answer_generator import generate_answer
+from src.llm import SimulatedModel
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        telemetry.configure_telemetry(metrics=False, trace_path=None)
+        shutil.rmtree(self.test_dir)
+
+    def test_disabled_by_default(self):
+        """Test that instrumented code runs against no-op spans when nothing is configured."""
+        telemetry.configure_telemetry(metrics=False, trace_path=None)
+        with telemetry.span("retrieve", collection="faq") as span:
+            span.set("results", 3)
+        telemetry.increment("cache_requests", cache="retrieval", result="hit")
+        self.assertFalse(telemetry.enabled())
+        self.assertEqual(telemetry.prometheus_text(), "")
+
+    def test_trace_sink_records_nested_spans(self):
+        """Test that spans are written as JSON lines with their parent and attributes."""
+        path = os.path.join(self.test_dir, "traces", "spans.jsonl")
+        telemetry.configure_telemetry(metrics=False, trace_path=path)
+        with telemetry.span("turn"):
+            with telemetry.span("retrieve", collection="faq") as span:
+                span.set("cache_hit", False)
+        telemetry.configure_telemetry(metrics=False, trace_path=None)
+
+        with open(path, "r", encoding="utf-8") as f:
+            child, parent = [json.loads(line) for line in f]
+        self.assertEqual((child["name"], parent["name"]), ("retrieve", "turn"))
+        self.assertEqual(child["parent_id"], parent["span_id"])
+        self.assertEqual(child["trace_id"], parent["trace_id"])
+        self.assertEqual(child["attributes"], {"collection": "faq", "cache_hit": False})
+
+    def test_failing_sink_and_reconfiguration_do_not_break_spans(self):
+        """Test that a sink error is logged and that reconfiguring while a span is open is safe."""
+        class BrokenSink(telemetry.TelemetrySink):
+            def record_span(self, span):
+                raise RuntimeError("sink is down")
+
+        path = os.path.join(self.test_dir, "spans.jsonl")
+        metrics = telemetry.configure_telemetry(metrics=True, trace_path=path, sinks=[BrokenSink()])
+        with self.assertLogs(level="ERROR"):
+            with telemetry.span("retrieve"):
+                pass
+        with telemetry.span("turn"):
+            telemetry.configure_telemetry(metrics=False, trace_path=None)
+
+        self.assertIn('rag_stage_duration_seconds_count{stage="retrieve"} 1', metrics.prometheus_text())
+        with open(path, "r", encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["name"] for line in f], ["retrieve"])
+
+    def test_prometheus_export_of_pipeline_metrics(self):
+        """Test that a generated answer records stage latency, token counts and cache counters."""
+        metrics = telemetry.configure_telemetry(metrics=True, trace_path=None)
+        context = [{"text": "The flu is a contagious respiratory illness.", "metadata": {"source_id": "FAQ-1"}}]
+        model = SimulatedModel(ttft=0.0, tokens_per_second=0, answer_tokens=5)
+        with patch('src.answer_generator.llm', model), patch('src.answer_generator.get_answer_cache', return_value=None):
+            generate_answer("What is the flu?", context)
+        telemetry.increment("cache_requests", cache="retrieval", result="hit")
+
+        text = telemetry.prometheus_text()
+        self.assertEqual(metrics.counter("cache_requests", cache="retrieval", result="hit"), 1)
+        self.assertIn('rag_cache_requests_total{cache="retrieval",result="hit"} 1', text)
+        self.assertIn('rag_stage_duration_seconds_count{stage="prompt_build"} 1', text)
+        self.assertIn('rag_stage_duration_seconds_bucket{stage="llm_generate",le="+Inf"} 1', text)
+        self.assertIn('rag_llm_completion_tokens_sum{model="simulated"} 6', text)
+
+if __name__ == '__main__':
+    unittest.main()
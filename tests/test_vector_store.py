@@ -1,6 +1,15 @@
 import unittest
+import json
+import os
+import tempfile
+import threading
+from unittest.mock import patch
 import chromadb
+import numpy as np
 from src.build_vector_store import create_vector_store
+from src.embedding_backends import embedding_model_key
+from src.retriever import retrieve_context
+from src.vector_store import ChromaVectorStore, NumpyVectorStore
 
 class TestVectorStore(unittest.TestCase):
 
@@ -8,6 +17,10 @@ class TestVectorStore(unittest.TestCase):
         """Set up an in-memory ChromaDB client for each test."""
         self.client = chromadb.Client()
         self.collection_name = "test_collection"
+        try:
+            self.client.delete_collection(self.collection_name)
+        except Exception:
+            pass
 
     def test_create_vector_store_with_documents(self):
         """Test creating a vector store with documents using an in-memory client."""
@@ -38,5 +51,299 @@ class TestVectorStore(unittest.TestCase):
         collection = self.client.get_collection(self.collection_name)
         self.assertEqual(collection.count(), 0)
 
+    def test_count_does_not_create_a_missing_collection(self):
+        """Test that counting a collection that does not exist returns 0 without creating it."""
+        store = ChromaVectorStore(self.client, self.collection_name)
+
+        self.assertEqual(store.count(), 0)
+        self.assertNotIn(self.collection_name, [collection.name for collection in self.client.list_collections()])
+
+    @staticmethod
+    def _counts(stats):
+        return {key: stats[key] for key in ("added", "updated", "removed", "unchanged")}
+
+    def test_incremental_build_only_embeds_changes(self):
+        """Test that an incremental rerun reports added, updated, removed and unchanged documents."""
+        initial_docs = [
+            {"text": "This is a test document about ChromaDB.", "source_id": "test-1"},
+            {"text": "Sentence transformers are great for embeddings.", "source_id": "test-2"},
+            {"text": "This document will be removed.", "source_id": "test-3"},
+        ]
+        stats = create_vector_store(
+            docs=initial_docs,
+            collection_name=self.collection_name,
+            client=self.client,
+            incremental=True
+        )
+        self.assertEqual(self._counts(stats), {"added": 3, "updated": 0, "removed": 0, "unchanged": 0})
+
+        rerun_stats = create_vector_store(
+            docs=initial_docs,
+            collection_name=self.collection_name,
+            client=self.client,
+            incremental=True
+        )
+        self.assertEqual(self._counts(rerun_stats), {"added": 0, "updated": 0, "removed": 0, "unchanged": 3})
+
+        updated_docs = [
+            {"text": "This is a test document about ChromaDB.", "source_id": "test-1"},
+            {"text": "Sentence transformers are great for embeddings.", "source_id": "test-2b"},
+            {"text": "A brand new document.", "source_id": "test-4"},
+        ]
+        update_stats = create_vector_store(
+            docs=updated_docs,
+            collection_name=self.collection_name,
+            client=self.client,
+            incremental=True
+        )
+        self.assertEqual(self._counts(update_stats), {"added": 1, "updated": 1, "removed": 1, "unchanged": 1})
+
+        collection = self.client.get_collection(self.collection_name)
+        self.assertEqual(collection.count(), 3)
+        source_ids = {meta["source_id"] for meta in collection.get(include=["metadatas"])["metadatas"]}
+        self.assertEqual(source_ids, {"test-1", "test-2b", "test-4"})
+
+    def test_pipelined_build_with_small_write_batches(self):
+        """Test that documents streamed across several encode and write batches are all stored."""
+        test_docs = ({"text": f"Test document number {i} about medicine.", "source_id": f"test-{i}"} for i in range(7))
+
+        stats = create_vector_store(
+            docs=test_docs,
+            collection_name=self.collection_name,
+            client=self.client,
+            batch_size=3,
+            write_batch_size=2
+        )
+
+        collection = self.client.get_collection(self.collection_name)
+        self.assertEqual(collection.count(), 7)
+        self.assertEqual(stats["added"], 7)
+        self.assertGreater(stats["docs_per_sec"], 0.0)
+
+    @patch('src.build_vector_store.encode_texts', side_effect=lambda model, texts, *args, **kwargs: np.ones((len(texts), 3)))
+    @patch('src.build_vector_store.get_embedding_model')
+    def test_documents_with_identical_text_are_collapsed_and_logged(self, mock_get_model, mock_encode):
+        """Test that a document repeating an earlier text is stored once and its source_id is logged."""
+        test_docs = [
+            {"text": "Wash your hands often.", "source_id": "test-1"},
+            {"text": "Wash your hands often.", "source_id": "test-2"},
+            {"text": "Get vaccinated every year.", "source_id": "test-3"},
+        ]
+
+        with self.assertLogs(level="WARNING") as logs:
+            stats = create_vector_store(docs=test_docs, collection_name=self.collection_name, client=self.client, chunk=False)
+
+        self.assertEqual((stats["added"], stats["duplicates"]), (2, 1))
+        self.assertTrue(any("test-2" in message for message in logs.output))
+        collection = self.client.get_collection(self.collection_name)
+        source_ids = {meta["source_id"] for meta in collection.get(include=["metadatas"])["metadatas"]}
+        self.assertEqual(source_ids, {"test-1", "test-3"})
+
+    @patch('src.build_vector_store.encode_texts', side_effect=lambda model, texts, *args, **kwargs: np.ones((len(texts), 3)))
+    @patch('src.build_vector_store.get_embedding_model')
+    def test_incremental_build_with_another_model_re_embeds_everything(self, mock_get_model, mock_encode):
+        """Test that an incremental build with a different embedding model rebuilds the collection."""
+        test_docs = [
+            {"text": "Wash your hands often.", "source_id": "test-1"},
+            {"text": "Get vaccinated every year.", "source_id": "test-2"},
+        ]
+        build = lambda model_name: create_vector_store(
+            docs=test_docs, collection_name=self.collection_name, client=self.client,
+            model_name=model_name, incremental=True, chunk=False
+        )
+
+        build("model-a")
+        self.assertEqual(self._counts(build("model-a")), {"added": 0, "updated": 0, "removed": 0, "unchanged": 2})
+        with self.assertLogs(level="WARNING"):
+            stats = build("model-b")
+
+        self.assertEqual(self._counts(stats), {"added": 2, "updated": 0, "removed": 0, "unchanged": 0})
+        collection = self.client.get_collection(self.collection_name)
+        self.assertEqual(collection.metadata["embedding_model_key"], embedding_model_key("model-b"))
+
+class TestNumpyVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        """Use a fresh directory for each test."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _make_store(self, storage="float32"):
+        store = NumpyVectorStore(self.temp_dir.name, storage=storage)
+        store.add(
+            ids=["a", "b", "c"],
+            embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.9, 0.1, 0.0]],
+            documents=["doc a", "doc b", "doc c"],
+            metadatas=[{"source_id": "A"}, {"source_id": "B"}, {"source_id": "C"}],
+        )
+        store.flush()
+        return store
+
+    def test_query_returns_nearest_with_squared_l2_distances(self):
+        """Test exact top-k search over the memory-mapped matrix."""
+        store = self._make_store()
+
+        results = store.query([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], n_results=2)
+
+        self.assertEqual(results["ids"], [["a", "c"], ["b", "c"]])
+        self.assertEqual(results["documents"][0], ["doc a", "doc c"])
+        self.assertEqual(results["metadatas"][1][0], {"source_id": "B"})
+        self.assertAlmostEqual(results["distances"][0][0], 0.0, places=5)
+        self.assertAlmostEqual(results["distances"][0][1], 0.02, places=5)
+
+    def test_delete_update_and_reload(self):
+        """Test that staged changes are persisted by flush and seen by a new instance."""
+        store = self._make_store()
+        store.delete(["a"])
+        store.update_metadata(["c"], [{"source_id": "C2"}])
+        store.flush()
+
+        reopened = NumpyVectorStore(self.temp_dir.name)
+        results = reopened.query([[1.0, 0.0, 0.0]], n_results=3)
+
+        self.assertEqual(reopened.count(), 2)
+        self.assertEqual(results["ids"], [["c", "b"]])
+        self.assertEqual(results["metadatas"][0][0], {"source_id": "C2"})
+        self.assertEqual(reopened.get_metadata(), {"b": {"source_id": "B"}, "c": {"source_id": "C2"}})
+
+    def test_flush_writes_a_new_version_and_keeps_the_previous_one(self):
+        """Test that each flush writes a version directory, named by the manifest, and deletes older versions."""
+        store = self._make_store()
+        store.delete(["a"])
+        store.flush()
+        store.add(ids=["d"], embeddings=[[0.0, 0.0, 1.0]], documents=["doc d"], metadatas=[{"source_id": "D"}])
+        store.flush()
+
+        versions = sorted(entry for entry in os.listdir(self.temp_dir.name) if entry.startswith("v"))
+        self.assertEqual(versions, ["v2", "v3"])
+        reopened = NumpyVectorStore(self.temp_dir.name)
+        self.assertEqual(reopened.count(), 3)
+        self.assertEqual(reopened.query([[0.0, 0.0, 1.0]], n_results=1)["ids"], [["d"]])
+
+    def test_unversioned_store_is_loaded_and_upgraded(self):
+        """Test that a store written before versioning, with its files next to the manifest, still loads."""
+        self._make_store()
+        for name in os.listdir(os.path.join(self.temp_dir.name, "v1")):
+            os.replace(os.path.join(self.temp_dir.name, "v1", name), os.path.join(self.temp_dir.name, name))
+        os.rmdir(os.path.join(self.temp_dir.name, "v1"))
+        manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        del manifest["generation"]
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+        store = NumpyVectorStore(self.temp_dir.name)
+        self.assertEqual(store.query([[1.0, 0.0, 0.0]], n_results=1)["ids"], [["a"]])
+        store.delete(["a"])
+        store.flush()
+        store.delete(["b"])
+        store.flush()
+
+        self.assertNotIn("vectors.f32", os.listdir(self.temp_dir.name))
+        self.assertEqual(NumpyVectorStore(self.temp_dir.name).get_metadata(), {"c": {"source_id": "C"}})
+
+    def test_collection_metadata_is_persisted_by_flush(self):
+        """Test that collection metadata is staged like document changes and stored in the manifest."""
+        store = self._make_store()
+        store.set_collection_metadata({"embedding_model_key": "model-a"})
+        self.assertEqual(NumpyVectorStore(self.temp_dir.name).get_collection_metadata(), {})
+
+        store.flush()
+
+        self.assertEqual(NumpyVectorStore(self.temp_dir.name).get_collection_metadata(), {"embedding_model_key": "model-a"})
+
+    def test_query_searches_without_holding_the_lock(self):
+        """Test that a flush can run during a query's scan, which keeps reading the files it started with."""
+        store = self._make_store()
+        top_k = store._top_k
+
+        def flush_during_scan(state, queries, k):
+            def rewrite():
+                store.delete(["a", "c"])
+                store.add(ids=["d"], embeddings=[[1.0, 0.0, 0.0]], documents=["doc d"], metadatas=[{"source_id": "D"}])
+                store.flush()
+            writer = threading.Thread(target=rewrite)
+            writer.start()
+            writer.join(timeout=5)
+            self.assertFalse(writer.is_alive())
+            return top_k(state, queries, k)
+
+        with patch.object(store, "_top_k", side_effect=flush_during_scan):
+            results = store.query([[1.0, 0.0, 0.0]], n_results=2)
+
+        self.assertEqual(results["ids"], [["a", "c"]])
+        self.assertEqual(results["documents"][0], ["doc a", "doc c"])
+        self.assertEqual(store.query([[1.0, 0.0, 0.0]], n_results=2)["ids"], [["d", "b"]])
+
+    def test_int8_storage_ranks_like_float32(self):
+        """Test that int8 quantized storage returns the same ranking on a small example."""
+        store = self._make_store(storage="int8")
+
+        results = store.query([[1.0, 0.0, 0.0]], n_results=3)
+
+        self.assertEqual(results["ids"], [["a", "c", "b"]])
+        self.assertAlmostEqual(results["distances"][0][0], 0.0, places=2)
+
+    def test_compact_storage_reranks_to_exact_distances(self):
+        """Test that float16 and PQ storage re-rank their candidates with the float32 rows."""
+        for storage in ("float16", "pq"):
+            with self.subTest(storage=storage):
+                self._make_store(storage=storage)
+                reopened = NumpyVectorStore(self.temp_dir.name)
+
+                results = reopened.query([[1.0, 0.0, 0.0]], n_results=2)
+
+                self.assertEqual(reopened.storage, storage)
+                self.assertEqual(results["ids"], [["a", "c"]])
+                self.assertAlmostEqual(results["distances"][0][1], 0.02, places=5)
+                reopened.reset()
+
+    def test_pq_storage_recall_and_size(self):
+        """Test that PQ storage scans far fewer bytes than float32 and keeps recall after re-ranking."""
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 32))
+        vectors = (centers[rng.integers(0, 20, size=600)] + 0.3 * rng.normal(size=(600, 32))).astype(np.float32)
+        queries = vectors[:20] + 0.05
+        ids = [str(i) for i in range(len(vectors))]
+        found = {}
+        for storage in ("float32", "pq"):
+            store = NumpyVectorStore(os.path.join(self.temp_dir.name, storage), storage=storage)
+            store.add(ids=ids, embeddings=vectors, documents=ids, metadatas=[{}] * len(ids))
+            store.flush()
+            found[storage] = (store.query(queries, n_results=5)["ids"], store.storage_stats())
+
+        (exact, full_stats), (approximate, pq_stats) = found["float32"], found["pq"]
+        recall = np.mean([len(set(e) & set(a)) / 5 for e, a in zip(exact, approximate)])
+        self.assertGreaterEqual(recall, 0.9)
+        self.assertLess(pq_stats["scanned_bytes_per_vector"], full_stats["scanned_bytes_per_vector"] / 4)
+
+    def test_build_and_retrieve_with_numpy_backend(self):
+        """Test the same build and retrieval flow as the Chroma tests, on the NumPy backend."""
+        test_docs = [
+            {"text": "The flu is a contagious respiratory illness.", "source_id": "test-flu"},
+            {"text": "La fiebre es un síntoma común.", "source_id": "test-fiebre"},
+        ]
+        stats = create_vector_store(
+            docs=test_docs,
+            collection_name="test_numpy_backend",
+            db_path=self.temp_dir.name,
+            backend="numpy"
+        )
+
+        retrieved_docs = retrieve_context(
+            "What is the flu?",
+            "test_numpy_backend",
+            db_path=self.temp_dir.name,
+            threshold=0.0,
+            backend="numpy"
+        )
+
+        self.assertEqual(stats["added"], 2)
+        self.assertEqual(retrieved_docs[0]["metadata"]["source_id"], "test-flu")
+        self.assertIsInstance(retrieved_docs[0]["distance"], float)
+
 if __name__ == '__main__':
     unittest.main()